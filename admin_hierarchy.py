@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Parent/child links between administrative divisions.
+Every ADM2, ADM3 and ADM4 division is given the Unique_Feature_ID of the
+division one level up that contains it:
+- candidates are the divisions of the parent level with the same country
+  (cc_ft) and first-order code (adm1), and the nearest one is chosen
+- without a candidate there, the next level up is tried (an ADM3 in a country
+  without ADM2 data gets its ADM1), and divisions with an unknown adm1 code
+  take the nearest candidate in their country
+The nearest candidate of a large group is found through a KD-tree of the
+group (scipy), and otherwise by dot products over bounded chunks of rows.
+The links are kept as compact arrays of row positions (a parent array and
+child lists in CSR form), so ancestor and descendant queries only visit the
+divisions they return.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from admin_spatial import unit_vectors
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# Depth of the administrative levels that take part in the hierarchy
+LEVEL_DEPTH = {'ADM1': 1, 'ADM2': 2, 'ADM3': 3, 'ADM4': 4}
+
+# adm1 codes that do not identify a first-order division
+UNKNOWN_ADM1 = frozenset({'', '00'})
+
+# Groups with more candidates than this are searched through a KD-tree of the candidates
+KDTREE_MIN_CANDIDATES = 32
+
+# Child/candidate pairs compared at a time without a KD-tree, which bounds the temporary matrix
+NEAREST_CHUNK_PAIRS = 4_000_000
+
+Placement = namedtuple('Placement', ['countries', 'region_keys', 'known_region', 'points'])
+
+def placements(df, country='cc_ft', adm1='adm1', latitude='lat_dd', longitude='long_dd'):
+    """Return the country, country+adm1 key, known-adm1 flag and unit vector of every row."""
+    countries = df[country].astype(object).fillna('').astype(str).to_numpy()
+    regions = df[adm1].astype(object).fillna('').astype(str).to_numpy()
+    return Placement(
+        countries=countries,
+        region_keys=countries + '|' + regions,
+        known_region=~np.isin(regions, list(UNKNOWN_ADM1)),
+        points=unit_vectors(df[latitude], df[longitude])
+    )
+
+def _subset(placement, rows):
+    return Placement(*(values[rows] for values in placement))
+
+def _nearest_in_groups(child_keys, child_points, candidate_keys, candidate_points):
+    """Return, for every child, the index of the nearest candidate with the same key (-1 if none)."""
+    nearest = np.full(len(child_keys), -1, dtype=np.int64)
+    if not len(child_keys) or not len(candidate_keys):
+        return nearest
+    
+    candidate_groups = pd.Series(candidate_keys).groupby(candidate_keys, sort=False).indices
+    for key, children in pd.Series(child_keys).groupby(child_keys, sort=False).indices.items():
+        candidates = candidate_groups.get(key)
+        if candidates is None:
+            continue
+        if len(candidates) == 1:
+            nearest[children] = candidates[0]
+        elif cKDTree is not None and len(candidates) > KDTREE_MIN_CANDIDATES:
+            nearest[children] = _nearest_by_tree(child_points[children], candidates, candidate_points)
+        else:
+            # The nearest point on the unit sphere has the largest dot product
+            chunk_rows = max(1, NEAREST_CHUNK_PAIRS // len(candidates))
+            for start in range(0, len(children), chunk_rows):
+                chunk = children[start:start + chunk_rows]
+                similarity = child_points[chunk] @ candidate_points[candidates].T
+                nearest[chunk] = candidates[similarity.argmax(axis=1)]
+    return nearest
+
+def _nearest_by_tree(points, candidates, candidate_points):
+    """Return the nearest of the candidates to each point, through a KD-tree of the candidate points.
+    
+    Candidates sharing a location are indexed once, under the first of them,
+    and points or candidates without finite coordinates fall back to the first
+    candidate, as with the dot products.
+    """
+    nearest = np.full(len(points), candidates[0], dtype=np.int64)
+    located = np.flatnonzero(np.isfinite(candidate_points[candidates]).all(axis=1))
+    if not len(located):
+        return nearest
+    unique_points, first = np.unique(candidate_points[candidates[located]], axis=0, return_index=True)
+    
+    finite = np.isfinite(points).all(axis=1)
+    _, found = cKDTree(unique_points).query(points[finite])
+    nearest[finite] = candidates[located[first[found]]]
+    return nearest
+
+def link_to_divisions(children, candidates, candidate_depth, parent_depths):
+    """Return the candidate row that contains or is nearest to each child (-1 if none).
+    
+    children and candidates are Placement tuples. parent_depths lists the
+    candidate levels to try, best first: each is tried within the child's
+    country and first-order division before any is tried within the country only.
+    """
+    parents = np.full(len(children.points), -1, dtype=np.int64)
+    for keys in ('region_keys', 'countries'):
+        for parent_depth in parent_depths:
+            pending = parents < 0
+            if keys == 'region_keys':
+                pending &= children.known_region
+            pending = np.flatnonzero(pending)
+            level_rows = np.flatnonzero(candidate_depth == parent_depth)
+            nearest = _nearest_in_groups(
+                getattr(children, keys)[pending], children.points[pending],
+                getattr(candidates, keys)[level_rows], candidates.points[level_rows]
+            )
+            parents[pending] = np.where(nearest >= 0, level_rows[np.maximum(nearest, 0)], -1)
+    return parents
+
+def level_depths(levels):
+    """Return the hierarchy depth of each administrative level (0 outside the hierarchy)."""
+    return levels.astype(object).map(LEVEL_DEPTH).fillna(0).to_numpy(dtype=np.int64)
+
+def assign_parents(divisions, level='desig_cd', country='cc_ft', adm1='adm1', feature='ufi',
+                   latitude='lat_dd', longitude='long_dd'):
+    """Return the parent feature ID of every division, as a nullable Int64 Series.
+    
+    ADM1 divisions, other levels and divisions without any candidate get <NA>.
+    """
+    depth = level_depths(divisions[level])
+    placement = placements(divisions, country, adm1, latitude, longitude)
+    
+    parents = np.full(len(divisions), -1, dtype=np.int64)
+    for child_depth in range(2, max(LEVEL_DEPTH.values()) + 1):
+        children = np.flatnonzero(depth == child_depth)
+        parents[children] = link_to_divisions(
+            _subset(placement, children), placement, depth, range(child_depth - 1, 0, -1)
+        )
+    
+    feature_ids = divisions[feature].to_numpy()[np.maximum(parents, 0)]
+    return pd.Series(feature_ids, index=divisions.index, dtype='Int64').mask(parents < 0)
+
+class AdminHierarchy:
+    """Parent and child row positions of a table of divisions."""
+    
+    def __init__(self, feature_ids, parent_ids):
+        feature_index = pd.Index(np.asarray(feature_ids))
+        parent_ids = pd.array(parent_ids, dtype='Int64')
+        self.parent = np.full(len(feature_index), -1, dtype=np.int64)
+        linked = ~np.asarray(parent_ids.isna())
+        self.parent[linked] = feature_index.get_indexer(np.asarray(parent_ids[linked], dtype=np.int64))
+        
+        # Children of row i are child_rows[child_offsets[i]:child_offsets[i + 1]]
+        has_parent = np.flatnonzero(self.parent >= 0)
+        self.child_rows = has_parent[np.argsort(self.parent[has_parent], kind='stable')]
+        counts = np.bincount(self.parent[has_parent], minlength=len(feature_index))
+        self.child_offsets = np.concatenate([[0], np.cumsum(counts)])
+    
+    @classmethod
+    def from_frame(cls, df, feature='Unique_Feature_ID', parent='Parent_Feature_ID'):
+        """Build the hierarchy from the feature and parent ID columns of the processed data."""
+        return cls(df[feature].to_numpy(), df[parent])
+    
+    def children(self, row):
+        """Return the row positions of the direct children of a row."""
+        return self.child_rows[self.child_offsets[row]:self.child_offsets[row + 1]]
+    
+    def ancestors(self, row):
+        """Return the row positions of the parent, grandparent, ... of a row."""
+        found = []
+        row = self.parent[row]
+        while row >= 0:
+            found.append(row)
+            row = self.parent[row]
+        return np.array(found, dtype=np.int64)
+    
+    def descendants(self, row):
+        """Return the row positions of all divisions below a row, level by level."""
+        found = []
+        frontier = self.children(row)
+        while len(frontier):
+            found.append(frontier)
+            frontier = np.concatenate([self.children(child) for child in frontier])
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(found)
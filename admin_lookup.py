@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Query engine for the processed administrative divisions.
+The data is loaded once (from the Parquet copy when available) and hash indexes
+are built from Country_Code, Administrative_Level and Unique_Feature_ID to the
+row positions holding each value, so country and level queries only touch the
+matching rows. A memory-mapped snapshot (see admin_snapshot.py) is queried in
+place with the indexes stored in it, so the first answer comes without
+parsing. Nearest and radius queries use the spatial index of admin_spatial.py
+and name searches the fuzzy name index of name_search.py. Results are
+formatted column by column and printed a page at a time. With --backend
+sqlite the same queries are answered by the indexes of the SQLite output
+instead (see admin_sqlite.py). Used by the generated
+coordinate_lookup.py, whose serve command starts the HTTP/JSON lookup service
+of lookup_server.py instead.
+Usage: python3 admin_lookup.py [country_code] [admin_level] [--backend auto|memory|sqlite]
+       python3 admin_lookup.py serve [--port 8765]
+"""
+
+import argparse
+import sys
+from string import Formatter
+
+import numpy as np
+import pandas as pd
+
+from admin_snapshot import open_snapshot
+from name_search import NameIndex
+from split_by_country import MASTER_FILE, MASTER_PARQUET_FILE, load_master_data
+
+DEFAULT_PAGE_SIZE = 20
+
+BACKENDS = ('auto', 'memory', 'sqlite')
+
+COUNTRY_LINE = "  {Administrative_Level}: {Administrative_Name} ({latitude:.4f}, {longitude:.4f})"
+LEVEL_LINE = "  {Country_Name}: {Administrative_Name} ({latitude:.4f}, {longitude:.4f})"
+SEARCH_LINE = ("  {Country_Name}: {Administrative_Name} ({Administrative_Level}) - "
+               "({latitude:.4f}, {longitude:.4f})")
+NEARBY_LINE = ("  {Country_Name}: {Administrative_Name} ({Administrative_Level}) - "
+               "({latitude:.4f}, {longitude:.4f}) {distance_km:.1f} km")
+DETAIL_LINE = ("{Country_Name}: {Administrative_Name} ({Administrative_Level}) - "
+               "Lat: {latitude:.6f}, Lon: {longitude:.6f}")
+
+def build_index(values):
+    """Map each upper-cased value to the sorted array of row positions holding it."""
+    keys = values.astype(object).str.upper()
+    return keys.groupby(keys.to_numpy(), sort=False).indices
+
+def format_divisions(results, template):
+    """Format every result row with a str.format template naming columns.
+    
+    Each field is converted for the whole column at once, e.g. '{latitude:.4f}'.
+    """
+    lines = np.full(len(results), '', dtype=object)
+    for literal, field, spec, _ in Formatter().parse(template):
+        lines = lines + literal
+        if field is None:
+            continue
+        values = results[field]
+        if spec.endswith('f'):
+            text = np.char.mod('%' + spec, values.to_numpy(dtype=np.float64)).astype(object)
+        elif spec:
+            text = values.map(('{:' + spec + '}').format).to_numpy(dtype=object)
+        else:
+            text = values.astype(str).to_numpy(dtype=object)
+        lines = lines + text
+    return lines.tolist()
+
+class AdminLookup:
+    """Indexed, read-only view of the administrative divisions."""
+    
+    def __init__(self, df, country_index=None, level_index=None, feature_index=None):
+        """Index a DataFrame of divisions, or a Snapshot with its prebuilt indexes (see admin_snapshot.py)."""
+        self.df = df.reset_index(drop=True) if isinstance(df, pd.DataFrame) else df
+        self.country_index = build_index(self.df['Country_Code']) if country_index is None else country_index
+        self.level_index = build_index(self.df['Administrative_Level']) if level_index is None else level_index
+        self.feature_index = pd.Index(self.df['Unique_Feature_ID']) if feature_index is None else feature_index
+        self._spatial = None
+        self._names = None
+        self._hierarchy = None
+    
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Query a memory-mapped snapshot in place, using its prebuilt indexes."""
+        return cls(
+            snapshot,
+            country_index=snapshot.group_index('Country_Code'),
+            level_index=snapshot.group_index('Administrative_Level'),
+            feature_index=snapshot.key_index('Unique_Feature_ID')
+        )
+    
+    @classmethod
+    def load(cls):
+        """Load the processed data, or return None if it has not been produced yet.
+        
+        An up-to-date memory-mapped snapshot is opened in place; otherwise the
+        Parquet copy or the workbook is read.
+        """
+        snapshot = open_snapshot(sources=(MASTER_FILE, MASTER_PARQUET_FILE))
+        if snapshot is not None:
+            return cls.from_snapshot(snapshot)
+        try:
+            return cls(load_master_data())
+        except FileNotFoundError:
+            print(f"Error: {MASTER_FILE} not found")
+            print("Please run the main processing script first.")
+            return None
+    
+    def positions(self, country_code=None, admin_level=None):
+        """Return the sorted row positions matching a country code and/or level (case-insensitive)."""
+        selected = None
+        for index, key in ((self.country_index, country_code), (self.level_index, admin_level)):
+            if not key:
+                continue
+            matches = index.get(key.upper(), np.empty(0, dtype=np.intp))
+            selected = matches if selected is None else np.intersect1d(selected, matches, assume_unique=True)
+        if selected is None:
+            return np.arange(len(self.df))
+        return selected
+    
+    def name_index(self):
+        """Return the search index of the division names, built on first use (see name_search.py)."""
+        if self._names is None:
+            self._names = NameIndex(self.df['Administrative_Name'])
+        return self._names
+    
+    def search_positions(self, country_code=None, admin_level=None, name_filter=None):
+        """Return the row positions of the divisions matching all of the given criteria (see search)."""
+        if not name_filter:
+            return self.positions(country_code, admin_level)
+        
+        matches = self.name_index().positions(name_filter)
+        if country_code or admin_level:
+            matches = matches[np.isin(matches, self.positions(country_code, admin_level))]
+        return matches
+    
+    def search(self, country_code=None, admin_level=None, name_filter=None):
+        """Return the divisions matching all of the given criteria.
+        
+        With a name filter, names are matched ignoring case and accents, by
+        prefix, substring or approximately, and the best matches come first.
+        """
+        return self.df.iloc[self.search_positions(country_code, admin_level, name_filter)]
+    
+    def feature(self, feature_id):
+        """Return the division with a Unique_Feature_ID, or None."""
+        position = self.feature_index.get_indexer([feature_id])[0]
+        if position < 0:
+            return None
+        return self.df.iloc[position]
+    
+    def spatial_index(self):
+        """Return the spatial index of the divisions, built on first use (see admin_spatial.py)."""
+        if self._spatial is None:
+            from admin_spatial import SpatialIndex
+            self._spatial = SpatialIndex(self)
+        return self._spatial
+    
+    def hierarchy(self):
+        """Return the parent/child links of the divisions, built on first use (see admin_hierarchy.py)."""
+        if self._hierarchy is None:
+            from admin_hierarchy import AdminHierarchy
+            self._hierarchy = AdminHierarchy.from_frame(self.df)
+        return self._hierarchy
+    
+    def ancestors(self, feature_id):
+        """Return the divisions containing a division, nearest first."""
+        position = self.feature_index.get_indexer([feature_id])[0]
+        if position < 0:
+            return self.df.iloc[[]]
+        return self.df.iloc[self.hierarchy().ancestors(position)]
+    
+    def descendants(self, feature_id, admin_level=None):
+        """Return the divisions below a division, optionally only those of one level."""
+        position = self.feature_index.get_indexer([feature_id])[0]
+        if position < 0:
+            return self.df.iloc[[]]
+        results = self.df.iloc[self.hierarchy().descendants(position)]
+        if admin_level:
+            results = results[results['Administrative_Level'].astype(object).str.upper() == admin_level.upper()]
+        return results
+    
+    def level_counts(self):
+        """Return the number of divisions per administrative level."""
+        return pd.Series({level: len(rows) for level, rows in self.level_index.items()}).sort_index()
+    
+    def country_count(self):
+        """Return the number of countries with divisions."""
+        return len(self.country_index)
+
+def load_lookup(backend='auto'):
+    """Return the lookup of the processed data for a backend, or None if its data is missing.
+    
+    memory loads the data into an AdminLookup (opening the snapshot in place
+    when it is up to date) and sqlite queries the SQLite output in place.
+    auto prefers an up-to-date snapshot, then an up-to-date SQLite file, and
+    loads the data otherwise.
+    """
+    if backend != 'memory':
+        from admin_sqlite import SQLITE_FILE, SqliteLookup
+        if backend == 'sqlite':
+            lookup = SqliteLookup.open(SQLITE_FILE)
+            if lookup is None:
+                print(f"Error: {SQLITE_FILE} not found or unreadable")
+                print("Please run the main processing script with --format sqlite first.")
+            return lookup
+        snapshot = open_snapshot(sources=(MASTER_FILE, MASTER_PARQUET_FILE))
+        if snapshot is not None:
+            return AdminLookup.from_snapshot(snapshot)
+        lookup = SqliteLookup.open(SQLITE_FILE, sources=(MASTER_FILE, MASTER_PARQUET_FILE))
+        if lookup is not None:
+            return lookup
+    return AdminLookup.load()
+
+def page_count(results, page_size=DEFAULT_PAGE_SIZE):
+    """Return the number of pages needed for the results (at least one)."""
+    return max(1, -(-len(results) // page_size))
+
+def result_page(results, page, page_size=DEFAULT_PAGE_SIZE):
+    """Return the rows of a 1-based page of results."""
+    start = (page - 1) * page_size
+    return results.iloc[start:start + page_size]
+
+def print_divisions(results, template, page=None, page_size=DEFAULT_PAGE_SIZE):
+    """Print one page of results, or all of them (page by page) if page is None."""
+    if page is not None:
+        print('\n'.join(format_divisions(result_page(results, page, page_size), template)))
+        return
+    for number in range(1, page_count(results, page_size) + 1):
+        print('\n'.join(format_divisions(result_page(results, number, page_size), template)))
+
+def interactive(lookup):
+    """Run the interactive command loop."""
+    # admin_spatial imports this module, so its helpers are imported here
+    from admin_spatial import valid_points
+    
+    print("Administrative Division Coordinate Lookup")
+    print("=" * 40)
+    print("Available commands:")
+    print("  country <CODE>                   - Show all divisions for a country")
+    print("  level <LEVEL>                    - Show divisions by level (ADM1, ADM2, etc.)")
+    print("  search <NAME>                    - Search divisions by name (accents ignored, typos tolerated)")
+    print("  id <UFI>                         - Show one division by Unique_Feature_ID")
+    print("  parents <UFI>                    - Show the divisions containing a division")
+    print("  under <UFI> [LEVEL]              - Show the divisions below a division")
+    print("  near <LAT> <LON> [LEVEL]         - Show the divisions nearest to a point")
+    print("  within <LAT> <LON> <KM> [LEVEL]  - Show all divisions within KM of a point")
+    print("  more                             - Show the next page of the last results")
+    print("  stats                            - Show statistics")
+    print("  quit                             - Exit")
+    print()
+    
+    # Results of the last query, the line template and the page shown
+    current = None
+    
+    def show(results, template, title):
+        nonlocal current
+        current = [results, template, 1]
+        print(f"\n{title} (page 1 of {page_count(results)}, {len(results):,} total):")
+        print_divisions(results, template, page=1)
+    
+    while True:
+        try:
+            cmd = input("Enter command: ").strip().split()
+            if not cmd:
+                continue
+            
+            command = cmd[0].lower()
+            if command in ['quit', 'exit', 'q']:
+                break
+            
+            elif command == 'country' and len(cmd) > 1:
+                results = lookup.search(country_code=cmd[1])
+                if results.empty:
+                    print(f"No divisions found for country code: {cmd[1]}")
+                else:
+                    show(results, COUNTRY_LINE,
+                         f"Divisions for {results.iloc[0]['Country_Name']} ({cmd[1].upper()})")
+            
+            elif command == 'level' and len(cmd) > 1:
+                results = lookup.search(admin_level=cmd[1])
+                if results.empty:
+                    print(f"No divisions found for level: {cmd[1]}")
+                else:
+                    show(results, LEVEL_LINE, f"{cmd[1].upper()} divisions")
+            
+            elif command == 'search' and len(cmd) > 1:
+                search_term = ' '.join(cmd[1:])
+                results = lookup.search(name_filter=search_term)
+                if results.empty:
+                    print(f"No divisions found matching: {search_term}")
+                else:
+                    show(results, SEARCH_LINE, f"Divisions matching '{search_term}'")
+            
+            elif command == 'id' and len(cmd) > 1:
+                division = lookup.feature(int(cmd[1]))
+                if division is None:
+                    print(f"No division found with Unique_Feature_ID: {cmd[1]}")
+                else:
+                    print(format_divisions(division.to_frame().T, DETAIL_LINE)[0])
+            
+            elif command == 'parents' and len(cmd) > 1:
+                results = lookup.ancestors(int(cmd[1]))
+                if results.empty:
+                    print(f"No parent divisions found for Unique_Feature_ID: {cmd[1]}")
+                else:
+                    show(results, SEARCH_LINE, f"Divisions containing {cmd[1]}")
+            
+            elif command == 'under' and len(cmd) > 1:
+                level = cmd[2] if len(cmd) > 2 else None
+                results = lookup.descendants(int(cmd[1]), admin_level=level)
+                if results.empty:
+                    print(f"No divisions found below Unique_Feature_ID: {cmd[1]}")
+                else:
+                    show(results, SEARCH_LINE, f"Divisions below {cmd[1]}")
+            
+            elif command in ('near', 'within') and len(cmd) > 2 and not valid_points(float(cmd[1]), float(cmd[2])):
+                print(f"Invalid point ({cmd[1]}, {cmd[2]}): latitude must be within ±90 and longitude within ±180")
+            
+            elif command == 'near' and len(cmd) > 2:
+                level = cmd[3] if len(cmd) > 3 else None
+                results = lookup.spatial_index().nearest(float(cmd[1]), float(cmd[2]), admin_level=level, k=10)
+                if results.empty:
+                    print(f"No divisions found for level: {level}")
+                else:
+                    show(results, NEARBY_LINE, f"Divisions nearest to ({cmd[1]}, {cmd[2]})")
+            
+            elif command == 'within' and len(cmd) > 3:
+                level = cmd[4] if len(cmd) > 4 else None
+                results = lookup.spatial_index().within(
+                    float(cmd[1]), float(cmd[2]), float(cmd[3]), admin_level=level
+                )
+                if results.empty:
+                    print(f"No divisions found within {cmd[3]} km")
+                else:
+                    show(results, NEARBY_LINE, f"Divisions within {cmd[3]} km of ({cmd[1]}, {cmd[2]})")
+            
+            elif command == 'more':
+                if current is None or current[2] >= page_count(current[0]):
+                    print("No more results.")
+                else:
+                    current[2] += 1
+                    results, template, page = current
+                    print(f"\n(page {page} of {page_count(results)})")
+                    print_divisions(results, template, page=page)
+            
+            elif command == 'stats':
+                print(f"\nDataset Statistics:")
+                level_counts = lookup.level_counts()
+                print(f"  Total divisions: {level_counts.sum():,}")
+                print(f"  Countries: {lookup.country_count()}")
+                print(f"  Administrative levels: {len(level_counts)}")
+                print(f"\nBy level:")
+                for level, count in level_counts.items():
+                    print(f"    {level}: {count:,}")
+            
+            else:
+                print("Unknown command. Type 'quit' to exit.")
+        
+        except KeyboardInterrupt:
+            break
+        except Exception as e:
+            print(f"Error: {e}")
+
+def main(argv=None):
+    """Run a command line query, or the interactive mode without arguments."""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == 'serve':
+        from lookup_server import main as serve
+        serve(argv[1:])
+        return
+    
+    parser = argparse.ArgumentParser(description="Look up administrative divisions and their coordinates.")
+    parser.add_argument('country_code', nargs='?', help="country code to list (interactive mode without it)")
+    parser.add_argument('admin_level', nargs='?', help="only list divisions of this level, e.g. ADM2")
+    parser.add_argument(
+        '--backend', choices=BACKENDS, default='auto',
+        help="memory: load the data; sqlite: query the SQLite output in place; "
+             "auto: the snapshot or SQLite file when up to date, else load (default)"
+    )
+    args = parser.parse_args(argv)
+    
+    lookup = load_lookup(args.backend)
+    if lookup is None:
+        sys.exit(1)
+    
+    if not args.country_code:
+        interactive(lookup)
+        return
+    
+    # Command line mode
+    results = lookup.search(args.country_code, args.admin_level)
+    
+    if results.empty:
+        print("No matching divisions found")
+    else:
+        print(f"Found {len(results)} divisions:")
+        print_divisions(results, DETAIL_LINE)
+
+if __name__ == "__main__":
+    main()
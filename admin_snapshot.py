@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped binary snapshot of the processed administrative divisions.
+The processing script writes the result once more as a directory of flat
+NumPy arrays that readers map instead of parse:
+- numeric columns (IDs, coordinates, ranks) as fixed-width .npy arrays, with
+  a validity array for nullable integer columns
+- text columns as int32 codes into a packed string table (UTF-8 bytes plus
+  an array of offsets); names are decoded only for the rows that are read
+- prebuilt indexes: the row positions of every country code and level, and
+  the feature IDs in sorted order, so lookups need no pass over the data
+Arrays are opened with mmap, so opening a snapshot costs a few milliseconds
+and only the pages a query touches are read from disk. manifest.json
+describes the columns and is written last.
+"""
+
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_DIR = Path('Complete_Administrative_Divisions_with_Coordinates.snapshot')
+
+# Bump when the layout of the arrays changes; older snapshots are ignored
+SNAPSHOT_VERSION = 1
+
+# Text columns with a prebuilt index from upper-cased value to row positions
+GROUP_COLUMNS = ('Country_Code', 'Administrative_Level')
+
+# Integer column with a prebuilt sorted key index
+KEY_COLUMN = 'Unique_Feature_ID'
+
+def _save(directory, name, array):
+    np.save(directory / f'{name}.npy', np.ascontiguousarray(array))
+
+def _pack_strings(directory, name, strings):
+    """Write strings as one UTF-8 byte file plus an array of start offsets."""
+    encoded = [value.encode('utf-8') for value in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    _save(directory, f'{name}.offsets', offsets)
+    with open(directory / f'{name}.strings', 'wb') as output:
+        output.write(b''.join(encoded))
+
+def write_snapshot(df, directory=SNAPSHOT_DIR):
+    """Write the processed data as a memory-mapped snapshot and return its directory.
+    
+    The snapshot is built next to the target and swapped in when complete.
+    """
+    directory = Path(directory)
+    building = directory.with_name(directory.name + '.tmp')
+    shutil.rmtree(building, ignore_errors=True)
+    building.mkdir(parents=True)
+    df = df.reset_index(drop=True)
+    
+    columns = []
+    for column in df.columns:
+        series = df[column]
+        dtype = series.dtype
+        if dtype.kind in 'iufb':
+            # Nullable integers are stored as values plus a validity array
+            nullable = str(dtype) == 'Int64' and bool(series.isna().any())
+            if str(dtype) == 'Int64':
+                _save(building, column, series.fillna(0).to_numpy(dtype=np.int64))
+            else:
+                _save(building, column, series.to_numpy())
+            if nullable:
+                _save(building, f'{column}.valid', series.notna().to_numpy())
+            columns.append({'name': column, 'kind': 'number', 'dtype': str(dtype), 'nullable': nullable})
+        else:
+            codes, uniques = pd.factorize(series.astype(object), use_na_sentinel=True)
+            _save(building, f'{column}.codes', codes.astype(np.int32))
+            _pack_strings(building, column, [str(value) for value in uniques])
+            columns.append({'name': column, 'kind': 'text', 'category': isinstance(dtype, pd.CategoricalDtype)})
+    
+    groups = {}
+    for column in GROUP_COLUMNS:
+        if column not in df.columns:
+            continue
+        codes, keys = pd.factorize(df[column].astype(object).str.upper(), use_na_sentinel=True)
+        grouped = np.flatnonzero(codes >= 0)
+        order = grouped[np.argsort(codes[grouped], kind='stable')]
+        counts = np.bincount(codes[grouped], minlength=len(keys))
+        _save(building, f'{column}.group_rows', order)
+        _save(building, f'{column}.group_offsets', np.concatenate([[0], np.cumsum(counts)]))
+        groups[column] = [str(key) for key in keys]
+    
+    if KEY_COLUMN in df.columns:
+        keys = df[KEY_COLUMN].to_numpy(dtype=np.int64)
+        order = np.argsort(keys, kind='stable')
+        _save(building, f'{KEY_COLUMN}.sorted_keys', keys[order])
+        _save(building, f'{KEY_COLUMN}.sorted_rows', order)
+    
+    manifest = {'version': SNAPSHOT_VERSION, 'rows': len(df), 'columns': columns, 'groups': groups}
+    with open(building / 'manifest.json', 'w') as output:
+        json.dump(manifest, output, indent=2)
+    
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(building, directory)
+    return directory
+
+def _load(directory, name):
+    return np.load(directory / f'{name}.npy', mmap_mode='r')
+
+class StringTable:
+    """Packed UTF-8 strings, decoded one at a time on access."""
+    
+    def __init__(self, directory, name):
+        self.offsets = _load(directory, f'{name}.offsets')
+        path = directory / f'{name}.strings'
+        # An empty file cannot be mapped
+        self.data = np.memmap(path, dtype=np.uint8, mode='r') if path.stat().st_size else np.empty(0, np.uint8)
+    
+    def __len__(self):
+        return len(self.offsets) - 1
+    
+    def __getitem__(self, position):
+        return self.data[self.offsets[position]:self.offsets[position + 1]].tobytes().decode('utf-8')
+    
+    def decode(self, positions=None):
+        """Return the strings at the given positions (all strings if None) as a list."""
+        if positions is None:
+            positions = range(len(self))
+        return [self[position] for position in positions]
+
+class GroupIndex:
+    """Prebuilt mapping of upper-cased values to sorted row positions.
+    
+    Supports get(), items() and len() like the dict built by admin_lookup.build_index.
+    """
+    
+    def __init__(self, keys, rows, offsets):
+        self.keys = {key: number for number, key in enumerate(keys)}
+        self.rows = rows
+        self.offsets = offsets
+    
+    def get(self, key, default=None):
+        number = self.keys.get(key)
+        if number is None:
+            return default
+        return np.asarray(self.rows[self.offsets[number]:self.offsets[number + 1]])
+    
+    def __len__(self):
+        return len(self.keys)
+    
+    def items(self):
+        for key in self.keys:
+            yield key, self.get(key)
+
+class KeyIndex:
+    """Row positions of unique integer keys, found by binary search of the sorted keys."""
+    
+    def __init__(self, sorted_keys, sorted_rows):
+        self.sorted_keys = sorted_keys
+        self.sorted_rows = sorted_rows
+    
+    def get_indexer(self, keys):
+        """Return the row position of each key, -1 if absent (like pandas.Index.get_indexer)."""
+        keys = np.asarray(keys, dtype=np.int64)
+        if not len(self.sorted_keys):
+            return np.full(len(keys), -1, dtype=np.intp)
+        found = np.searchsorted(self.sorted_keys, keys)
+        inside = found < len(self.sorted_keys)
+        found = np.minimum(found, len(self.sorted_keys) - 1)
+        hit = inside & (np.asarray(self.sorted_keys[found]) == keys)
+        return np.where(hit, np.asarray(self.sorted_rows[found]), -1).astype(np.intp)
+
+class _RowIndexer:
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+    
+    def __getitem__(self, rows):
+        if np.isscalar(rows):
+            return self.snapshot.rows([rows]).iloc[0]
+        if isinstance(rows, slice):
+            rows = range(*rows.indices(len(self.snapshot)))
+        return self.snapshot.rows(rows)
+
+class Snapshot:
+    """Read-only, memory-mapped view of a snapshot directory.
+    
+    Looks like a DataFrame where the lookup tools need it: len(), a column by
+    name and .iloc row selection, which decodes only the selected rows.
+    """
+    
+    def __init__(self, directory=SNAPSHOT_DIR):
+        self.directory = Path(directory)
+        with open(self.directory / 'manifest.json') as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f"{self.directory} was written by an incompatible version")
+        self.length = manifest['rows']
+        self.schema = {column['name']: column for column in manifest['columns']}
+        self.columns = list(self.schema)
+        self.group_keys = manifest['groups']
+        self._arrays = {}
+        self._tables = {}
+        self.iloc = _RowIndexer(self)
+    
+    def __len__(self):
+        return self.length
+    
+    def _array(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = _load(self.directory, name)
+        return self._arrays[name]
+    
+    def _table(self, column):
+        if column not in self._tables:
+            self._tables[column] = StringTable(self.directory, column)
+        return self._tables[column]
+    
+    def _values(self, column, rows=None):
+        """Return a column, or its values at the given row positions, as a pandas array."""
+        info = self.schema[column]
+        if info['kind'] == 'number':
+            values = self._array(column)
+            values = values if rows is None else values[rows]
+            if info['dtype'] != 'Int64':
+                return values
+            if not info['nullable']:
+                return pd.array(values, dtype='Int64')
+            valid = self._array(f'{column}.valid')
+            valid = valid if rows is None else valid[rows]
+            return pd.arrays.IntegerArray(np.asarray(values), ~np.asarray(valid))
+        
+        codes = self._array(f'{column}.codes')
+        codes = np.asarray(codes if rows is None else codes[rows])
+        table = self._table(column)
+        if info['category'] or rows is None:
+            categorical = pd.Categorical.from_codes(codes, categories=pd.Index(table.decode(), dtype=object))
+            return categorical if info['category'] else np.asarray(categorical.astype(object))
+        
+        # Only the strings of the selected rows are decoded
+        used, inverse = np.unique(codes, return_inverse=True)
+        strings = np.array([None if code < 0 else table[code] for code in used], dtype=object)
+        return strings[inverse.reshape(-1)]
+    
+    def __getitem__(self, column):
+        """Return a whole column as a Series; numeric columns stay memory-mapped."""
+        return pd.Series(self._values(column), name=column, copy=False)
+    
+    def rows(self, positions, columns=None):
+        """Return the rows at the given positions as a DataFrame indexed by position."""
+        positions = np.asarray(positions, dtype=np.intp)
+        columns = self.columns if columns is None else columns
+        return pd.DataFrame(
+            {column: self._values(column, positions) for column in columns},
+            index=pd.Index(positions), columns=columns
+        )
+    
+    def to_frame(self):
+        """Return the whole snapshot as an in-memory DataFrame."""
+        return pd.DataFrame({column: self._values(column) for column in self.columns}, columns=self.columns)
+    
+    def group_index(self, column):
+        """Return the prebuilt upper-cased value index of a column (see GROUP_COLUMNS)."""
+        return GroupIndex(
+            self.group_keys[column], self._array(f'{column}.group_rows'), self._array(f'{column}.group_offsets')
+        )
+    
+    def key_index(self, column=KEY_COLUMN):
+        """Return the prebuilt feature ID index."""
+        return KeyIndex(self._array(f'{column}.sorted_keys'), self._array(f'{column}.sorted_rows'))
+
+def open_snapshot(directory=SNAPSHOT_DIR, sources=()):
+    """Open the snapshot if it exists and is at least as new as every existing source file, else None."""
+    manifest = Path(directory) / 'manifest.json'
+    if not manifest.exists():
+        return None
+    modified = manifest.stat().st_mtime
+    if any(Path(source).exists() and Path(source).stat().st_mtime > modified for source in sources):
+        return None
+    try:
+        return Snapshot(directory)
+    except (OSError, ValueError, KeyError):
+        return None
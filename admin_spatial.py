@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Reverse geocoding of points to administrative divisions.
+Division coordinates are placed on the unit sphere and indexed with a KD-tree
+(scipy's cKDTree), so straight-line (chord) distances between the 3D points
+order the divisions exactly like great-circle distances. One tree is built per
+combination of level and country filter the first time it is queried.
+Both single points and arrays of points can be queried: nearest division(s)
+and all divisions within a radius in kilometres.
+Usage: python3 admin_spatial.py points.csv [--level ADM2] [--country US] [--output matched.csv]
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from admin_lookup import AdminLookup
+
+# Mean Earth radius (IUGG)
+EARTH_RADIUS_KM = 6371.0088
+
+# Points read from an input file at a time in batch mode
+DEFAULT_BATCH_POINTS = 1_000_000
+
+RESULT_COLUMNS = [
+    'Unique_Feature_ID', 'Country_Code', 'Country_Name', 'Administrative_Level',
+    'Administrative_Name', 'latitude', 'longitude'
+]
+
+def unit_vectors(latitudes, longitudes):
+    """Convert degrees of latitude and longitude to 3D points on the unit sphere.
+    
+    Missing or infinite coordinates give NaN points.
+    """
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    with np.errstate(invalid='ignore'):
+        cos_lat = np.cos(lat)
+        return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+def valid_points(latitudes, longitudes):
+    """Return a boolean array marking the points whose coordinates lie on the globe.
+    
+    Missing and infinite coordinates, latitudes beyond ±90 and longitudes
+    beyond ±180 are invalid; such points match no division.
+    """
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    return (np.abs(latitudes) <= 90) & (np.abs(longitudes) <= 180)
+
+def chord_to_km(chord):
+    """Convert chord lengths on the unit sphere to great-circle distances in km."""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+def km_to_chord(km):
+    """Convert a great-circle distance in km to the chord length on the unit sphere."""
+    return 2 * np.sin(np.minimum(km / EARTH_RADIUS_KM, np.pi) / 2)
+
+class SpatialIndex:
+    """Nearest-division and radius queries over an AdminLookup's divisions."""
+    
+    def __init__(self, lookup):
+        try:
+            from scipy.spatial import cKDTree
+        except ImportError:
+            raise ImportError("Spatial queries require scipy (pip install scipy)")
+        self._kdtree = cKDTree
+        self.lookup = lookup
+        self.points = unit_vectors(lookup.df['latitude'], lookup.df['longitude'])
+        self._trees = {}
+    
+    @classmethod
+    def load(cls):
+        """Load and index the processed data, or return None if it has not been produced yet."""
+        lookup = AdminLookup.load()
+        return None if lookup is None else cls(lookup)
+    
+    def tree(self, admin_level=None, country_code=None):
+        """Return the KD-tree of the matching divisions and the row positions of its points."""
+        key = ((admin_level or '').upper(), (country_code or '').upper())
+        if key not in self._trees:
+            positions = self.lookup.positions(country_code, admin_level)
+            tree = self._kdtree(self.points[positions]) if len(positions) else None
+            self._trees[key] = (tree, positions)
+        return self._trees[key]
+    
+    def nearest_positions(self, latitudes, longitudes, admin_level=None, country_code=None, k=1):
+        """Return the row positions and distances (km) of the k nearest divisions to each point.
+        
+        Both arrays have shape (points, k); points without enough divisions, and
+        invalid points (see valid_points), get position -1 and an infinite distance.
+        """
+        latitudes, longitudes = np.atleast_1d(latitudes), np.atleast_1d(longitudes)
+        rows = np.full((len(latitudes), k), -1)
+        distances = np.full((len(latitudes), k), np.inf)
+        tree, positions = self.tree(admin_level, country_code)
+        valid = valid_points(latitudes, longitudes)
+        if tree is None or not valid.any():
+            return rows, distances
+        
+        # Only valid points are queried, so none is folded onto the sphere
+        queries = unit_vectors(latitudes[valid], longitudes[valid])
+        chords, found = tree.query(queries, k=k, workers=-1)
+        chords = np.asarray(chords).reshape(-1, k)
+        found = np.asarray(found).reshape(-1, k)
+        
+        missing = found >= len(positions)
+        valid_rows = positions[np.where(missing, 0, found)]
+        valid_rows[missing] = -1
+        rows[valid] = valid_rows
+        distances[valid] = np.where(missing, np.inf, chord_to_km(chords))
+        return rows, distances
+    
+    def nearest(self, latitudes, longitudes, admin_level=None, country_code=None, k=1):
+        """Return the k nearest divisions of each point, one row per (point, match).
+        
+        point is the position of the query point in the input, distance_km the
+        great-circle distance to the division.
+        """
+        rows, distances = self.nearest_positions(latitudes, longitudes, admin_level, country_code, k)
+        point = np.repeat(np.arange(rows.shape[0]), k)
+        rows, distances = rows.ravel(), distances.ravel()
+        found = rows >= 0
+        return self._matches(point[found], rows[found], distances[found])
+    
+    def within(self, latitudes, longitudes, radius_km, admin_level=None, country_code=None):
+        """Return every division within radius_km of each point, nearest first per point.
+        
+        Invalid points (see valid_points) have no matches.
+        """
+        latitudes, longitudes = np.atleast_1d(latitudes), np.atleast_1d(longitudes)
+        tree, positions = self.tree(admin_level, country_code)
+        valid = np.flatnonzero(valid_points(latitudes, longitudes))
+        if tree is None or not len(valid):
+            return self._matches(np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty(0))
+        
+        queries = unit_vectors(latitudes[valid], longitudes[valid])
+        neighbours = tree.query_ball_point(queries, km_to_chord(radius_km), workers=-1)
+        counts = np.fromiter((len(found) for found in neighbours), dtype=np.int64, count=len(neighbours))
+        query = np.repeat(np.arange(len(valid)), counts)
+        found = np.fromiter(
+            (index for indexes in neighbours for index in indexes), dtype=np.int64, count=counts.sum()
+        )
+        
+        rows = positions[found]
+        chords = np.linalg.norm(self.points[rows] - queries[query], axis=1)
+        matches = self._matches(valid[query], rows, chord_to_km(chords))
+        return matches.sort_values(['point', 'distance_km'], kind='stable').reset_index(drop=True)
+    
+    def _matches(self, point, rows, distances):
+        matches = self.lookup.df.iloc[rows][RESULT_COLUMNS].reset_index(drop=True)
+        matches.insert(0, 'point', point)
+        matches['distance_km'] = distances
+        return matches
+
+def geocode_file(input_file, output_file, admin_level=None, country_code=None,
+                 batch_points=DEFAULT_BATCH_POINTS):
+    """Attach the nearest division to every point of a CSV file with latitude and longitude columns."""
+    spatial = SpatialIndex.load()
+    if spatial is None:
+        return None
+    
+    header = True
+    total = 0
+    for points in pd.read_csv(input_file, chunksize=batch_points):
+        # Empty or malformed coordinates become NaN and, like out-of-range ones, get an empty match
+        rows, distances = spatial.nearest_positions(
+            pd.to_numeric(points['latitude'], errors='coerce').to_numpy(dtype=np.float64),
+            pd.to_numeric(points['longitude'], errors='coerce').to_numpy(dtype=np.float64),
+            admin_level, country_code
+        )
+        rows, distances = rows[:, 0], distances[:, 0]
+        matched = spatial.lookup.df.iloc[np.where(rows >= 0, rows, 0)][RESULT_COLUMNS]
+        matched = matched.add_prefix('match_').reset_index(drop=True)
+        # Integer columns stay integers when some points have no match
+        matched = matched.astype({
+            column: 'Int64' for column, dtype in matched.dtypes.items() if dtype.kind in 'iu'
+        })
+        matched = matched.where(np.broadcast_to((rows >= 0)[:, None], matched.shape))
+        matched['distance_km'] = np.where(rows >= 0, distances, np.nan)
+        
+        result = pd.concat([points.reset_index(drop=True), matched], axis=1)
+        result.to_csv(output_file, mode='w' if header else 'a', header=header, index=False)
+        header = False
+        total += len(points)
+        print(f"   Geocoded {total:,} points")
+    return output_file
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Attach the nearest administrative division to each point of a CSV file."
+    )
+    parser.add_argument('input_file', help="CSV file with latitude and longitude columns")
+    parser.add_argument('--output', default='Geocoded_Points.csv', help="output CSV file")
+    parser.add_argument('--level', help="only match divisions of this level, e.g. ADM2")
+    parser.add_argument('--country', help="only match divisions of this country code")
+    parser.add_argument(
+        '--batch-points', type=int, default=DEFAULT_BATCH_POINTS,
+        help=f"points read and matched at a time (default: {DEFAULT_BATCH_POINTS:,})"
+    )
+    args = parser.parse_args()
+    
+    output_file = geocode_file(args.input_file, args.output, args.level, args.country, args.batch_points)
+    if output_file:
+        print(f"✅ Nearest divisions written to {output_file}")
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+SQLite copy of the processed administrative divisions.
+The processing script can write the result as one portable SQLite file
+(--format sqlite) with the indexes the lookup tools query:
+- B-tree indexes on Country_Code and Administrative_Level, the feature and
+  parent IDs and the search keys of the names (see name_search.py)
+- an R*Tree index on latitude and longitude for nearest and radius queries
+- an FTS5 trigram index on the padded search keys of Administrative_Name, so
+  names are matched ignoring case and accents, by prefix and substring, then
+  by shared trigrams for typos, in the order of the in-memory NameIndex
+SqliteLookup answers the queries of admin_lookup.py (which selects it with
+--backend sqlite) from these indexes, so a process reads only the rows a
+query returns instead of loading the whole data set, and any number of
+processes can read the file at once.
+"""
+
+import json
+import math
+import os
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from admin_spatial import EARTH_RADIUS_KM, RESULT_COLUMNS, chord_to_km, unit_vectors, valid_points
+from name_search import DEFAULT_MIN_SIMILARITY, normalize_name, search_keys, trigrams
+
+SQLITE_FILE = 'Complete_Administrative_Divisions_with_Coordinates.sqlite'
+
+# Bump when the tables or indexes change; older files are not opened
+SQLITE_VERSION = 2
+
+# Rows inserted at a time
+INSERT_BATCH_ROWS = 50_000
+
+# Radius of the first nearest search, grown until enough divisions are inside
+INITIAL_RADIUS_KM = 50.0
+RADIUS_GROWTH = 4
+
+# Longest parent chain followed by ancestor and descendant queries
+MAX_DEPTH = 16
+
+def _sql_type(dtype):
+    if dtype.kind in 'iub':
+        return 'INTEGER'
+    if dtype.kind == 'f':
+        return 'REAL'
+    return 'TEXT'
+
+def _python_values(series):
+    """Return a column as plain Python values, with None for missing values."""
+    return series.astype(object).where(series.notna(), None).tolist()
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def write_sqlite(df, output_file=SQLITE_FILE, batch_rows=INSERT_BATCH_ROWS):
+    """Write the processed data and its indexes to a SQLite file and return the file.
+    
+    The file is built next to the target and swapped in when complete.
+    """
+    output_file = Path(output_file)
+    building = output_file.with_name(output_file.name + '.tmp')
+    building.unlink(missing_ok=True)
+    df = df.reset_index(drop=True)
+    columns = list(df.columns)
+    keys = search_keys(df['Administrative_Name'])
+    # Distinct names numbered in order of first appearance, as NameIndex numbers them
+    name_order, _ = pd.factorize(df['Administrative_Name'].astype(object), use_na_sentinel=True)
+    extra = {
+        'Search_Key': keys,
+        # Padded like name_search.trigrams, so the start and end of a key are trigrams too
+        'Trigram_Key': '  ' + keys + ' ',
+        'Name_Order': name_order
+    }
+    
+    connection = sqlite3.connect(building)
+    try:
+        # The file is only published once complete, so no journal is needed while building
+        connection.execute('PRAGMA journal_mode = OFF')
+        connection.execute('PRAGMA synchronous = OFF')
+        definitions = ', '.join(f'{_quote(column)} {_sql_type(df[column].dtype)}' for column in columns)
+        connection.execute(
+            f'CREATE TABLE divisions ({definitions}, Search_Key TEXT, Trigram_Key TEXT, Name_Order INTEGER)'
+        )
+        
+        # Rows keep their order, so rowid - 1 is the row position in the frame written
+        insert = (f"INSERT INTO divisions ({', '.join(map(_quote, columns + list(extra)))}) "
+                  f"VALUES ({', '.join('?' * (len(columns) + len(extra)))})")
+        for start in range(0, len(df), batch_rows):
+            batch = df.iloc[start:start + batch_rows]
+            values = [_python_values(batch[column]) for column in columns]
+            values.extend(extra_values[start:start + batch_rows].tolist() for extra_values in extra.values())
+            connection.executemany(insert, zip(*values))
+        
+        connection.execute('CREATE INDEX divisions_country_level ON divisions (Country_Code, Administrative_Level)')
+        connection.execute('CREATE INDEX divisions_level ON divisions (Administrative_Level)')
+        connection.execute('CREATE INDEX divisions_feature ON divisions (Unique_Feature_ID)')
+        if 'Parent_Feature_ID' in columns:
+            connection.execute('CREATE INDEX divisions_parent ON divisions (Parent_Feature_ID)')
+        connection.execute('CREATE INDEX divisions_search_key ON divisions (Search_Key)')
+        
+        connection.execute(
+            'CREATE VIRTUAL TABLE divisions_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)'
+        )
+        connection.execute(
+            'INSERT INTO divisions_rtree SELECT rowid, latitude, latitude, longitude, longitude '
+            'FROM divisions WHERE latitude IS NOT NULL AND longitude IS NOT NULL'
+        )
+        connection.execute(
+            "CREATE VIRTUAL TABLE divisions_fts USING fts5("
+            "Trigram_Key, content='divisions', content_rowid='rowid', tokenize='trigram')"
+        )
+        connection.execute("INSERT INTO divisions_fts(divisions_fts) VALUES ('rebuild')")
+        
+        schema = [[column, str(df[column].dtype)] for column in columns]
+        connection.execute('CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT)')
+        connection.executemany('INSERT INTO metadata VALUES (?, ?)', [
+            ('version', str(SQLITE_VERSION)), ('rows', str(len(df))), ('columns', json.dumps(schema))
+        ])
+        connection.execute('ANALYZE')
+        connection.commit()
+    finally:
+        connection.close()
+    
+    os.replace(building, output_file)
+    return output_file
+
+def bounding_boxes(latitude, longitude, radius_km):
+    """Return the latitude range and the longitude ranges of the box around a circle.
+    
+    The longitude range is split in two where it crosses the antimeridian, and
+    covers all longitudes where the circle reaches a pole.
+    """
+    angle = radius_km / EARTH_RADIUS_KM
+    min_lat = latitude - math.degrees(angle)
+    max_lat = latitude + math.degrees(angle)
+    if min_lat <= -90 or max_lat >= 90 or math.sin(angle) >= math.cos(math.radians(latitude)):
+        return (max(min_lat, -90), min(max_lat, 90)), [(-180, 180)]
+    
+    spread = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(latitude))))
+    west, east = longitude - spread, longitude + spread
+    if west < -180:
+        return (min_lat, max_lat), [(west + 360, 180), (-180, east)]
+    if east > 180:
+        return (min_lat, max_lat), [(west, 180), (-180, east - 360)]
+    return (min_lat, max_lat), [(west, east)]
+
+class SqliteLookup:
+    """Read-only view of the divisions in a SQLite file, with the query methods of AdminLookup.
+    
+    Results are DataFrames indexed by row position, like those of AdminLookup.
+    """
+    
+    def __init__(self, path=SQLITE_FILE):
+        self.path = Path(path)
+        if not self.path.exists():
+            raise FileNotFoundError(self.path)
+        self.connection = sqlite3.connect(f'{self.path.resolve().as_uri()}?mode=ro', uri=True)
+        metadata = dict(self.connection.execute('SELECT key, value FROM metadata'))
+        if int(metadata.get('version', 0)) != SQLITE_VERSION:
+            raise ValueError(f"{self.path} was written by an incompatible version")
+        self.length = int(metadata['rows'])
+        self.schema = dict(json.loads(metadata['columns']))
+        self.columns = list(self.schema)
+        self._select = ', '.join(f'divisions.{_quote(column)}' for column in self.columns)
+    
+    @classmethod
+    def open(cls, path=SQLITE_FILE, sources=()):
+        """Open the file if it exists and is at least as new as every existing source file, else None."""
+        path = Path(path)
+        if not path.exists():
+            return None
+        modified = path.stat().st_mtime
+        if any(Path(source).exists() and Path(source).stat().st_mtime > modified for source in sources):
+            return None
+        try:
+            return cls(path)
+        except (sqlite3.Error, ValueError, KeyError):
+            return None
+    
+    def __len__(self):
+        return self.length
+    
+    def _query(self, tail='', params=(), prefix=''):
+        """Return the divisions selected by the SQL after the FROM clause, indexed by row position."""
+        sql = f'{prefix} SELECT divisions.rowid - 1 AS position, {self._select} FROM divisions {tail}'
+        frame = pd.read_sql_query(sql, self.connection, params=params, index_col='position')
+        # Row positions stay integers when nothing is found
+        frame.index = frame.index.astype(np.int64)
+        frame.index.name = None
+        # Columns get the dtypes they were written with
+        for column, dtype in self.schema.items():
+            if dtype != 'object' and str(frame[column].dtype) != dtype:
+                frame[column] = frame[column].astype(dtype)
+        return frame
+    
+    def _filters(self, country_code=None, admin_level=None):
+        conditions, params = [], []
+        if country_code:
+            conditions.append('divisions.Country_Code = ?')
+            params.append(country_code.upper())
+        if admin_level:
+            conditions.append('divisions.Administrative_Level = ?')
+            params.append(admin_level.upper())
+        return conditions, params
+    
+    def search(self, country_code=None, admin_level=None, name_filter=None):
+        """Return the divisions matching all of the given criteria (see AdminLookup.search)."""
+        conditions, params = self._filters(country_code, admin_level)
+        if not name_filter:
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+            return self._query(f'{where} ORDER BY divisions.rowid', params)
+        
+        key = normalize_name(name_filter)
+        if not key:
+            return self._query('WHERE 0')
+        
+        if len(key) >= 3:
+            # The trigram index finds substrings of at least three characters
+            match = 'divisions.rowid IN (SELECT rowid FROM divisions_fts WHERE divisions_fts MATCH ?)'
+            match_param = '"' + key.replace('"', '""') + '"'
+        else:
+            match = 'instr(divisions.Search_Key, ?) > 0'
+            match_param = key
+        
+        # Exact keys first, then prefixes, then other substrings, shorter names
+        # first, and the rows of a name together, as NameIndex orders them
+        found = self._key_rows(match, match_param, conditions, params)
+        found.sort(key=lambda row: (
+            0 if row[1] == key else 1 if row[1].startswith(key) else 2, len(row[1]), row[2], row[0]
+        ))
+        rowids = [row[0] for row in found] + self._fuzzy_rowids(key, conditions, params)
+        return self._rows(rowids)
+    
+    def _key_rows(self, match, match_param, conditions, params):
+        """Return the rowid, search key and name number of the divisions selected by a match condition."""
+        sql = ('SELECT divisions.rowid, divisions.Search_Key, divisions.Name_Order FROM divisions '
+               f"WHERE {' AND '.join([match] + conditions)}")
+        return self.connection.execute(sql, [match_param] + params).fetchall()
+    
+    def _rows(self, rowids):
+        """Return the divisions with the given rowids, in that order."""
+        if not rowids:
+            return self._query('WHERE 0')
+        results = self._query('WHERE divisions.rowid IN (SELECT value FROM json_each(?))', [json.dumps(rowids)])
+        return results.loc[np.asarray(rowids) - 1]
+    
+    def _fuzzy_rowids(self, key, conditions, params, min_similarity=DEFAULT_MIN_SIMILARITY):
+        """Return the rowids of the other divisions whose names share enough trigrams with the key.
+        
+        Names are ranked by the Jaccard similarity of their padded trigram sets,
+        most similar first, as in name_search.py.
+        """
+        query_trigrams = trigrams(key)
+        match = ' OR '.join('"' + trigram.replace('"', '""') + '"' for trigram in sorted(query_trigrams))
+        candidates = self._key_rows(
+            'divisions.rowid IN (SELECT rowid FROM divisions_fts WHERE divisions_fts MATCH ?)',
+            match, conditions, params
+        )
+        
+        similarity = {}
+        for candidate_key in {row[1] for row in candidates}:
+            # Names containing the key are already among the substring matches
+            if key not in candidate_key:
+                key_trigrams = trigrams(candidate_key)
+                similarity[candidate_key] = (len(query_trigrams & key_trigrams)
+                                             / len(query_trigrams | key_trigrams))
+        similar = [row for row in candidates if row[1] in similarity and similarity[row[1]] >= min_similarity]
+        similar.sort(key=lambda row: (-similarity[row[1]], row[2], row[0]))
+        return [row[0] for row in similar]
+    
+    def feature(self, feature_id):
+        """Return the division with a Unique_Feature_ID, or None."""
+        results = self._query('WHERE divisions.Unique_Feature_ID = ? LIMIT 1', (int(feature_id),))
+        return None if results.empty else results.iloc[0]
+    
+    def ancestors(self, feature_id):
+        """Return the divisions containing a division, nearest first."""
+        prefix = f'''WITH RECURSIVE chain(id, parent, depth) AS (
+            SELECT rowid, Parent_Feature_ID, 0 FROM divisions WHERE Unique_Feature_ID = ?
+            UNION ALL
+            SELECT divisions.rowid, divisions.Parent_Feature_ID, chain.depth + 1
+            FROM chain JOIN divisions ON divisions.Unique_Feature_ID = chain.parent
+            WHERE chain.depth < {MAX_DEPTH}
+        )'''
+        return self._query(
+            'JOIN chain ON divisions.rowid = chain.id WHERE chain.depth > 0 ORDER BY chain.depth',
+            (int(feature_id),), prefix
+        )
+    
+    def descendants(self, feature_id, admin_level=None):
+        """Return the divisions below a division, level by level, optionally only those of one level."""
+        prefix = f'''WITH RECURSIVE tree(id, feature, depth) AS (
+            SELECT rowid, Unique_Feature_ID, 0 FROM divisions WHERE Unique_Feature_ID = ?
+            UNION ALL
+            SELECT divisions.rowid, divisions.Unique_Feature_ID, tree.depth + 1
+            FROM tree JOIN divisions ON divisions.Parent_Feature_ID = tree.feature
+            WHERE tree.depth < {MAX_DEPTH}
+        )'''
+        conditions, params = self._filters(admin_level=admin_level)
+        level = ''.join(f' AND {condition}' for condition in conditions)
+        return self._query(
+            f'JOIN tree ON divisions.rowid = tree.id WHERE tree.depth > 0{level} ORDER BY tree.depth, divisions.rowid',
+            [int(feature_id)] + params, prefix
+        )
+    
+    def level_counts(self):
+        """Return the number of divisions per administrative level."""
+        rows = self.connection.execute(
+            'SELECT Administrative_Level, COUNT(*) FROM divisions GROUP BY Administrative_Level'
+        )
+        return pd.Series(dict(rows)).sort_index()
+    
+    def country_count(self):
+        """Return the number of countries with divisions."""
+        return self.connection.execute('SELECT COUNT(DISTINCT Country_Code) FROM divisions').fetchone()[0]
+    
+    def spatial_index(self):
+        """Return the object answering nearest and radius queries: the R*Tree of this file."""
+        return self
+    
+    def _around(self, latitude, longitude, radius_km, admin_level=None, country_code=None):
+        """Return the divisions within radius_km of a point, with their distances, nearest first."""
+        (min_lat, max_lat), spans = bounding_boxes(latitude, longitude, radius_km)
+        boxes = ' OR '.join('(r.max_lon >= ? AND r.min_lon <= ?)' for _ in spans)
+        conditions, params = self._filters(country_code, admin_level)
+        results = self._query(
+            f"JOIN divisions_rtree AS r ON r.id = divisions.rowid "
+            f"WHERE r.max_lat >= ? AND r.min_lat <= ? AND ({boxes})"
+            + ''.join(f' AND {condition}' for condition in conditions),
+            [min_lat, max_lat] + [bound for span in spans for bound in span] + params
+        )
+        point = unit_vectors(np.array([latitude]), np.array([longitude]))
+        chords = np.linalg.norm(
+            unit_vectors(results['latitude'].to_numpy(dtype=np.float64),
+                         results['longitude'].to_numpy(dtype=np.float64)) - point, axis=1
+        )
+        results['distance_km'] = chord_to_km(chords)
+        results = results[results['distance_km'] <= radius_km]
+        return results.iloc[np.lexsort((results.index.to_numpy(), results['distance_km'].to_numpy()))]
+    
+    def _matches(self, found):
+        if not found:
+            return pd.DataFrame(columns=['point'] + RESULT_COLUMNS + ['distance_km'])
+        matches = pd.concat(found)
+        return matches[['point'] + RESULT_COLUMNS + ['distance_km']].reset_index(drop=True)
+    
+    def nearest(self, latitudes, longitudes, admin_level=None, country_code=None, k=1):
+        """Return the k nearest divisions of each point (see SpatialIndex.nearest).
+        
+        The search radius grows until k divisions are inside it.
+        """
+        found = []
+        for number, (latitude, longitude) in enumerate(zip(np.atleast_1d(latitudes), np.atleast_1d(longitudes))):
+            if not valid_points(latitude, longitude):
+                continue
+            radius = INITIAL_RADIUS_KM
+            while True:
+                results = self._around(float(latitude), float(longitude), radius, admin_level, country_code)
+                if len(results) >= k or radius >= math.pi * EARTH_RADIUS_KM:
+                    break
+                radius *= RADIUS_GROWTH
+            found.append(results.head(k).assign(point=number))
+        return self._matches(found)
+    
+    def within(self, latitudes, longitudes, radius_km, admin_level=None, country_code=None):
+        """Return every division within radius_km of each point, nearest first per point."""
+        found = [
+            self._around(float(latitude), float(longitude), radius_km, admin_level, country_code).assign(point=number)
+            for number, (latitude, longitude) in enumerate(zip(np.atleast_1d(latitudes), np.atleast_1d(longitudes)))
+            if valid_points(latitude, longitude)
+        ]
+        return self._matches(found)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Batch resolution of (country, division name[, level]) rows to divisions.
+Resolves files of millions of rows, e.g. customer addresses, to the
+Unique_Feature_ID and coordinates of the processed divisions:
+- names are reduced to the search keys of name_search.py (no accents, case
+  folded), and countries given by name are mapped to their codes
+- every chunk of input is matched in one vectorized hash join against the
+  keys of the divisions, by country and name, or by country, level and name
+  where a level is given
+- only the rows the join misses fall back to the fuzzy name index of their
+  country (prefix, substring, then trigram similarity)
+Results are written chunk by chunk with the input columns, the matched
+division, how it was matched and a confidence between 0 and 1. The result
+columns can be given a prefix, and an input that already has a column of the
+same name is refused. A name shared
+by several divisions resolves to the highest level (then first) of them, and
+its confidence is divided by their number.
+Usage: python3 batch_resolve.py addresses.csv --country-column country --name-column region
+"""
+
+import argparse
+import sys
+import time
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from admin_lookup import AdminLookup
+from name_search import (
+    DEFAULT_MIN_SIMILARITY, EXACT, PREFIX, SUBSTRING, NameIndex, best_matches, normalize_name, search_keys
+)
+
+DEFAULT_CHUNKSIZE = 200_000
+
+# Separates the parts of a join key; never part of a search key
+KEY_SEPARATOR = '\t'
+
+# Confidence of each kind of match before dividing by the number of candidates;
+# fuzzy matches get FUZZY_CONFIDENCE times their trigram similarity
+TIER_CONFIDENCE = {EXACT: 1.0, PREFIX: 0.9, SUBSTRING: 0.8}
+FUZZY_CONFIDENCE = 0.8
+TIER_METHODS = {EXACT: 'exact', PREFIX: 'prefix', SUBSTRING: 'substring'}
+
+# Distinct (country, level, name) misses whose fuzzy result is kept
+FUZZY_CACHE_SIZE = 1 << 16
+
+RESULT_COLUMNS = [
+    'Unique_Feature_ID', 'Matched_Name', 'Matched_Level', 'latitude', 'longitude',
+    'Match_Method', 'Match_Confidence', 'Match_Candidates'
+]
+
+def upper_values(values):
+    """Return values as an object array of stripped, upper-cased strings ('' if missing)."""
+    return pd.Series(values, dtype=object).fillna('').astype(str).str.strip().str.upper().to_numpy(dtype=object)
+
+class JoinIndex:
+    """Hash index from join keys to the preferred row holding each key and the number of such rows."""
+    
+    def __init__(self, keys, preference):
+        ordered = keys[preference]
+        codes, uniques = pd.factorize(ordered)
+        _, first = np.unique(codes, return_index=True)
+        self.index = pd.Index(uniques)
+        self.rows = preference[first]
+        self.counts = np.bincount(codes, minlength=len(uniques))
+    
+    def get(self, keys):
+        """Return the preferred row of each key (-1 if absent) and its number of candidate rows."""
+        found = self.index.get_indexer(keys)
+        hit = found >= 0
+        rows = np.where(hit, self.rows[found], -1)
+        counts = np.where(hit, self.counts[found], 0)
+        return rows, counts
+
+class BatchResolver:
+    """Resolve batches of country and division names against an AdminLookup."""
+    
+    def __init__(self, lookup, min_similarity=DEFAULT_MIN_SIMILARITY):
+        self.lookup = lookup
+        self.min_similarity = min_similarity
+        df = lookup.df
+        self.names = np.asarray(df['Administrative_Name'], dtype=object)
+        self.countries = upper_values(df['Country_Code'])
+        self.levels = upper_values(df['Administrative_Level'])
+        keys = search_keys(self.names)
+        
+        # Candidates of the same key are preferred by level (ADM1 first), then by position
+        level_codes, _ = pd.factorize(self.levels, sort=True)
+        preference = np.lexsort((np.arange(len(keys)), level_codes))
+        self.level_codes = level_codes
+        self.by_name = JoinIndex(self.countries + KEY_SEPARATOR + keys, preference)
+        self.by_level = JoinIndex(
+            self.countries + KEY_SEPARATOR + self.levels + KEY_SEPARATOR + keys, preference
+        )
+        
+        # Country codes, and the codes of country names
+        self.country_codes = {code: code for code in pd.unique(self.countries) if code}
+        for column in ('Country_Name', 'Country_Full_Name'):
+            if column in df.columns:
+                pairs = pd.DataFrame({'name': np.asarray(df[column], dtype=object), 'code': self.countries})
+                for name, code in pairs.drop_duplicates('name').dropna().itertuples(index=False):
+                    self.country_codes.setdefault(normalize_name(name).upper(), code)
+        
+        self._name_indexes = {}
+        self._cached_fuzzy = lru_cache(maxsize=FUZZY_CACHE_SIZE)(self._fuzzy)
+    
+    def country_codes_of(self, countries):
+        """Return the country code of each country code or name ('' if unknown)."""
+        codes, uniques = pd.factorize(pd.Series(countries, dtype=object), use_na_sentinel=True)
+        resolved = [
+            self.country_codes.get(value) or self.country_codes.get(normalize_name(value).upper(), '')
+            for value in upper_values(uniques)
+        ]
+        return np.array(resolved + [''], dtype=object)[codes]
+    
+    def _name_index(self, country):
+        """Return the rows of a country and the name index over them, built on first use."""
+        if country not in self._name_indexes:
+            rows = self.lookup.country_index.get(country)
+            rows = np.empty(0, dtype=np.intp) if rows is None else np.asarray(rows)
+            self._name_indexes[country] = (rows, NameIndex(self.names[rows]) if len(rows) else None)
+        return self._name_indexes[country]
+    
+    def _fuzzy(self, country, level, key):
+        """Return (row, method, confidence, candidates) of the best fuzzy match of a key."""
+        rows, index = self._name_index(country)
+        if index is None or not key:
+            return -1, 'unmatched', 0.0, 0
+        
+        matches = []
+        for match in index.matches(key, self.min_similarity):
+            candidates = rows[index.rows_of_name[match.name_id]]
+            if level:
+                candidates = candidates[self.levels[candidates] == level]
+            if len(candidates):
+                matches.append((match, candidates))
+        best = best_matches([match for match, _ in matches])
+        if not best:
+            return -1, 'unmatched', 0.0, 0
+        
+        best_ids = {match.name_id for match in best}
+        candidates = np.concatenate([found for match, found in matches if match.name_id in best_ids])
+        row = candidates[np.lexsort((candidates, self.level_codes[candidates]))[0]]
+        first = best[0]
+        if first.tier in TIER_CONFIDENCE:
+            method, confidence = TIER_METHODS[first.tier], TIER_CONFIDENCE[first.tier]
+        else:
+            method, confidence = 'fuzzy', FUZZY_CONFIDENCE * first.similarity
+        return int(row), method, confidence / len(candidates), len(candidates)
+    
+    def resolve(self, countries, names, levels=None):
+        """Resolve equally long sequences of countries, names and optional levels.
+        
+        Returns a DataFrame of RESULT_COLUMNS with one row per input row.
+        """
+        countries = self.country_codes_of(countries)
+        keys = search_keys(names)
+        levels = upper_values(levels) if levels is not None else np.full(len(keys), '', dtype=object)
+        
+        # Hash join: by level where one is given, else by name alone
+        rows, candidates = self.by_name.get(countries + KEY_SEPARATOR + keys)
+        with_level = levels != ''
+        if with_level.any():
+            rows[with_level], candidates[with_level] = self.by_level.get(
+                countries[with_level] + KEY_SEPARATOR + levels[with_level] + KEY_SEPARATOR + keys[with_level]
+            )
+        methods = np.where(rows >= 0, 'exact', 'unmatched').astype(object)
+        confidence = np.where(rows >= 0, 1.0 / np.maximum(candidates, 1), 0.0)
+        
+        # Fuzzy fallback for the misses only
+        for position in np.flatnonzero((rows < 0) & (countries != '') & (keys != '')):
+            rows[position], methods[position], confidence[position], candidates[position] = self._cached_fuzzy(
+                countries[position], levels[position], keys[position]
+            )
+        
+        # Columns of the matched divisions, missing where nothing matched
+        found = rows >= 0
+        matched = self.lookup.df.iloc[rows[found]]
+        feature_ids = np.zeros(len(rows), dtype=np.int64)
+        feature_ids[found] = matched['Unique_Feature_ID'].to_numpy(dtype=np.int64)
+        matched_names = np.full(len(rows), None, dtype=object)
+        matched_names[found] = self.names[rows[found]]
+        matched_levels = np.full(len(rows), None, dtype=object)
+        matched_levels[found] = self.levels[rows[found]]
+        coordinates = np.full((2, len(rows)), np.nan)
+        coordinates[0, found] = matched['latitude'].to_numpy(dtype=np.float64)
+        coordinates[1, found] = matched['longitude'].to_numpy(dtype=np.float64)
+        
+        return pd.DataFrame({
+            'Unique_Feature_ID': pd.arrays.IntegerArray(feature_ids, ~found),
+            'Matched_Name': matched_names,
+            'Matched_Level': matched_levels,
+            'latitude': coordinates[0],
+            'longitude': coordinates[1],
+            'Match_Method': methods,
+            'Match_Confidence': np.round(confidence, 3),
+            'Match_Candidates': candidates
+        }, columns=RESULT_COLUMNS)
+
+def resolve_file(resolver, input_file, output_file, country_column, name_column, level_column=None,
+                 sep=',', chunksize=DEFAULT_CHUNKSIZE, result_prefix=''):
+    """Resolve a delimited file chunk by chunk, appending each resolved chunk to output_file.
+    
+    The result columns are named result_prefix + RESULT_COLUMNS. Raises
+    ValueError if the input already has a column of one of those names.
+    Returns the number of rows per match method.
+    """
+    result_columns = [result_prefix + column for column in RESULT_COLUMNS]
+    input_columns = pd.read_csv(input_file, sep=sep, dtype=str, nrows=0).columns
+    clashes = [column for column in result_columns if column in input_columns]
+    if clashes:
+        raise ValueError(
+            f"{input_file} already has the result column(s) {', '.join(clashes)}; set a result prefix"
+        )
+    
+    counts = {}
+    started = time.perf_counter()
+    total = 0
+    reader = pd.read_csv(input_file, sep=sep, dtype=str, keep_default_na=False, chunksize=chunksize)
+    for number, chunk in enumerate(reader):
+        levels = chunk[level_column] if level_column else None
+        results = resolver.resolve(chunk[country_column], chunk[name_column], levels)
+        for method, count in results['Match_Method'].value_counts().items():
+            counts[method] = counts.get(method, 0) + count
+        results.index = chunk.index
+        results.columns = result_columns
+        pd.concat([chunk, results], axis=1).to_csv(
+            output_file, sep=sep, index=False, mode='w' if number == 0 else 'a', header=number == 0
+        )
+        total += len(chunk)
+        rate = total / max(time.perf_counter() - started, 1e-9)
+        print(f"   {total:,} rows resolved ({rate:,.0f} rows/s)")
+    return counts
+
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(
+        description="Resolve a file of country and division names to Unique_Feature_IDs and coordinates."
+    )
+    parser.add_argument('input', help="delimited input file with a header row")
+    parser.add_argument('--output', help="output file (default: <input>_resolved.<ext>)")
+    parser.add_argument('--country-column', default='country', help="column of country codes or names")
+    parser.add_argument('--name-column', default='name', help="column of division names")
+    parser.add_argument('--level-column', help="optional column of administrative levels (ADM1, ADM2, ...)")
+    parser.add_argument('--sep', default=',', help="field separator of the input and output (default: ',')")
+    parser.add_argument(
+        '--result-prefix', default='',
+        help="prefix of the result columns, for inputs that already have columns such as latitude"
+    )
+    parser.add_argument(
+        '--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+        help=f"rows resolved at a time (default: {DEFAULT_CHUNKSIZE:,})"
+    )
+    parser.add_argument(
+        '--min-similarity', type=float, default=DEFAULT_MIN_SIMILARITY,
+        help=f"minimum trigram similarity of a fuzzy match (default: {DEFAULT_MIN_SIMILARITY})"
+    )
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    input_file = Path(args.input)
+    output_file = args.output or input_file.with_name(f"{input_file.stem}_resolved{input_file.suffix}")
+    
+    print("Batch Division Name Resolution")
+    print("=" * 40)
+    lookup = AdminLookup.load()
+    if lookup is None:
+        sys.exit(1)
+    
+    print("1. Building join keys...")
+    resolver = BatchResolver(lookup, args.min_similarity)
+    
+    print(f"\n2. Resolving {input_file}...")
+    try:
+        counts = resolve_file(
+            resolver, input_file, output_file, args.country_column, args.name_column,
+            args.level_column, args.sep, args.chunksize, args.result_prefix
+        )
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    
+    print(f"\n✅ Results written to {output_file}")
+    for method, count in sorted(counts.items(), key=lambda item: -item[1]):
+        print(f"   {method}: {count:,} rows")
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Stage-level benchmarks of the processing pipeline on synthetic GNS data.
+For each row count a synthetic dataset is generated once (see gns_synthetic.py)
+and the stages of process_gns_administrative_data() are run one after the
+other on it: read, filter, rank, dedup, merge and Excel write, followed by the
+country split of split_by_country.py and index building and queries of the
+lookup tool. Every stage records its wall and CPU time, resident memory and
+peak resident memory (see pipeline_metrics.py); with --trace-memory the peak
+Python/NumPy allocation inside the stage is traced too (which slows the
+stages down).
+Results are printed and written as JSON. Given a previous results file with
+--baseline, stages that got slower than the tolerance are reported and the
+script exits with status 1.
+Usage: python3 benchmark_pipeline.py --rows 1000000 10000000 50000000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from admin_lookup import AdminLookup
+from gns_dedup import RANKING_PROFILES, best_rows_by_profile, profile_scores, resolve_profiles
+from gns_reader import ADMIN_COLUMNS, ADMIN_REGIONS_FILE, filter_admin_records, iter_gns_blocks
+from gns_schema import apply_schema
+from gns_synthetic import generate_dataset
+from gns_workbook import country_level_pivot, write_master_workbook
+from pipeline_metrics import PipelineMetrics, format_record
+from process_all_administrative_levels import attach_country_info, structure_output
+from split_by_country import MASTER_FILE, export_countries
+
+BENCHMARK_ROWS = (1_000_000, 10_000_000, 50_000_000)
+BENCHMARK_DIR = Path('.gns_benchmark')
+RESULTS_FILE = 'benchmark_results.json'
+
+# Excel sheets hold at most this many rows, header included
+EXCEL_MAX_ROWS = 1_048_576
+
+# Queries per kind timed in the lookup stage
+LOOKUP_QUERIES = 1000
+
+# Relative slowdown of a stage's wall time reported as a regression
+DEFAULT_TOLERANCE = 0.2
+
+class StageTimer:
+    """Stage metrics of one benchmark run, printed as each stage finishes."""
+    
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.metrics = PipelineMetrics('benchmark')
+    
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """Measure the body of a with block (see pipeline_metrics.py); set record['rows_out'] inside it."""
+        if self.trace_memory:
+            tracemalloc.start()
+        with self.metrics.stage(len(self.metrics.records) + 1, name, rows_in) as record:
+            try:
+                yield record
+            finally:
+                if self.trace_memory:
+                    record['traced_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 1)
+                    tracemalloc.stop()
+        print(f"   {format_record(record)}")
+    
+    def skip(self, name, reason):
+        """Record a stage that was not run."""
+        self.metrics.records.append({'stage': len(self.metrics.records) + 1, 'name': name, 'skipped': reason})
+        print(f"   {name:<12} skipped: {reason}")
+
+@contextmanager
+def working_directory(path):
+    """Run the body of a with block inside another directory."""
+    previous = Path.cwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+def prepare_dataset(rows, data_dir=BENCHMARK_DIR, seed=0):
+    """Return the directory of the synthetic dataset with this row count, generating it if needed."""
+    dataset_dir = Path(data_dir) / f'rows_{rows}_seed_{seed}'
+    if not (dataset_dir / ADMIN_REGIONS_FILE).exists():
+        print(f"   Generating {rows:,} synthetic rows in {dataset_dir}...")
+        generate_dataset(dataset_dir, rows, seed)
+    return dataset_dir
+
+def time_lookup(lookup, output_df, rng):
+    """Run LOOKUP_QUERIES queries of each kind the lookup tool answers."""
+    countries = rng.choice(output_df['Country_Code'].dropna().unique(), LOOKUP_QUERIES)
+    features = rng.choice(output_df['Unique_Feature_ID'].to_numpy(), LOOKUP_QUERIES)
+    names = rng.choice(output_df['Administrative_Name'].to_numpy(), LOOKUP_QUERIES)
+    for country, feature_id, name in zip(countries, features, names):
+        lookup.search(country_code=country, admin_level='ADM2')
+        lookup.feature(feature_id)
+        lookup.search(name_filter=name[:max(3, len(name) // 2)])
+        lookup.ancestors(feature_id)
+
+def run_benchmark(rows, timer, data_dir=BENCHMARK_DIR, seed=0, streaming_excel=False, workers=1):
+    """Run every stage on the dataset with this row count and return the stage records."""
+    print(f"\n📏 {rows:,} rows")
+    dataset_dir = prepare_dataset(rows, data_dir, seed)
+    timer.metrics = PipelineMetrics(f'benchmark_{rows}')
+    
+    with working_directory(dataset_dir):
+        countries_df = pd.read_csv('Country_Codes.csv')
+        
+        with timer.stage('read') as record:
+            raw = next(iter_gns_blocks(ADMIN_REGIONS_FILE, ADMIN_COLUMNS))
+            record['rows_out'] = len(raw)
+        
+        with timer.stage('filter', len(raw)) as record:
+            filtered, _ = filter_admin_records(raw)
+            filtered = apply_schema(filtered).reset_index(drop=True)
+            record['rows_out'] = len(filtered)
+        del raw
+        
+        # The rank and dedup stages of the processor, under the default ranking profile
+        with timer.stage('rank', len(filtered)) as record:
+            profiles = resolve_profiles([RANKING_PROFILES['default']], filtered)
+            scores = profile_scores(filtered, profiles)
+            record['rows_out'] = len(scores)
+        
+        with timer.stage('dedup', len(filtered)) as record:
+            deduplicated = best_rows_by_profile(filtered, scores)[profiles[0].name]
+            record['rows_out'] = len(deduplicated)
+        del filtered, scores
+        
+        with timer.stage('merge', len(deduplicated)) as record:
+            output_df = structure_output(attach_country_info(deduplicated, countries_df))
+            record['rows_out'] = len(output_df)
+        
+        if len(output_df) >= EXCEL_MAX_ROWS:
+            timer.skip('excel', f"{len(output_df):,} rows exceed the Excel sheet limit")
+        else:
+            with timer.stage('excel', len(output_df)) as record:
+                write_master_workbook(
+                    output_df, MASTER_FILE, country_level_pivot(output_df), streaming=streaming_excel
+                )
+                record['rows_out'] = len(output_df)
+        
+        largest_country = output_df['Country_Name'].value_counts().max()
+        if largest_country >= EXCEL_MAX_ROWS:
+            timer.skip('split', f"a country of {largest_country:,} rows exceeds the Excel sheet limit")
+        else:
+            with timer.stage('split', len(output_df)) as record:
+                export_countries(output_df, workers=workers)
+                record['rows_out'] = len(output_df)
+        
+        with timer.stage('lookup', len(output_df)) as record:
+            lookup = AdminLookup(output_df)
+            lookup.name_index()
+            lookup.hierarchy()
+            time_lookup(lookup, output_df, np.random.default_rng(seed))
+            record['rows_out'] = 4 * LOOKUP_QUERIES
+    
+    return timer.metrics.records
+
+def find_regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Return (rows, stage, baseline wall, new wall) of the stages slower than baseline by more than tolerance."""
+    previous = {
+        (run['rows'], stage['name']): stage['wall_s']
+        for run in baseline['runs'] for stage in run['stages'] if 'wall_s' in stage
+    }
+    regressions = []
+    for run in results['runs']:
+        for stage in run['stages']:
+            before = previous.get((run['rows'], stage['name']))
+            if before and 'wall_s' in stage and stage['wall_s'] > before * (1 + tolerance):
+                regressions.append((run['rows'], stage['name'], before, stage['wall_s']))
+    return regressions
+
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic GNS data.")
+    parser.add_argument(
+        '--rows', type=int, nargs='+', default=list(BENCHMARK_ROWS),
+        help="GNS row counts to benchmark (default: 1M 10M 50M)"
+    )
+    parser.add_argument('--data-dir', default=str(BENCHMARK_DIR), help="directory of the generated datasets")
+    parser.add_argument('--seed', type=int, default=0, help="random seed of the generated data")
+    parser.add_argument('--output', default=RESULTS_FILE, help=f"JSON results file (default: {RESULTS_FILE})")
+    parser.add_argument('--baseline', help="previous results file to compare against")
+    parser.add_argument(
+        '--tolerance', type=float, default=DEFAULT_TOLERANCE,
+        help=f"relative slowdown reported as a regression (default: {DEFAULT_TOLERANCE})"
+    )
+    parser.add_argument('--streaming-excel', action='store_true', help="benchmark the streaming workbook writer")
+    parser.add_argument('--workers', type=int, default=1, help="processes used for the country split")
+    parser.add_argument(
+        '--trace-memory', action='store_true',
+        help="also trace the peak allocation inside each stage (slower)"
+    )
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    print("GNS Pipeline Benchmark")
+    print("=" * 55)
+    
+    # Read before the run, since the results may overwrite the same file
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    
+    timer = StageTimer(trace_memory=args.trace_memory)
+    results = {
+        'python': sys.version.split()[0],
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'streaming_excel': args.streaming_excel,
+        'runs': []
+    }
+    for rows in args.rows:
+        stages = run_benchmark(rows, timer, args.data_dir, args.seed, args.streaming_excel, args.workers)
+        results['runs'].append({'rows': rows, 'stages': stages})
+    
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2)
+    print(f"\n✅ Results written to {args.output}")
+    
+    if baseline is not None:
+        regressions = find_regressions(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} stage(s) slower than {args.baseline}:")
+            for rows, stage, before, after in regressions:
+                print(f"   {rows:,} rows, {stage}: {before:.2f}s -> {after:.2f}s")
+            sys.exit(1)
+        print(f"   No stage slower than {args.baseline} by more than {args.tolerance:.0%}")
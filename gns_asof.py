@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Point-in-time selection of GNS names.
+Every name row carries an effective date (efctv_dt) and may carry a
+termination date for the name (term_dt_n) or for the whole feature
+(term_dt_f). A NameValidityIndex turns these into an interval index of the
+period each candidate row is valid, [efctv_dt, earliest termination), so the
+rows valid on a date are found in one vectorized lookup. It backs the as-of
+mode of process_all_administrative_levels.py (--as-of DATE) and answers
+"what was this division called on date D" from the command line:
+    python3 gns_asof.py UFI [--date YYYY-MM-DD]
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from gns_dedup import RANKING_PROFILES, deduplicate_names, profile_scores, resolve_profiles
+
+# Open ends of validity intervals: no effective date or no termination date
+EARLIEST = pd.Timestamp.min
+LATEST = pd.Timestamp.max
+
+def parse_gns_dates(series):
+    """Parse a GNS date column (YYYY-MM-DD, empty when unknown) to datetimes, NaT when missing."""
+    return pd.to_datetime(series.astype(object), format='ISO8601', errors='coerce')
+
+def as_of_date(text):
+    """Parse a date given on the command line; 'today' is the current date."""
+    if text == 'today':
+        return pd.Timestamp.today().normalize()
+    return pd.Timestamp(text)
+
+class NameValidityIndex:
+    """Validity intervals of candidate name rows, for selecting the rows valid on a date."""
+    
+    def __init__(self, candidates):
+        self.candidates = candidates.reset_index(drop=True)
+        start = parse_gns_dates(self.candidates['efctv_dt']).fillna(EARLIEST)
+        name_end = parse_gns_dates(self.candidates['term_dt_n'])
+        feature_end = parse_gns_dates(self.candidates['term_dt_f'])
+        
+        # A row stops being valid when either the name or the feature is terminated
+        end = np.fmin(name_end.to_numpy(), feature_end.to_numpy())
+        end = pd.Series(end).fillna(LATEST)
+        
+        # Rows terminated before they took effect get an empty interval
+        end = end.where(end >= start, start)
+        self.intervals = pd.IntervalIndex.from_arrays(start, end, closed='left')
+        self._feature_rows = None
+    
+    def valid_at(self, date):
+        """Return a boolean array marking the candidate rows valid on date."""
+        return self.intervals.contains(pd.Timestamp(date))
+    
+    def candidates_at(self, date):
+        """Return the candidate rows valid on date."""
+        return self.candidates[self.valid_at(date)]
+    
+    def change_dates(self):
+        """Return the sorted dates on which the set of valid rows changes."""
+        boundaries = np.concatenate([self.intervals.left.to_numpy(), self.intervals.right.to_numpy()])
+        boundaries = np.unique(boundaries)
+        return pd.DatetimeIndex(boundaries[(boundaries != EARLIEST) & (boundaries != LATEST)])
+    
+    def feature_rows(self, ufi):
+        """Return the positions of the candidate rows of one feature."""
+        if self._feature_rows is None:
+            self._feature_rows = self.candidates.groupby('ufi', sort=False).indices
+        return self._feature_rows.get(ufi, np.array([], dtype=np.int64))
+    
+    def history(self, ufi, profile=RANKING_PROFILES['default']):
+        """Return the name rows of a feature with their validity, best ranked first."""
+        positions = self.feature_rows(ufi)
+        rows = self.candidates.iloc[positions]
+        profile = resolve_profiles([profile], self.candidates)[0]
+        scores = profile_scores(rows, [profile])[profile.name].to_numpy()
+        history = rows.assign(
+            valid_from=self.intervals.left[positions],
+            valid_until=self.intervals.right[positions],
+            score=scores
+        )
+        return history.sort_values(['score', 'uni'], kind='stable')
+    
+    def name_at(self, ufi, date, profile=RANKING_PROFILES['default']):
+        """Return the row of the name a feature had on date, or None if it had none."""
+        positions = self.feature_rows(ufi)
+        valid = self.intervals[positions].contains(pd.Timestamp(date))
+        rows = self.candidates.iloc[positions[valid]]
+        if rows.empty:
+            return None
+        # Country languages come from the rows valid on date, as in the processor's as-of mode
+        profile = resolve_profiles([profile], self.candidates_at(date))[0]
+        return deduplicate_names(rows, profile=profile).iloc[0]
+
+def _format_date(value):
+    if value == EARLIEST or value == LATEST:
+        return ''
+    return f"{value:%Y-%m-%d}"
+
+def main(argv=None):
+    """Print the names of a feature over time and the one in use on a date."""
+    from gns_reader import ADMIN_COLUMNS, ADMIN_REGIONS_FILE, read_admin_regions
+    
+    parser = argparse.ArgumentParser(description="Show which name a GNS division had on a date.")
+    parser.add_argument('ufi', type=int, help="unique feature identifier (Unique_Feature_ID)")
+    parser.add_argument('--date', type=as_of_date, default='today',
+                        help="date to resolve the name for, YYYY-MM-DD (default: today)")
+    parser.add_argument('--ranking', default='default', choices=sorted(RANKING_PROFILES),
+                        help="name ranking profile (default: default)")
+    args = parser.parse_args(argv)
+    
+    date = args.date
+    candidates, _ = read_admin_regions(ADMIN_REGIONS_FILE, usecols=ADMIN_COLUMNS, use_cache=True)
+    index = NameValidityIndex(candidates)
+    profile = RANKING_PROFILES[args.ranking]
+    
+    history = index.history(args.ufi, profile)
+    if history.empty:
+        print(f"No administrative division with UFI {args.ufi}")
+        return
+    
+    current = index.name_at(args.ufi, date, profile)
+    print(f"Names of UFI {args.ufi} ({history['desig_cd'].iloc[0]}, {history['cc_ft'].iloc[0]}):")
+    for row in history.itertuples():
+        marker = '*' if current is not None and row.uni == current['uni'] else ' '
+        print(f" {marker} {row.full_name:<40} {row.nt}  {_format_date(row.valid_from):>10} - "
+              f"{_format_date(row.valid_until):<10}  (UNI {row.uni})")
+    if current is None:
+        print(f"\nNo name was valid on {date:%Y-%m-%d}")
+    else:
+        print(f"\nName on {date:%Y-%m-%d}: {current['full_name']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Persistent columnar cache for parsed GNS source files.
+The first run converts the tab-separated dump into a typed Parquet file under
+.gns_cache/, with the codes dictionary-encoded. Later runs load from it for as long as the source file keeps the
+same size, modification time and content hash.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+CACHE_DIR = Path('.gns_cache')
+
+# Bytes read per step when hashing the source file
+HASH_BLOCK_SIZE = 8 * 1024 * 1024
+
+def cache_available():
+    """Return True if the Parquet engine needed by the cache is installed."""
+    return pq is not None
+
+def file_hash(path):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def file_fingerprint(path):
+    """Return the size, modification time and content hash of a file."""
+    stat = os.stat(path)
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': file_hash(path)
+    }
+
+def _manifest_path(source, cache_dir):
+    return Path(cache_dir) / f"{Path(source).stem}.json"
+
+def _write_manifest(manifest_file, manifest):
+    tmp_file = manifest_file.with_suffix('.json.tmp')
+    with open(tmp_file, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_file, manifest_file)
+
+def find_cached_source(source, columns, cache_dir=CACHE_DIR, schema_version=None):
+    """Return the cache file for a source if it is still valid, otherwise None."""
+    manifest_file = _manifest_path(source, cache_dir)
+    if not manifest_file.exists():
+        return None
+    
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    
+    cache_file = Path(cache_dir) / manifest['cache_file']
+    if not cache_file.exists() or not set(columns) <= set(manifest['columns']):
+        return None
+    if manifest.get('schema_version') != schema_version:
+        return None
+    
+    stat = os.stat(source)
+    if stat.st_size != manifest['size']:
+        return None
+    
+    if stat.st_mtime_ns != manifest['mtime_ns']:
+        # The file was touched; only trust the cache if the contents are unchanged
+        if file_hash(source) != manifest['sha256']:
+            return None
+        manifest['mtime_ns'] = stat.st_mtime_ns
+        _write_manifest(manifest_file, manifest)
+    
+    return cache_file
+
+def read_cache_blocks(cache_file, columns, chunksize=None):
+    """Yield the cached rows as DataFrames, in blocks of chunksize rows if given."""
+    # Integer columns are nullable identifiers; without a mapper a block with a
+    # missing identifier would come back as floats
+    types_mapper = {pa.int64(): pd.Int64Dtype()}.get
+    if chunksize is None:
+        yield pq.read_table(cache_file, columns=list(columns)).to_pandas(types_mapper=types_mapper)
+        return
+    
+    parquet_file = pq.ParquetFile(cache_file)
+    for batch in parquet_file.iter_batches(batch_size=chunksize, columns=list(columns)):
+        yield batch.to_pandas(types_mapper=types_mapper)
+
+def arrow_schema(df):
+    """Build a fixed Arrow schema so every block is written with the same types."""
+    fields = []
+    for column, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            # Categorical codes are stored dictionary-encoded and read back as categoricals
+            arrow_type = pa.dictionary(pa.int32(), pa.string())
+        elif str(dtype) == 'Int64':
+            arrow_type = pa.int64()
+        elif dtype.kind in 'iuf':
+            arrow_type = pa.from_numpy_dtype(dtype)
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column, arrow_type))
+    return pa.schema(fields)
+
+class CacheWriter:
+    """Write parsed blocks of a GNS source file to a new cache file.
+    
+    Used as a context manager: the cache is committed when the block exits
+    normally and discarded if it raises or is abandoned part way through.
+    """
+    
+    def __init__(self, source, columns, cache_dir=CACHE_DIR, schema_version=None):
+        self.source = Path(source)
+        self.columns = list(columns)
+        self.schema_version = schema_version
+        self.cache_dir = Path(cache_dir)
+        self.fingerprint = file_fingerprint(source)
+        self.cache_file = self.cache_dir / f"{self.source.stem}-{self.fingerprint['sha256'][:16]}.parquet"
+        self.tmp_file = self.cache_file.with_suffix('.parquet.tmp')
+        self.writer = None
+        self.schema = None
+    
+    def __enter__(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+    
+    def write(self, df):
+        """Append a block of parsed rows to the cache."""
+        if self.writer is None:
+            self.schema = arrow_schema(df)
+            self.writer = pq.ParquetWriter(self.tmp_file, self.schema)
+        table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+        self.writer.write_table(table)
+    
+    def commit(self):
+        """Move the finished cache file into place and record its manifest."""
+        if self.writer is None:
+            return
+        self.writer.close()
+        os.replace(self.tmp_file, self.cache_file)
+        
+        manifest_file = _manifest_path(self.source, self.cache_dir)
+        # Remove the cache file of a previous version of the source
+        if manifest_file.exists():
+            with open(manifest_file) as f:
+                old_cache_file = self.cache_dir / json.load(f)['cache_file']
+            if old_cache_file != self.cache_file and old_cache_file.exists():
+                old_cache_file.unlink()
+        
+        manifest = dict(self.fingerprint)
+        manifest['source'] = str(self.source)
+        manifest['cache_file'] = self.cache_file.name
+        manifest['columns'] = self.columns
+        manifest['schema_version'] = self.schema_version
+        _write_manifest(manifest_file, manifest)
+    
+    def abort(self):
+        """Discard a partially written cache file."""
+        if self.writer is not None:
+            self.writer.close()
+        if self.tmp_file.exists():
+            self.tmp_file.unlink()
+
+class PartitionWriter:
+    """Append blocks of rows to one Parquet file per partition key.
+    
+    Every file gets the schema of the first block written. Used as a context
+    manager, which closes all files on exit.
+    """
+    
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.schema = None
+        self.writers = {}
+    
+    def __enter__(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+    
+    def path(self, key):
+        """Return the file holding the rows of a partition."""
+        return self.directory / f"{key}.parquet"
+    
+    def write(self, key, df):
+        """Append a block of rows to the file of a partition."""
+        if self.schema is None:
+            self.schema = arrow_schema(df)
+        writer = self.writers.get(key)
+        if writer is None:
+            writer = self.writers[key] = pq.ParquetWriter(self.path(key), self.schema)
+        writer.write_table(pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+    
+    def close(self):
+        """Finish every partition file."""
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Best-name selection for GNS features.
+A feature (ufi) usually has several name rows. Each row gets a single integer
+score built from its name type, name rank and language, and exactly one row
+per feature is kept: the one with the lowest score. The selection uses hash
+based group reductions instead of sorting every candidate row.
+Ranking profiles describe alternative name preferences (for example English
+first, or each country's own language first). Several profiles are scored over
+the candidate rows together and yield one deduplicated set each.
+"""
+
+import json
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Name Type (nt) priority: N (Approved/Official) > C (Conventional) > D (Non-authoritative) > V (Variant)
+NAME_TYPE_PRIORITY = {'N': 1, 'C': 2, 'D': 3, 'V': 4}
+
+# Language priority: English (eng) = 1, common local languages = 2, others = 3
+COMMON_LOCAL_LANGS = frozenset({'spa', 'fra', 'deu', 'ita', 'por', 'rus', 'ara', 'zho', 'jpn', 'hin'})
+
+# Priority given to unknown name types and missing name ranks
+UNKNOWN_PRIORITY = 999
+
+# Each score component gets its own range of decimal digits, so comparing
+# scores compares name type first, then name rank, then language
+RANK_FACTOR = 10 ** 6
+LANGUAGE_FACTOR = 10 ** 3
+
+# Language tier standing for the languages of the feature's own country
+LOCAL = 'local'
+
+# name_type_priority maps name types to priorities; language_tiers lists tiers of
+# language codes from most to least preferred (LOCAL for the country's own
+# languages), unlisted languages coming last; country_langs maps country codes
+# to their languages, or is None to take each country's most used language
+RankingProfile = namedtuple('RankingProfile', ['name', 'name_type_priority', 'language_tiers', 'country_langs'])
+
+def default_profile(name_type_priority=NAME_TYPE_PRIORITY, local_langs=COMMON_LOCAL_LANGS):
+    """Return the full processor's rule as a ranking profile.
+    
+    English comes first, then the given local languages, then others.
+    """
+    return RankingProfile('default', name_type_priority, (('eng',), tuple(sorted(local_langs))), None)
+
+RANKING_PROFILES = {
+    # The full processor's rule: English, then common local languages, then others
+    'default': default_profile(),
+    # English first, then all others equally
+    'english': RankingProfile('english', NAME_TYPE_PRIORITY, (('eng',),), None),
+    # The country's own language first, then English, then others
+    'local': RankingProfile('local', NAME_TYPE_PRIORITY, (LOCAL, ('eng',)), None)
+}
+
+# Console labels of the name types and language tiers
+NAME_TYPE_LABELS = {'N': 'Approved (N)', 'C': 'Conventional (C)', 'D': 'Non-auth (D)', 'V': 'Variant (V)'}
+LANGUAGE_LABELS = {'eng': 'English language', LOCAL: "Country's own language"}
+
+def describe_profile(profile):
+    """Return the name type order and the name rank and language order of a profile, as text."""
+    name_types = sorted(profile.name_type_priority, key=profile.name_type_priority.get)
+    tiers = [
+        LANGUAGE_LABELS.get(tier if tier == LOCAL else ', '.join(tier), ', '.join(tier))
+        for tier in profile.language_tiers
+    ]
+    return (
+        ' > '.join(NAME_TYPE_LABELS.get(nt, nt) for nt in name_types),
+        ' > '.join(['Lower name_rank', *tiers, 'others'])
+    )
+
+def lookup_priority(series, mapping, default):
+    """Map values to integer priorities, falling back to default for unmapped values.
+    
+    Categorical columns are mapped once per category and expanded through the codes.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        category_priority = np.array(
+            [mapping.get(category, default) for category in series.cat.categories] + [default],
+            dtype=np.int64
+        )
+        # Missing values have code -1, which picks the trailing default
+        return category_priority[series.cat.codes.to_numpy()]
+    return series.map(mapping).fillna(default).to_numpy(dtype=np.int64)
+
+def deduplicate_names(df, name_type_priority=NAME_TYPE_PRIORITY, local_langs=COMMON_LOCAL_LANGS,
+                      profile=None):
+    """Keep exactly one name row, the best one, for each unique feature (ufi).
+    
+    The rows are ranked by profile if given, a resolved ranking profile, and
+    otherwise by the default rule built from name_type_priority and local_langs.
+    Ties on the score are broken by the lowest uni, so the result does not
+    depend on the order of the input rows.
+    """
+    if profile is None:
+        profile = default_profile(name_type_priority, local_langs)
+    return deduplicate_profiles(df, [profile])[profile.name]
+
+def load_profiles(path):
+    """Read ranking profiles from a JSON file mapping profile names to their settings.
+    
+    Each entry may set name_type_priority, language_tiers (lists of language
+    codes, or "local") and country_langs; missing settings take the defaults.
+    """
+    with open(path) as f:
+        definitions = json.load(f)
+    
+    profiles = {}
+    for name, settings in definitions.items():
+        tiers = settings.get('language_tiers', RANKING_PROFILES['default'].language_tiers)
+        country_langs = settings.get('country_langs')
+        profiles[name] = RankingProfile(
+            name,
+            settings.get('name_type_priority', NAME_TYPE_PRIORITY),
+            tuple(tier if tier == LOCAL else tuple(tier) for tier in tiers),
+            None if country_langs is None else {cc: tuple(langs) for cc, langs in country_langs.items()}
+        )
+    return profiles
+
+def infer_country_languages(df):
+    """Return the most used language other than English of each country's name rows."""
+    known = df['lang_cd'].notna() & (df['lang_cd'] != 'eng')
+    counts = df.loc[known].groupby(['cc_ft', 'lang_cd'], observed=True).size()
+    counts = counts[counts > 0].sort_values(ascending=False, kind='stable')
+    
+    # Ties go to the alphabetically first language, since the groups come out sorted
+    top = counts[~counts.index.get_level_values(0).duplicated()]
+    return {cc: (lang,) for cc, lang in top.index}
+
+def resolve_profiles(profiles, candidates):
+    """Fill in the country languages of profiles that rank local languages.
+    
+    The languages are taken from the whole candidate set, so the profiles score
+    every row the same way however the candidates are later split up.
+    """
+    inferred = None
+    resolved = []
+    for profile in profiles:
+        if LOCAL in profile.language_tiers and profile.country_langs is None:
+            if inferred is None:
+                inferred = infer_country_languages(candidates)
+            profile = profile._replace(country_langs=inferred)
+        resolved.append(profile)
+    return resolved
+
+def _language_table(profile, countries, languages):
+    """Return the language priority of every (country, language) pair under a profile.
+    
+    The extra last row and column hold the priority of a missing country or language.
+    """
+    unlisted = len(profile.language_tiers) + 1
+    table = np.full((len(countries) + 1, len(languages) + 1), unlisted, dtype=np.int64)
+    country_position = {country: i for i, country in enumerate(countries)}
+    language_position = {language: i for i, language in enumerate(languages)}
+    
+    # Later tiers are filled first, so a language listed twice keeps its best tier
+    for tier, members in reversed(list(enumerate(profile.language_tiers, 1))):
+        if members == LOCAL:
+            for country, country_langs in (profile.country_langs or {}).items():
+                if country in country_position:
+                    rows = country_position[country]
+                    columns = [language_position[lang] for lang in country_langs if lang in language_position]
+                    table[rows, columns] = tier
+        else:
+            columns = [language_position[lang] for lang in members if lang in language_position]
+            table[:, columns] = tier
+    return table
+
+def profile_scores(df, profiles):
+    """Score the rows under several resolved ranking profiles; one column per profile.
+    
+    The name ranks and the country and language codes are decoded once. Each
+    profile is then compiled to small priority tables, so its score is a few
+    array lookups over the same codes.
+    """
+    name_rank = df['name_rank'].fillna(UNKNOWN_PRIORITY).clip(0, RANK_FACTOR - 1)
+    rank_priority = name_rank.to_numpy(dtype=np.int64)
+    country_codes, countries = pd.factorize(df['cc_ft'])
+    language_codes, languages = pd.factorize(df['lang_cd'])
+    
+    scores = {}
+    for profile in profiles:
+        nt_priority = lookup_priority(df['nt'], profile.name_type_priority, UNKNOWN_PRIORITY)
+        # Missing codes are -1, which picks the trailing row or column of the table
+        lang_priority = _language_table(profile, countries, languages)[country_codes, language_codes]
+        scores[profile.name] = (nt_priority * RANK_FACTOR + rank_priority) * LANGUAGE_FACTOR + lang_priority
+    return pd.DataFrame(scores, index=df.index)
+
+def best_rows_by_profile(df, scores, key='ufi', tiebreak='uni'):
+    """Return the best row of each key under every score column, as {column: rows}.
+    
+    The minimum score of every profile comes from one group reduction over all
+    score columns. Ties on the score are broken by the lowest tiebreak value.
+    """
+    if df.empty:
+        return {name: df.reset_index(drop=True) for name in scores.columns}
+    keys = df[key].to_numpy()
+    best_scores = scores.groupby(keys, sort=False).transform('min')
+    
+    results = {}
+    for name in scores.columns:
+        contenders = df[scores[name].to_numpy() == best_scores[name].to_numpy()]
+        winners = contenders[tiebreak].groupby(contenders[key].to_numpy()).idxmin()
+        results[name] = df.loc[winners.to_numpy()].reset_index(drop=True)
+    return results
+
+def deduplicate_profiles(df, profiles):
+    """Deduplicate the candidate rows once per resolved ranking profile, as {profile name: rows}."""
+    if not profiles:
+        return {}
+    df = df.reset_index(drop=True)
+    return best_rows_by_profile(df, profile_scores(df, profiles))
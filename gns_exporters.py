@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Output formats for the processed administrative divisions.
+Each exporter writes the final frame (one row per division, with latitude and
+longitude columns) to a file and is registered under a format name:
+- xlsx: the master workbook (see gns_workbook.py)
+- csv: comma-separated values
+- geojsonseq: newline-delimited GeoJSON, one Point feature per line
+- fgb: FlatGeobuf, a binary format with a spatial index (requires pyogrio)
+- sqlite: one SQLite file with B-tree, R*Tree and FTS5 indexes that the
+  lookup tools query in place (see admin_sqlite.py)
+Rows can be put in Hilbert curve order first, so features that are close on
+the map are also close in the file.
+"""
+
+import importlib.util
+import json
+from collections import namedtuple
+
+import numpy as np
+
+from gns_workbook import country_level_pivot, write_master_workbook
+
+OUTPUT_STEM = 'Complete_Administrative_Divisions_with_Coordinates'
+
+# Rows converted at a time by the streaming exporters
+DEFAULT_BATCH_ROWS = 50_000
+
+# Bits per axis of the grid the coordinates are snapped to for Hilbert ordering
+HILBERT_ORDER = 16
+
+# requires lists the optional modules an exporter imports when it writes
+Exporter = namedtuple('Exporter', ['write', 'extension', 'description', 'requires'])
+
+EXPORTERS = {}
+
+def register_exporter(name, extension, description, requires=()):
+    """Decorator registering a function(df, output_file, **options) as an output format."""
+    def register(write):
+        EXPORTERS[name] = Exporter(write, extension, description, tuple(requires))
+        return write
+    return register
+
+def missing_requirements(format_name):
+    """Return the modules needed by a format that are not installed."""
+    return [module for module in EXPORTERS[format_name].requires if importlib.util.find_spec(module) is None]
+
+def output_path(format_name, stem=OUTPUT_STEM):
+    """Return the output file name for a format."""
+    return f"{stem}{EXPORTERS[format_name].extension}"
+
+def export_frame(df, format_name, output_file=None, **options):
+    """Write df in the given format and return the file written."""
+    exporter = EXPORTERS[format_name]
+    output_file = output_file or output_path(format_name)
+    exporter.write(df, output_file, **options)
+    return output_file
+
+def hilbert_index(x, y, order=HILBERT_ORDER):
+    """Return the position along a Hilbert curve of integer grid points (0 <= x, y < 2**order)."""
+    side = 1 << order
+    x = np.asarray(x, dtype=np.int64).copy()
+    y = np.asarray(y, dtype=np.int64).copy()
+    d = np.zeros(len(x), dtype=np.int64)
+    
+    s = side >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx.astype(np.int64)) ^ ry.astype(np.int64))
+        
+        # Rotate the quadrant so the curve continues in the right orientation
+        flip = ~ry & rx
+        x = np.where(flip, side - 1 - x, x)
+        y = np.where(flip, side - 1 - y, y)
+        swap = ~ry
+        x, y = np.where(swap, y, x), np.where(swap, x, y)
+        s >>= 1
+    return d
+
+def hilbert_order(df, latitude='latitude', longitude='longitude', order=HILBERT_ORDER):
+    """Return df with its rows sorted along a Hilbert curve over longitude and latitude."""
+    cells = (1 << order) - 1
+    x = np.rint((df[longitude].to_numpy(dtype=np.float64) + 180.0) / 360.0 * cells)
+    y = np.rint((df[latitude].to_numpy(dtype=np.float64) + 90.0) / 180.0 * cells)
+    index = hilbert_index(np.clip(x, 0, cells), np.clip(y, 0, cells), order)
+    return df.iloc[np.argsort(index, kind='stable')]
+
+def _python_values(series):
+    """Return a column as plain Python values, with None for missing values."""
+    return series.astype(object).where(series.notna(), None).tolist()
+
+@register_exporter('xlsx', '.xlsx', "Excel workbook with level and country summary sheets", requires=['openpyxl'])
+def export_xlsx(df, output_file, country_pivot=None, streaming_excel=False, **options):
+    """Write the master workbook, in streaming mode with streaming_excel."""
+    if country_pivot is None:
+        country_pivot = country_level_pivot(df)
+    write_master_workbook(df, output_file, country_pivot, streaming=streaming_excel)
+
+@register_exporter('csv', '.csv', "comma-separated values")
+def export_csv(df, output_file, batch_rows=DEFAULT_BATCH_ROWS, **options):
+    """Write the rows as UTF-8 CSV, batch_rows rows at a time."""
+    df.to_csv(output_file, index=False, chunksize=batch_rows)
+
+@register_exporter('geojsonseq', '.geojsonl', "newline-delimited GeoJSON features")
+def export_geojsonseq(df, output_file, batch_rows=DEFAULT_BATCH_ROWS,
+                      latitude='latitude', longitude='longitude', **options):
+    """Write one GeoJSON Point feature per line, with the other columns as properties."""
+    property_columns = [column for column in df.columns if column not in (latitude, longitude)]
+    with open(output_file, 'w', encoding='utf-8') as f:
+        for start in range(0, len(df), batch_rows):
+            batch = df.iloc[start:start + batch_rows]
+            coordinates = zip(_python_values(batch[longitude]), _python_values(batch[latitude]))
+            properties = zip(*(_python_values(batch[column]) for column in property_columns))
+            for (lon, lat), values in zip(coordinates, properties):
+                feature = {
+                    'type': 'Feature',
+                    'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+                    'properties': dict(zip(property_columns, values))
+                }
+                f.write(json.dumps(feature, ensure_ascii=False))
+                f.write('\n')
+
+def point_wkb(longitudes, latitudes):
+    """Encode points as little-endian WKB, one bytes object per point."""
+    records = np.empty(len(longitudes), dtype=[
+        ('byte_order', 'u1'), ('geometry_type', '<u4'), ('x', '<f8'), ('y', '<f8')
+    ])
+    records['byte_order'] = 1
+    records['geometry_type'] = 1
+    records['x'] = longitudes
+    records['y'] = latitudes
+    
+    size = records.dtype.itemsize
+    buffer = records.tobytes()
+    return np.array([buffer[i:i + size] for i in range(0, len(buffer), size)], dtype=object)
+
+@register_exporter('fgb', '.fgb', "FlatGeobuf with a spatial index (requires pyogrio)", requires=['pyogrio'])
+def export_fgb(df, output_file, latitude='latitude', longitude='longitude', **options):
+    """Write a FlatGeobuf layer of points in WGS 84."""
+    try:
+        from pyogrio.raw import write
+    except ImportError:
+        raise ImportError("FlatGeobuf output requires pyogrio (pip install pyogrio)")
+    
+    fields = [column for column in df.columns if column not in (latitude, longitude)]
+    field_data = []
+    for column in fields:
+        values = df[column]
+        if values.dtype.kind in 'iuf' and values.hasnans:
+            # Missing values of integer columns are written as null through NaN
+            field_data.append(values.to_numpy(dtype=np.float64, na_value=np.nan))
+        elif values.dtype.kind in 'iuf':
+            field_data.append(values.to_numpy())
+        else:
+            field_data.append(np.array(_python_values(values), dtype=object))
+    
+    geometry = point_wkb(df[longitude].to_numpy(dtype=np.float64), df[latitude].to_numpy(dtype=np.float64))
+    write(
+        output_file, geometry, field_data, fields,
+        driver='FlatGeobuf', geometry_type='Point', crs='EPSG:4326'
+    )
+
+@register_exporter('sqlite', '.sqlite', "SQLite file with B-tree, R*Tree and FTS5 indexes for the lookup tools")
+def export_sqlite(df, output_file, **options):
+    """Write the rows and their lookup indexes to a SQLite file."""
+    from admin_sqlite import write_sqlite
+    write_sqlite(df, output_file)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Incremental rebuilds from successive GNS releases.
+Each incremental run stores a snapshot of the candidate name rows (as ufi, uni
+and a digest of the whole row) together with the deduplicated features. The
+next run hash-joins the new release against that snapshot, re-runs the
+deduplication only for features whose name rows changed and reports which
+features were added, removed, renamed or moved.
+"""
+
+import hashlib
+import json
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from gns_cache import cache_available
+from gns_schema import concat_blocks
+
+SNAPSHOT_DIR = Path('.gns_snapshot')
+CHANGE_REPORT_FILE = 'GNS_Change_Report.json'
+
+Snapshot = namedtuple('Snapshot', ['candidate_keys', 'deduplicated'])
+
+# Coordinate differences below this many degrees are not reported as moves
+MOVE_TOLERANCE = 1e-6
+
+def settings_digest(settings):
+    """Return a stable digest of the settings a snapshot was produced with."""
+    encoded = json.dumps(settings, sort_keys=True, default=sorted)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+def candidate_keys(candidates):
+    """Return the ufi, uni and a digest of every column for each candidate name row."""
+    return pd.DataFrame({
+        'ufi': candidates['ufi'].to_numpy(),
+        'uni': candidates['uni'].to_numpy(),
+        'digest': pd.util.hash_pandas_object(
+            candidates[sorted(candidates.columns)], index=False
+        ).to_numpy()
+    })
+
+def load_snapshot(settings, snapshot_dir=SNAPSHOT_DIR):
+    """Return the previous run's snapshot, or None if there is none usable.
+    
+    A snapshot taken with different settings (ranking rules, filters, schema or
+    country list) cannot be reused, since its deduplicated features would differ.
+    """
+    snapshot_dir = Path(snapshot_dir)
+    manifest_file = snapshot_dir / 'manifest.json'
+    if not cache_available() or not manifest_file.exists():
+        return None
+    
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    if manifest.get('settings') != settings_digest(settings):
+        return None
+    
+    return Snapshot(
+        candidate_keys=pd.read_parquet(snapshot_dir / 'candidates.parquet'),
+        deduplicated=pd.read_parquet(snapshot_dir / 'deduplicated.parquet')
+    )
+
+def save_snapshot(candidates, deduplicated, settings, snapshot_dir=SNAPSHOT_DIR):
+    """Store the candidate row keys and deduplicated features for the next run."""
+    if not cache_available():
+        print("   pyarrow is not installed; no snapshot saved for incremental runs")
+        return
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    candidate_keys(candidates).to_parquet(snapshot_dir / 'candidates.parquet', index=False)
+    deduplicated.to_parquet(snapshot_dir / 'deduplicated.parquet', index=False)
+    with open(snapshot_dir / 'manifest.json', 'w') as f:
+        json.dump({
+            'settings': settings_digest(settings),
+            'candidates': len(candidates),
+            'features': len(deduplicated)
+        }, f, indent=2)
+
+def changed_features(candidates, previous_keys):
+    """Return the ufis whose name rows were added, removed or modified since the snapshot."""
+    merged = candidate_keys(candidates).merge(
+        previous_keys, on=['ufi', 'uni', 'digest'], how='outer', indicator=True
+    )
+    return np.unique(merged.loc[merged['_merge'] != 'both', 'ufi'].to_numpy())
+
+def incremental_deduplicate(candidates, snapshot, deduplicate):
+    """Deduplicate a new release, reusing the snapshot for unchanged features.
+    
+    deduplicate is the function used for a full run; it is only applied to the
+    candidate rows of changed features. Returns the deduplicated features, sorted
+    by ufi, and the array of changed ufis.
+    """
+    changed = changed_features(candidates, snapshot.candidate_keys)
+    
+    redone = deduplicate(candidates[candidates['ufi'].isin(changed)])
+    unchanged = snapshot.deduplicated[~snapshot.deduplicated['ufi'].isin(changed)]
+    
+    deduplicated = concat_blocks([unchanged.reset_index(drop=True), redone])
+    deduplicated = deduplicated.sort_values('ufi', kind='stable').reset_index(drop=True)
+    return deduplicated, changed
+
+def _records(df, columns):
+    """Convert rows to a list of JSON-ready dicts."""
+    return json.loads(df[columns].to_json(orient='records'))
+
+def build_change_report(previous, current):
+    """List the features added, removed, renamed and moved between two deduplicated sets."""
+    feature_columns = ['ufi', 'cc_ft', 'desig_cd', 'full_name', 'lat_dd', 'long_dd']
+    previous = previous[feature_columns]
+    current = current[feature_columns]
+    
+    added = current[~current['ufi'].isin(previous['ufi'])]
+    removed = previous[~previous['ufi'].isin(current['ufi'])]
+    
+    both = previous.merge(current, on='ufi', suffixes=('_previous', '_current'))
+    renamed = both[both['full_name_previous'].astype(object) != both['full_name_current'].astype(object)]
+    moved = both[
+        ((both['lat_dd_previous'] - both['lat_dd_current']).abs() > MOVE_TOLERANCE) |
+        ((both['long_dd_previous'] - both['long_dd_current']).abs() > MOVE_TOLERANCE)
+    ]
+    
+    return {
+        'summary': {
+            'previous_features': len(previous),
+            'current_features': len(current),
+            'added': len(added),
+            'removed': len(removed),
+            'renamed': len(renamed),
+            'moved': len(moved)
+        },
+        'added': _records(added, feature_columns),
+        'removed': _records(removed, feature_columns),
+        'renamed': _records(renamed, [
+            'ufi', 'cc_ft_current', 'desig_cd_current', 'full_name_previous', 'full_name_current'
+        ]),
+        'moved': _records(moved, [
+            'ufi', 'cc_ft_current', 'desig_cd_current', 'full_name_current',
+            'lat_dd_previous', 'long_dd_previous', 'lat_dd_current', 'long_dd_current'
+        ])
+    }
+
+def write_change_report(report, output_file=CHANGE_REPORT_FILE):
+    """Write the change report as JSON."""
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return output_file
+
+def affected_country_codes(previous, current, changed):
+    """Return the country codes holding any changed feature, before or after the change."""
+    codes = pd.concat([
+        previous.loc[previous['ufi'].isin(changed), 'cc_ft'].astype(object),
+        current.loc[current['ufi'].isin(changed), 'cc_ft'].astype(object)
+    ])
+    return set(codes.dropna())
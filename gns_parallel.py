@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Multi-core execution of the GNS processing steps.
+- Reading: the tab-separated file is cut into byte ranges on line boundaries and
+  each worker parses and filters its own ranges
+- Ranking and deduplication: candidate rows are sharded by country (cc_ft),
+  keeping all rows of a feature together, and each worker scores its shard
+  under the ranking profiles, picks the best row of each feature and
+  summarizes its rows (see gns_summary.py)
+Results are concatenated in a fixed order, so the output matches a serial run.
+"""
+
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from gns_dedup import best_rows_by_profile, deduplicate_names, profile_scores
+from gns_reader import filter_admin_records
+from gns_schema import apply_schema, concat_blocks, parse_dtypes
+from gns_summary import SummaryAccumulator, summarize_profiles
+
+# Bytes of the source file parsed per task; bounds the memory used by each worker
+DEFAULT_RANGE_SIZE = 64 * 1024 * 1024
+
+# Country shards created per worker, so large and small countries balance out
+SHARDS_PER_WORKER = 4
+
+def resolve_workers(workers):
+    """Return the number of worker processes to use (0 or None means one per CPU core)."""
+    if not workers:
+        return os.cpu_count() or 1
+    return max(1, workers)
+
+def file_byte_ranges(path, range_size=DEFAULT_RANGE_SIZE):
+    """Split a text file after its header line into (start, end) byte ranges on line boundaries."""
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.readline()
+        boundaries = [len(header)]
+        position = len(header) + range_size
+        while position < file_size:
+            f.seek(position)
+            f.readline()
+            if f.tell() >= file_size:
+                break
+            if f.tell() > boundaries[-1]:
+                boundaries.append(f.tell())
+            position = boundaries[-1] + range_size
+        boundaries.append(file_size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+def read_header(path):
+    """Return the column names from the header line of a tab-separated file."""
+    with open(path, encoding='utf-8') as f:
+        return f.readline().rstrip('\r\n').split('\t')
+
+def _filter_byte_range(task):
+    """Parse one byte range of the GNS file and apply the administrative filters."""
+    path, start, end, names, usecols, require_display_flag = task
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    
+    block = pd.read_csv(
+        io.BytesIO(data),
+        sep='\t',
+        header=None,
+        names=names,
+        usecols=usecols,
+        dtype=parse_dtypes(usecols),
+        low_memory=False
+    )
+    if usecols is not None:
+        block = block[usecols]
+    filtered, counts = filter_admin_records(block, require_display_flag)
+    return apply_schema(filtered), counts
+
+def read_admin_regions_parallel(path, usecols, require_display_flag=True, workers=None,
+                                range_size=DEFAULT_RANGE_SIZE):
+    """Parallel version of gns_reader.read_admin_regions for the GNS text file.
+    
+    Returns the filtered rows, in file order, and the per-filter row counts.
+    """
+    names = read_header(path)
+    tasks = [
+        (path, start, end, names, usecols, require_display_flag)
+        for start, end in file_byte_ranges(path, range_size)
+        if end > start
+    ]
+    
+    kept_blocks = []
+    counts = {}
+    with ProcessPoolExecutor(max_workers=resolve_workers(workers)) as executor:
+        for filtered, block_counts in executor.map(_filter_byte_range, tasks):
+            kept_blocks.append(filtered)
+            for stage, count in block_counts.items():
+                counts[stage] = counts.get(stage, 0) + count
+    
+    if not kept_blocks:
+        empty_df = pd.read_csv(path, sep='\t', usecols=usecols, nrows=0, dtype=parse_dtypes(usecols))
+        filtered, counts = filter_admin_records(empty_df, require_display_flag)
+        return apply_schema(filtered), counts
+    
+    return concat_blocks(kept_blocks), counts
+
+def country_shards(candidates, shard_count):
+    """Split candidate rows into at most shard_count shards of whole countries.
+    
+    A feature whose name rows carry different country codes goes with the
+    lowest of them, so all rows of a feature are in the same shard. Countries
+    are assigned largest first to the least loaded shard.
+    """
+    countries = candidates['cc_ft'].astype(object).fillna('')
+    countries = countries.groupby(candidates['ufi'].to_numpy()).transform('min')
+    loads = [0] * shard_count
+    shard_of_country = {}
+    for country, size in countries.value_counts().items():
+        shard = loads.index(min(loads))
+        shard_of_country[country] = shard
+        loads[shard] += size
+    
+    shard_ids = countries.map(shard_of_country).to_numpy()
+    return [candidates[shard_ids == shard] for shard in range(shard_count) if loads[shard]]
+
+def _select_shard(task):
+    shard, profiles = task
+    scores = profile_scores(shard, profiles)
+    best_rows = best_rows_by_profile(shard, scores)
+    return scores, best_rows, summarize_profiles(best_rows)
+
+def parallel_best_rows(candidates, profiles, workers=None):
+    """Score candidate rows and pick the best row of each feature with one task per country shard.
+    
+    Returns (scores, {profile name: rows}, {profile name: SummaryAccumulator}).
+    The scores and rows are those of gns_dedup.profile_scores and
+    best_rows_by_profile: scores in the order of the candidate rows and the
+    best rows of every profile sorted by ufi. The summaries of the shards'
+    rows are merged.
+    """
+    workers = resolve_workers(workers)
+    shards = country_shards(candidates, workers * SHARDS_PER_WORKER)
+    if len(shards) <= 1:
+        scores = profile_scores(candidates, profiles)
+        best_rows = best_rows_by_profile(candidates, scores)
+        return scores, best_rows, summarize_profiles(best_rows)
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_select_shard, [(shard, profiles) for shard in shards]))
+    scores = pd.concat([shard_scores for shard_scores, _, _ in results]).reindex(candidates.index)
+    best_rows = {}
+    summaries = {}
+    for profile in profiles:
+        rows = concat_blocks([shard_rows[profile.name] for _, shard_rows, _ in results])
+        best_rows[profile.name] = rows.sort_values('ufi', kind='stable').reset_index(drop=True)
+        summaries[profile.name] = SummaryAccumulator()
+        for _, _, shard_summaries in results:
+            summaries[profile.name].merge(shard_summaries[profile.name])
+    return scores, best_rows, summaries
+
+def _deduplicate_shard(task):
+    shard, dedup_kwargs = task
+    return deduplicate_names(shard, **dedup_kwargs)
+
+def parallel_deduplicate(candidates, workers=None, **dedup_kwargs):
+    """Deduplicate candidate rows with one task per country shard.
+    
+    Returns the same rows as gns_dedup.deduplicate_names, sorted by ufi.
+    """
+    workers = resolve_workers(workers)
+    shards = country_shards(candidates, workers * SHARDS_PER_WORKER)
+    if len(shards) <= 1:
+        return deduplicate_names(candidates, **dedup_kwargs)
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_deduplicate_shard, [(shard, dedup_kwargs) for shard in shards]))
+    return concat_blocks(results).sort_values('ufi', kind='stable').reset_index(drop=True)
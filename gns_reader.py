@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Reader for the GNS (GEOnet Names Server) tab-separated data files.
+The administrative regions file can be read in one go or streamed in bounded
+chunks. In streaming mode the administrative level, display and coordinate
+filters are applied to each chunk before it is kept, so memory scales with the
+number of administrative rows rather than with the size of the full dump.
+Column types come from gns_schema.py, and typed rows can also be served
+from the columnar cache in gns_cache.py.
+"""
+
+import pandas as pd
+from gns_cache import CacheWriter, cache_available, find_cached_source, read_cache_blocks
+from gns_schema import SCHEMA_VERSION, apply_schema, concat_blocks, numeric_coordinates, parse_dtypes, type_columns
+
+ADMIN_REGIONS_FILE = 'Administrative_Regions/Administrative_Regions.txt'
+
+# Columns of the GNS file used by the processors
+ADMIN_COLUMNS = [
+    'rk', 'ufi', 'uni', 'full_name', 'nt', 'lat_dd', 'long_dd',
+    'efctv_dt', 'term_dt_f', 'term_dt_n', 'desig_cd', 'fc', 'cc_ft', 'adm1',
+    'name_rank', 'lang_cd', 'transl_cd', 'script_cd', 'display', 'generic'
+]
+
+# Designation codes that identify administrative divisions
+ADM_PREFIXES = ('ADM1', 'ADM2', 'ADM3', 'ADM4', 'ADMD')
+
+# Rows parsed per chunk in streaming mode
+DEFAULT_CHUNKSIZE = 250_000
+
+def _read_tsv_blocks(path, usecols=None, chunksize=None):
+    """Yield parsed blocks of a GNS file, the whole file at once unless chunksize is set."""
+    read_kwargs = dict(sep='\t', usecols=usecols, dtype=parse_dtypes(usecols))
+    
+    # The parser returns columns in file order; blocks always follow usecols
+    # so that they match blocks read back from the cache
+    if chunksize is None:
+        admin_df = pd.read_csv(path, low_memory=False, **read_kwargs)
+        yield admin_df if usecols is None else admin_df[usecols]
+        return
+    
+    for chunk in pd.read_csv(path, chunksize=chunksize, **read_kwargs):
+        yield chunk if usecols is None else chunk[usecols]
+
+def iter_gns_blocks(path, usecols=None, chunksize=None, use_cache=False):
+    """Yield typed blocks of a GNS file (see gns_schema.type_columns), using the columnar cache when enabled.
+    
+    On a cache miss the blocks are written to a new cache file as they are
+    parsed and typed, so a cache hit returns the same blocks without parsing
+    or converting any text.
+    """
+    if not use_cache or usecols is None:
+        for block in _read_tsv_blocks(path, usecols, chunksize):
+            yield type_columns(block)
+        return
+    
+    if not cache_available():
+        print("   pyarrow is not installed; parsing without the columnar cache")
+        for block in _read_tsv_blocks(path, usecols, chunksize):
+            yield type_columns(block)
+        return
+    
+    cache_file = find_cached_source(path, usecols, schema_version=SCHEMA_VERSION)
+    if cache_file is not None:
+        print(f"   Loading from cache: {cache_file}")
+        yield from read_cache_blocks(cache_file, usecols, chunksize)
+        return
+    
+    print("   No valid cache found; parsing the source and building the cache")
+    with CacheWriter(path, usecols, schema_version=SCHEMA_VERSION) as cache:
+        for block in _read_tsv_blocks(path, usecols, chunksize):
+            block = type_columns(block)
+            cache.write(block)
+            yield block
+
+def filter_gns_records(df, prefixes, require_display_flag=True):
+    """Apply the designation, display and coordinate filters to a block of rows.
+    
+    Only rows whose designation code starts with one of prefixes are kept.
+    Works on text blocks and on typed blocks with categorical codes. Returns the kept rows and a dict with the row count after each filter.
+    """
+    counts = {'read': len(df)}
+    
+    designation_mask = df['desig_cd'].str.startswith(prefixes, na=False)
+    df = df[designation_mask]
+    counts['designation'] = len(df)
+    
+    if 'display' in df.columns:
+        # Only include records marked for display
+        if require_display_flag:
+            display_mask = df['display'].str.upper() == 'Y'
+            df = df[display_mask]
+        
+        # Display field contains comma-separated numbers indicating display contexts
+        display_mask = df['display'].notna() & (df['display'] != '')
+        df = df[display_mask]
+        counts['display'] = len(df)
+    
+    # Remove records without valid coordinates
+    df = numeric_coordinates(df)
+    coord_mask = df['lat_dd'].notna() & df['long_dd'].notna()
+    df = df[coord_mask]
+    counts['coordinates'] = len(df)
+    
+    return df, counts
+
+def filter_admin_records(df, require_display_flag=True):
+    """Apply the administrative, display and coordinate filters to a block of rows.
+    
+    Returns the kept rows and a dict with the row count after each filter.
+    """
+    # Filter for administrative divisions (ADM1, ADM2, ADM3, ADM4, ADMD)
+    df, counts = filter_gns_records(df, ADM_PREFIXES, require_display_flag)
+    counts['administrative'] = counts.pop('designation')
+    return df, counts
+
+def read_admin_regions(path=ADMIN_REGIONS_FILE, usecols=ADMIN_COLUMNS, chunksize=None,
+                       require_display_flag=True, use_cache=False):
+    """Read the administrative regions file and apply the administrative filters.
+    
+    With chunksize set the file is parsed that many rows at a time and each chunk
+    is filtered and converted to the compact schema before it is kept. Returns the
+    filtered rows and the per-filter row counts summed over the whole file.
+    """
+    kept_blocks = []
+    counts = {}
+    for block in iter_gns_blocks(path, usecols, chunksize, use_cache):
+        filtered, block_counts = filter_admin_records(block, require_display_flag)
+        kept_blocks.append(apply_schema(filtered))
+        for stage, count in block_counts.items():
+            counts[stage] = counts.get(stage, 0) + count
+    
+    if not kept_blocks:
+        empty_df = pd.read_csv(path, sep='\t', usecols=usecols, nrows=0, dtype=parse_dtypes(usecols))
+        filtered, counts = filter_admin_records(empty_df, require_display_flag)
+        return apply_schema(filtered), counts
+    
+    return concat_blocks(kept_blocks), counts
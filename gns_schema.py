@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Column schema for the GNS (GEOnet Names Server) data files.
+Every reader of the GNS dump parses through these definitions so that:
+- Low-cardinality codes (name type, language, designation, country...) are categoricals
+- Feature and name identifiers (ufi, uni) are fixed-width 64-bit integers
+- Coordinates and name ranks are converted to floats once, with malformed
+  values becoming missing instead of aborting the read
+Also provides helpers to report the memory held by a DataFrame at each stage.
+"""
+
+import pandas as pd
+
+# Bump when the parsed types change so cached copies of the source are rebuilt
+SCHEMA_VERSION = 3
+
+# Free text, or values too varied to benefit from a categorical
+TEXT_COLUMNS = ('rk', 'full_name', 'efctv_dt', 'term_dt_f', 'term_dt_n', 'generic')
+
+# Codes with a small set of distinct values
+CATEGORY_COLUMNS = (
+    'nt', 'lang_cd', 'desig_cd', 'cc_ft', 'script_cd', 'transl_cd', 'fc', 'adm1', 'display'
+)
+
+# Unique feature and unique name identifiers
+ID_COLUMNS = ('ufi', 'uni')
+
+# Decimal degree coordinates
+COORDINATE_COLUMNS = ('lat_dd', 'long_dd')
+
+# Float columns and the type each is stored as
+FLOAT_COLUMNS = {
+    **{column: 'float64' for column in COORDINATE_COLUMNS},
+    'name_rank': 'float32'
+}
+
+# Types used by the CSV parser. Every column is parsed as text and converted
+# block by block (see type_columns), so that one malformed number makes that
+# value missing rather than failing the whole file.
+PARSE_DTYPES = {
+    column: str
+    for column in TEXT_COLUMNS + CATEGORY_COLUMNS + ID_COLUMNS + tuple(FLOAT_COLUMNS)
+}
+
+def parse_dtypes(usecols=None):
+    """Return the parser dtypes for the given columns (all known columns if None)."""
+    if usecols is None:
+        return dict(PARSE_DTYPES)
+    return {column: PARSE_DTYPES[column] for column in usecols if column in PARSE_DTYPES}
+
+def to_numeric(values, dtype):
+    """Convert a column to dtype, turning values that are not numbers into missing values."""
+    return pd.to_numeric(values, errors='coerce').astype(dtype)
+
+def numeric_coordinates(df):
+    """Return df with its coordinate columns converted to floats.
+    
+    Malformed coordinates become missing, so the coordinate filter drops their rows.
+    """
+    return df.assign(**{
+        column: to_numeric(df[column], FLOAT_COLUMNS[column])
+        for column in COORDINATE_COLUMNS if column in df.columns
+    })
+
+def _compact_categories(values):
+    """Return values as a categorical of the values present, in sorted order."""
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        return values.astype('category')
+    values = values.cat.remove_unused_categories()
+    return values.cat.reorder_categories(values.cat.categories.sort_values())
+
+def type_columns(df):
+    """Convert a parsed block of text columns to typed columns, keeping every row.
+    
+    Floats are parsed, identifiers become nullable integers (missing when
+    malformed) and codes become categoricals. These are the blocks that the
+    columnar cache stores, so a cache hit skips all text conversion.
+    """
+    df = df.assign(**{
+        column: to_numeric(df[column], dtype)
+        for column, dtype in FLOAT_COLUMNS.items() if column in df.columns
+    })
+    df = df.assign(**{
+        column: pd.to_numeric(df[column], errors='coerce', dtype_backend='numpy_nullable').astype('Int64')
+        for column in ID_COLUMNS if column in df.columns
+    })
+    return df.assign(**{
+        column: _compact_categories(df[column])
+        for column in CATEGORY_COLUMNS if column in df.columns
+    })
+
+def apply_schema(df):
+    """Convert a block of filtered rows to the compact in-memory types.
+    
+    Accepts text blocks from the parser as well as blocks from type_columns.
+    Rows without a valid feature or name identifier are dropped, since they can
+    be neither deduplicated nor referenced in the output. Categoricals keep
+    only the codes present in the block.
+    """
+    df = type_columns(df)
+    id_columns = [column for column in ID_COLUMNS if column in df.columns]
+    if id_columns:
+        df = df.dropna(subset=id_columns)
+    return df.astype({column: 'int64' for column in id_columns})
+
+def concat_blocks(blocks):
+    """Concatenate blocks from apply_schema, keeping the categorical columns categorical."""
+    if len(blocks) == 1:
+        return blocks[0].reset_index(drop=True)
+    
+    # Blocks only share a categorical dtype if their categories match, so give
+    # each categorical column the sorted union of the categories seen
+    dtypes = {}
+    for column in blocks[0].columns:
+        if isinstance(blocks[0][column].dtype, pd.CategoricalDtype):
+            categories = blocks[0][column].cat.categories
+            for block in blocks[1:]:
+                categories = categories.union(block[column].cat.categories)
+            dtypes[column] = pd.CategoricalDtype(categories.sort_values())
+    return pd.concat([block.astype(dtypes) for block in blocks], ignore_index=True)
+
+def memory_usage_mb(df):
+    """Return the memory held by a DataFrame, including string contents, in MB."""
+    return df.memory_usage(deep=True).sum() / (1024 * 1024)
+
+def report_memory(df, stage):
+    """Print the memory held by a DataFrame at a processing stage."""
+    print(f"   Memory ({stage}): {memory_usage_mb(df):,.1f} MB for {len(df):,} rows")
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Memoized pipeline stages for process_all_administrative_levels.py.
+The processor runs as named stages (load, rank, dedup, enrich, export). The
+output of each stage is stored under .gns_cache/stages/, keyed by a hash of
+the keys of its inputs and the parameters of the stage (ranking tables,
+filters, schema version). A rerun reuses every stage whose key is unchanged,
+so changing a ranking constant only recomputes the stages from rank onwards,
+and a run that crashed while writing the outputs resumes after the last
+completed stage. Data frames in a stage output (the loaded candidate rows,
+the ranking scores) are stored as Parquet when pyarrow is installed, and the
+rest of the output is pickled.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+from collections import namedtuple
+from pathlib import Path
+
+import pandas as pd
+
+from gns_cache import CACHE_DIR, cache_available
+
+STAGE_DIR = CACHE_DIR / 'stages'
+
+# Bump when the code of a stage changes what it produces, so older outputs are not reused
+STAGE_FORMAT_VERSION = 2
+
+# Number of keys whose outputs are kept for each stage, so that alternating runs
+# (the current release and an --as-of date, or two ranking profiles) reuse their stages
+KEPT_KEYS = 4
+
+# Stands in the pickled output for a data frame stored in a Parquet file of the stage
+_FrameFile = namedtuple('_FrameFile', ['name'])
+
+def source_stamp(path):
+    """Return the path, size and modification time of a source file as a stage input."""
+    stat = os.stat(path)
+    return {'path': str(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def stage_key(name, inputs, params=None):
+    """Return the key of a stage: a digest of its name, input keys and parameters."""
+    encoded = json.dumps({
+        'stage': name,
+        'version': STAGE_FORMAT_VERSION,
+        'inputs': inputs,
+        'params': params or {}
+    }, sort_keys=True, default=sorted)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+class StageStore:
+    """On-disk outputs of the pipeline stages, one file per stage.
+
+    The outputs of the KEPT_KEYS most recently used keys are kept for each
+    stage; saving another key evicts the least recently used one. With enabled
+    set to False every stage is recomputed and nothing is written.
+    """
+
+    def __init__(self, stage_dir=STAGE_DIR, enabled=True):
+        self.stage_dir = Path(stage_dir)
+        self.enabled = enabled
+
+    def _output_path(self, name, key):
+        return self.stage_dir / f"{name}.{key[:16]}.pickle"
+
+    def _marker_path(self, name):
+        return self.stage_dir / f"{name}.done.json"
+
+    def _frame_path(self, name, key, number):
+        return self.stage_dir / f"{name}.{key[:16]}.{number}.parquet"
+
+    def has(self, name, key):
+        """Return True if the output of a stage is stored under key."""
+        return self.enabled and self._output_path(name, key).exists()
+
+    def load(self, name, key):
+        """Return the stored output of a stage."""
+        output_file = self._output_path(name, key)
+        with open(output_file, 'rb') as f:
+            value = pickle.load(f)
+        # The modification time orders the kept keys by their last use
+        os.utime(output_file)
+        # A lone data frame is stored as a _FrameFile, itself a tuple
+        is_tuple = isinstance(value, tuple) and not isinstance(value, _FrameFile)
+        parts = [
+            pd.read_parquet(self.stage_dir / part.name) if isinstance(part, _FrameFile) else part
+            for part in (value if is_tuple else (value,))
+        ]
+        return tuple(parts) if is_tuple else parts[0]
+
+    def save(self, name, key, value):
+        """Store the output of a stage, evicting the least recently used keys beyond KEPT_KEYS.
+
+        The output, or each item of an output tuple, that is a DataFrame is
+        written to its own Parquet file.
+        """
+        if not self.enabled:
+            return
+        self.stage_dir.mkdir(parents=True, exist_ok=True)
+        output_file = self._output_path(name, key)
+        output_file.unlink(missing_ok=True)
+
+        parts = []
+        for part in (value if isinstance(value, tuple) else (value,)):
+            if isinstance(part, pd.DataFrame) and cache_available():
+                frame_file = self._frame_path(name, key, len(parts))
+                part.to_parquet(frame_file)
+                part = _FrameFile(frame_file.name)
+            parts.append(part)
+        stored = tuple(parts) if isinstance(value, tuple) else parts[0]
+
+        # A stage only counts as completed once its pickle is in place, after its Parquet files
+        tmp_file = output_file.with_suffix('.pickle.tmp')
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(stored, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, output_file)
+
+        kept = sorted(self.stage_dir.glob(f"{name}.*.pickle"), key=lambda path: path.stat().st_mtime_ns, reverse=True)
+        kept_prefixes = tuple(path.name[:-len('pickle')] for path in kept[:KEPT_KEYS])
+        for pattern in (f"{name}.*.pickle", f"{name}.*.parquet"):
+            for old_file in self.stage_dir.glob(pattern):
+                if not old_file.name.startswith(kept_prefixes):
+                    old_file.unlink()
+
+    def run(self, name, key, compute):
+        """Return the output of a stage, from the store or by calling compute()."""
+        if self.has(name, key):
+            try:
+                value = self.load(name, key)
+                print(f"   Reusing the stored {name} stage ({key[:12]})")
+                return value
+            except (OSError, EOFError, ValueError, pickle.UnpicklingError, AttributeError, ImportError):
+                print(f"   The stored {name} stage is unreadable; recomputing it")
+        value = compute()
+        self.save(name, key, value)
+        return value
+
+    def output_current(self, name, key, output_file):
+        """Return True if output_file was written by the stage with this key and is unchanged since."""
+        marker_file = self._marker_path(name)
+        if not self.enabled or not marker_file.exists() or not os.path.exists(output_file):
+            return False
+        with open(marker_file) as f:
+            marker = json.load(f)
+        stat = os.stat(output_file)
+        return (marker.get('key') == key and marker.get('file') == str(output_file)
+                and marker.get('size') == stat.st_size and marker.get('mtime_ns') == stat.st_mtime_ns)
+
+    def mark_output(self, name, key, output_file):
+        """Record that output_file was written by the stage with this key."""
+        if not self.enabled:
+            return
+        self.stage_dir.mkdir(parents=True, exist_ok=True)
+        stat = os.stat(output_file)
+        marker_file = self._marker_path(name)
+        tmp_file = marker_file.with_suffix('.json.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump({
+                'key': key,
+                'file': str(output_file),
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns
+            }, f, indent=2)
+        os.replace(tmp_file, marker_file)
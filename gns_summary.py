@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Running summaries of the administrative divisions.
+A SummaryAccumulator takes blocks of deduplicated rows (GNS columns cc_ft,
+desig_cd, lat_dd and long_dd) and keeps, per country code and level, the
+number of divisions, how many have coordinates and their bounding box.
+Accumulators built over separate blocks or shards merge into one, so the
+country summary sheets and the console statistics come from these small
+tables instead of further passes over the full output.
+"""
+
+import numpy as np
+import pandas as pd
+
+from gns_workbook import pivot_country_counts
+
+KEY_COLUMNS = ['cc_ft', 'desig_cd']
+
+# How each summary column combines over blocks
+AGGREGATIONS = {
+    'rows': 'sum',
+    'located': 'sum',
+    'min_lat': 'min',
+    'max_lat': 'max',
+    'min_lon': 'min',
+    'max_lon': 'max'
+}
+
+# Partial tables kept before they are combined into one
+MAX_PARTS = 64
+
+# Rows summarized at a time by summarize()
+DEFAULT_BATCH_ROWS = 250_000
+
+def _combine(parts):
+    """Combine partial summary tables into one, keyed by country code and level."""
+    table = pd.concat(parts, ignore_index=True)
+    return table.groupby(KEY_COLUMNS, dropna=False, sort=True).agg(AGGREGATIONS).reset_index()
+
+class SummaryAccumulator:
+    """Per-country, per-level counts, coordinate coverage and bounding boxes."""
+    
+    def __init__(self):
+        self._parts = []
+    
+    def update(self, block):
+        """Add a block of deduplicated rows to the summary."""
+        if block.empty:
+            return self
+        latitude = block['lat_dd'].to_numpy(dtype=np.float64)
+        longitude = block['long_dd'].to_numpy(dtype=np.float64)
+        located = ~(np.isnan(latitude) | np.isnan(longitude))
+        
+        # Keys are plain values, so blocks with different categories combine
+        rows = pd.DataFrame({
+            'cc_ft': block['cc_ft'].astype(object).to_numpy(),
+            'desig_cd': block['desig_cd'].astype(object).to_numpy(),
+            'rows': 1,
+            'located': located.astype(np.int64),
+            'min_lat': np.where(located, latitude, np.nan),
+            'max_lat': np.where(located, latitude, np.nan),
+            'min_lon': np.where(located, longitude, np.nan),
+            'max_lon': np.where(located, longitude, np.nan)
+        })
+        self._add(_combine([rows]))
+        return self
+    
+    def merge(self, other):
+        """Add the rows summarized by another accumulator, e.g. one built over another shard."""
+        for part in other._parts:
+            self._add(part)
+        return self
+    
+    def _add(self, part):
+        self._parts.append(part)
+        if len(self._parts) > MAX_PARTS:
+            self._parts = [_combine(self._parts)]
+    
+    def table(self):
+        """Return the summary as one row per country code and level."""
+        if not self._parts:
+            return pd.DataFrame(columns=KEY_COLUMNS + list(AGGREGATIONS))
+        if len(self._parts) > 1:
+            self._parts = [_combine(self._parts)]
+        return self._parts[0]
+    
+    def level_counts(self, located=True):
+        """Return the number of divisions per level, in level order."""
+        table = self.table()
+        return table.groupby('desig_cd')['located' if located else 'rows'].sum().astype(np.int64)
+    
+    def country_rows(self, countries_df):
+        """Return the located divisions per level joined to Country_Code and Short_Name.
+        
+        This is the same left join on the country code that the output rows go through.
+        """
+        table = self.table()
+        table = table[table['located'] > 0]
+        return table.merge(
+            countries_df[['Country_Code', 'Short_Name']],
+            left_on='cc_ft',
+            right_on='Country_Code',
+            how='left'
+        )
+    
+    def country_pivot(self, countries_df):
+        """Return the country summary pivot, as gns_workbook.country_level_pivot on the output rows."""
+        country_summary = self.country_rows(countries_df).groupby(
+            ['Country_Code', 'Short_Name', 'desig_cd']
+        )['located'].sum().reset_index(name='Count')
+        country_summary = country_summary.rename(columns={
+            'Short_Name': 'Country_Name',
+            'desig_cd': 'Administrative_Level'
+        })
+        return pivot_country_counts(country_summary)
+    
+    def country_count(self, countries_df):
+        """Return the number of countries with at least one located division."""
+        return self.country_rows(countries_df)['Country_Code'].nunique()
+    
+    def bounding_boxes(self):
+        """Return the bounding box of the located divisions of each country code."""
+        table = self.table()
+        return table[table['located'] > 0].groupby('cc_ft').agg({
+            'min_lat': 'min',
+            'max_lat': 'max',
+            'min_lon': 'min',
+            'max_lon': 'max'
+        })
+
+def summarize(df, batch_rows=DEFAULT_BATCH_ROWS):
+    """Return a SummaryAccumulator over df, built batch_rows rows at a time."""
+    summary = SummaryAccumulator()
+    for start in range(0, len(df), batch_rows):
+        summary.update(df.iloc[start:start + batch_rows])
+    return summary
+
+def summarize_profiles(best_rows, batch_rows=DEFAULT_BATCH_ROWS):
+    """Return {profile name: SummaryAccumulator} over the best rows of each ranking profile."""
+    return {name: summarize(rows, batch_rows) for name, rows in best_rows.items()}
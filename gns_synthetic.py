@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Generator of synthetic GNS (GEOnet Names Server) files for tests and benchmarks.
+Writes tab-separated files with the columns of the real downloads and
+distributions modelled on them:
+- every feature (ufi) has one or more name rows (uni), with a long tail of
+  features holding many variant names
+- the first name of a feature is usually the approved (N) name, the others
+  are mostly variants (V), with ranks, languages and scripts to match
+- a share of the rows has no coordinates or is not marked for display
+The values are random but reproducible for a given seed and row count.
+Usage: python3 gns_synthetic.py --rows 1000000 --output bench_data
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from gns_reader import ADMIN_REGIONS_FILE
+
+LOCALITIES_FILE = 'Areas_Localities/Areas_Localities.txt'
+
+# Column order of the GNS download files
+GNS_COLUMNS = [
+    'rk', 'ufi', 'uni', 'mgrs', 'lat_dd', 'long_dd', 'efctv_dt', 'term_dt_f', 'term_dt_n',
+    'desig_cd', 'fc', 'cc_ft', 'adm1', 'name_rank', 'full_name', 'full_nm_nd', 'nt', 'lang_cd',
+    'transl_cd', 'script_cd', 'display', 'generic', 'note'
+]
+
+# Designation codes and their share of features, per file kind
+DESIGNATIONS = {
+    'admin': {
+        'ADM1': 0.01, 'ADM2': 0.10, 'ADM3': 0.32, 'ADM4': 0.30, 'ADMD': 0.15,
+        'ADM1H': 0.02, 'ADM2H': 0.04, 'ADM3H': 0.06
+    },
+    'localities': {
+        'PPL': 0.78, 'PPLA': 0.02, 'PPLA2': 0.03, 'PPLL': 0.06, 'PPLX': 0.07,
+        'PPLQ': 0.02, 'PPLH': 0.01, 'LCTY': 0.01
+    }
+}
+
+FEATURE_CLASSES = {'admin': 'A', 'localities': 'P'}
+
+# Name type of the first name of a feature, and of its other names
+FIRST_NAME_TYPES = {'N': 0.86, 'C': 0.04, 'D': 0.06, 'V': 0.04}
+OTHER_NAME_TYPES = {'V': 0.70, 'N': 0.08, 'C': 0.07, 'D': 0.15}
+
+LANGUAGES = {
+    '': 0.45, 'eng': 0.08, 'spa': 0.07, 'fra': 0.06, 'ara': 0.06, 'rus': 0.05, 'por': 0.04,
+    'deu': 0.03, 'zho': 0.03, 'hin': 0.02, 'tur': 0.03, 'pol': 0.03, 'ind': 0.05
+}
+
+# Script of each language; the unspecified language is mostly Latin script
+LANGUAGE_SCRIPTS = {'ara': 'arab', 'rus': 'cyrl', 'zho': 'hani', 'hin': 'deva'}
+
+DISPLAY_FLAGS = {'Y': 0.90, 'N': 0.07, '': 0.03}
+
+# Share of features without coordinates and of names without a name rank
+MISSING_COORDINATE_RATE = 0.02
+MISSING_RANK_RATE = 0.10
+
+# Probability of a feature having one more name; names per feature are geometric
+NAME_CONTINUE_PROBABILITY = 0.6
+MAX_NAMES_PER_FEATURE = 60
+
+COUNTRY_COUNT = 250
+
+# Rows generated and written at a time
+DEFAULT_BLOCK_ROWS = 500_000
+
+SYLLABLES = np.array([
+    'ba', 'ka', 'lo', 'mi', 'na', 'ri', 'sa', 'to', 'vu', 'zel', 'san', 'dor', 'mar', 'tel',
+    'gua', 'que', 'ber', 'lin', 'ham', 'ko', 'shi', 'yan', 'ova', 'sk', 'grad', 'pur', 'ya'
+])
+ACCENTED = np.array(['é', 'ã', 'ü', 'ñ', 'ø', 'ç', 'ő', 'ı'])
+
+def _choose(rng, weights, size):
+    """Draw size values from a {value: probability} mapping."""
+    values = np.array(list(weights), dtype=object)
+    probabilities = np.array(list(weights.values()), dtype=np.float64)
+    return values[rng.choice(len(values), size=size, p=probabilities / probabilities.sum())]
+
+def country_codes(count=COUNTRY_COUNT):
+    """Return the two-letter codes used for synthetic countries."""
+    letters = [chr(ord('A') + i) for i in range(26)]
+    return [first + second for first in letters for second in letters][:count]
+
+def write_country_codes(path, count=COUNTRY_COUNT):
+    """Write a Country_Codes.csv file for the synthetic countries."""
+    codes = country_codes(count)
+    pd.DataFrame({
+        'Country_Code': codes,
+        'Short_Name': [f'Country {code}' for code in codes],
+        'Full_Name': [f'Republic of Country {code}' for code in codes]
+    }).to_csv(path, index=False)
+    return path
+
+def _names(rng, feature_seeds, name_numbers):
+    """Build place names from per-feature syllables, with variants differing by suffix."""
+    first = SYLLABLES[feature_seeds % len(SYLLABLES)]
+    second = SYLLABLES[(feature_seeds // len(SYLLABLES)) % len(SYLLABLES)]
+    third = SYLLABLES[(feature_seeds // len(SYLLABLES) ** 2) % len(SYLLABLES)]
+    names = pd.Series(first + second + third).str.capitalize()
+    
+    # Some names carry an accented letter, variants get a different ending
+    accented = rng.random(len(names)) < 0.15
+    names[accented] = names[accented] + ACCENTED[rng.integers(len(ACCENTED), size=accented.sum())]
+    variants = name_numbers > 0
+    names[variants] = names[variants] + SYLLABLES[name_numbers[variants] % len(SYLLABLES)]
+    return names.to_numpy(dtype=object)
+
+def generate_block(rng, first_ufi, first_uni, first_rk, feature_count, kind='admin', countries=None):
+    """Generate the name rows of feature_count consecutive features as a DataFrame."""
+    countries = np.array(countries or country_codes(), dtype=object)
+    names_per_feature = np.minimum(
+        rng.geometric(1 - NAME_CONTINUE_PROBABILITY, size=feature_count), MAX_NAMES_PER_FEATURE
+    )
+    feature = np.repeat(np.arange(feature_count), names_per_feature)
+    rows = len(feature)
+    
+    # Position of each row within its feature's names
+    starts = np.repeat(np.cumsum(names_per_feature) - names_per_feature, names_per_feature)
+    name_number = np.arange(rows) - starts
+    first_name = name_number == 0
+    
+    # Feature attributes, repeated onto every name row
+    latitude = np.round(rng.uniform(-60, 75, feature_count), 5)
+    longitude = np.round(rng.uniform(-180, 180, feature_count), 5)
+    missing = rng.random(feature_count) < MISSING_COORDINATE_RATE
+    latitude[missing] = np.nan
+    longitude[missing] = np.nan
+    designation = _choose(rng, DESIGNATIONS[kind], feature_count)
+    country = countries[rng.integers(len(countries), size=feature_count)]
+    adm1 = np.char.zfill(rng.integers(0, 40, size=feature_count).astype(str), 2)
+    feature_seeds = rng.integers(0, len(SYLLABLES) ** 3, size=feature_count)
+    
+    name_type = np.where(
+        first_name, _choose(rng, FIRST_NAME_TYPES, rows), _choose(rng, OTHER_NAME_TYPES, rows)
+    )
+    language = _choose(rng, LANGUAGES, rows)
+    script = pd.Series(language).map(LANGUAGE_SCRIPTS).fillna('latn').to_numpy(dtype=object)
+    name_rank = pd.array(name_number + 1, dtype='Int64')
+    name_rank[rng.random(rows) < MISSING_RANK_RATE] = pd.NA
+    names = _names(rng, feature_seeds[feature], name_number)
+    
+    return pd.DataFrame({
+        'rk': np.arange(first_rk, first_rk + rows),
+        'ufi': first_ufi + feature,
+        'uni': np.arange(first_uni, first_uni + rows),
+        'mgrs': '',
+        'lat_dd': latitude[feature],
+        'long_dd': longitude[feature],
+        'efctv_dt': np.where(rng.random(rows) < 0.3, '2001-05-10', ''),
+        'term_dt_f': np.where(rng.random(rows) < 0.05, '2015-03-01', ''),
+        'term_dt_n': '',
+        'desig_cd': designation[feature],
+        'fc': FEATURE_CLASSES[kind],
+        'cc_ft': country[feature],
+        'adm1': adm1[feature],
+        'name_rank': name_rank,
+        'full_name': names,
+        'full_nm_nd': names,
+        'nt': name_type,
+        'lang_cd': language,
+        'transl_cd': np.where(script != 'latn', 'BGN/PCGN', ''),
+        'script_cd': script,
+        'display': _choose(rng, DISPLAY_FLAGS, rows),
+        'generic': '',
+        'note': ''
+    }, columns=GNS_COLUMNS)
+
+def generate_gns_file(path, rows, kind='admin', seed=0, block_rows=DEFAULT_BLOCK_ROWS, countries=None):
+    """Write a synthetic GNS file of about rows name rows and return the exact row count.
+    
+    kind is 'admin' (administrative regions) or 'localities' (populated places).
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    mean_names = 1 / (1 - NAME_CONTINUE_PROBABILITY)
+    
+    written = 0
+    next_ufi = 1
+    with open(path, 'w', encoding='utf-8', newline='') as output:
+        output.write('\t'.join(GNS_COLUMNS) + '\n')
+        while written < rows:
+            feature_count = max(1, int((min(block_rows, rows - written)) / mean_names))
+            block = generate_block(rng, next_ufi, written + 1, written + 1, feature_count, kind, countries)
+            block = block.iloc[:rows - written]
+            block.to_csv(output, sep='\t', header=False, index=False)
+            written += len(block)
+            next_ufi = int(block['ufi'].iloc[-1]) + 1
+    return written
+
+def generate_dataset(output_dir, rows, seed=0, localities_rows=0, block_rows=DEFAULT_BLOCK_ROWS):
+    """Write Country_Codes.csv and the GNS files, laid out as the processors expect them."""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    write_country_codes(output_dir / 'Country_Codes.csv')
+    files = {'admin': (output_dir / ADMIN_REGIONS_FILE, generate_gns_file(
+        output_dir / ADMIN_REGIONS_FILE, rows, 'admin', seed, block_rows
+    ))}
+    if localities_rows:
+        files['localities'] = (output_dir / LOCALITIES_FILE, generate_gns_file(
+            output_dir / LOCALITIES_FILE, localities_rows, 'localities', seed + 1, block_rows
+        ))
+    return files
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic GNS files for tests and benchmarks.")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="name rows of the administrative regions file")
+    parser.add_argument(
+        '--localities-rows', type=int, default=0, help="name rows of the areas and localities file (default: none)"
+    )
+    parser.add_argument('--output', default='synthetic_gns', help="directory to write the files to")
+    parser.add_argument('--seed', type=int, default=0, help="random seed")
+    args = parser.parse_args()
+    
+    for kind, (path, count) in generate_dataset(args.output, args.rows, args.seed, args.localities_rows).items():
+        print(f"✅ Wrote {count:,} rows to {path}")
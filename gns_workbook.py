@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Writing the master workbook of administrative divisions.
+The summary sheets (divisions per country and level) are computed once and
+shared by the console report. The workbook itself is written either through
+pandas, which builds every sheet in memory first, or in streaming mode: an
+openpyxl write-only workbook to which rows are appended in batches, with
+All_Admin_Divisions and the per-level sheets filled from one pass over the
+sorted rows. The country summary sheets are written cell by cell in the
+layout DataFrame.to_excel gives them, merged index cells included.
+"""
+
+import pandas as pd
+
+ADMIN_LEVELS = ['ADM1', 'ADM2', 'ADM3', 'ADM4', 'ADMD']
+
+# Rows converted to cell values at a time in streaming mode
+DEFAULT_BATCH_ROWS = 50_000
+
+def level_sheet_name(level):
+    """Return the workbook sheet name for an administrative level."""
+    return f'{level}_Divisions'
+
+def country_level_pivot(output_df):
+    """Count divisions per country and administrative level, with a Total column.
+    
+    Countries are ordered by their total, largest first.
+    """
+    country_summary = output_df.groupby([
+        'Country_Code', 'Country_Name', 'Administrative_Level'
+    ], observed=True).size().reset_index(name='Count')
+    return pivot_country_counts(country_summary)
+
+def pivot_country_counts(country_summary):
+    """Turn Country_Code, Country_Name, Administrative_Level and Count rows into the country pivot.
+    
+    Countries are ordered by their total, largest first.
+    """
+    country_pivot = country_summary.pivot(
+        index=['Country_Code', 'Country_Name'],
+        columns='Administrative_Level',
+        values='Count'
+    ).fillna(0).astype(int)
+    
+    # Add total column
+    country_pivot['Total'] = country_pivot.sum(axis=1)
+    return country_pivot.sort_values('Total', ascending=False)
+
+def _write_workbook_in_memory(output_df, output_file, country_pivot):
+    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        # All administrative divisions
+        output_df.to_excel(writer, sheet_name='All_Admin_Divisions', index=False)
+        
+        # Separate sheets by administrative level
+        for level in ADMIN_LEVELS:
+            level_data = output_df[output_df['Administrative_Level'] == level]
+            if not level_data.empty:
+                level_data.to_excel(writer, sheet_name=level_sheet_name(level), index=False)
+        
+        country_pivot.to_excel(writer, sheet_name='Country_Summary')
+        
+        # Top countries by total administrative divisions
+        country_pivot.head(30).to_excel(writer, sheet_name='Top_30_Countries')
+
+def _cell_values(series):
+    """Return a column as plain Python values, with None for missing values."""
+    values = series.astype(object)
+    return values.where(series.notna(), None).tolist()
+
+def _header_cell(worksheet, value):
+    """Return a cell styled like the header and index cells of DataFrame.to_excel."""
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+    
+    cell = WriteOnlyCell(worksheet, value=value)
+    cell.font = Font(bold=True)
+    thin = Side(style='thin')
+    cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    cell.alignment = Alignment(horizontal='center', vertical='top')
+    return cell
+
+def _append_frame(worksheet, df):
+    """Append a DataFrame, index included, to an empty sheet in the layout DataFrame.to_excel gives it.
+    
+    Runs of equal labels of an outer index level are merged over their rows,
+    with the label in the first cell.
+    """
+    from openpyxl.worksheet.cell_range import CellRange
+    
+    index_levels = df.index.nlevels
+    worksheet.append([_header_cell(worksheet, name) for name in df.index.names]
+                     + [_header_cell(worksheet, column) for column in df.columns])
+    
+    labels = list(zip(*(_cell_values(df.index.get_level_values(level).to_series()) for level in range(index_levels))))
+    values = list(zip(*(_cell_values(df[column]) for column in df.columns)))
+    # Row of the first cell of the current run of each outer level
+    run_starts = [None] * (index_levels - 1)
+    for number, (row_labels, row_values) in enumerate(zip(labels, values)):
+        row = number + 2
+        index_cells = []
+        for level, label in enumerate(row_labels):
+            continues = (level < index_levels - 1 and number > 0
+                         and labels[number - 1][:level + 1] == row_labels[:level + 1])
+            if level < index_levels - 1 and not continues:
+                run_starts[level] = row
+            index_cells.append(None if continues else _header_cell(worksheet, label))
+        worksheet.append(index_cells + list(row_values))
+        
+        # A run ends on the last row or before a row that starts a new one
+        for level, start in enumerate(run_starts):
+            next_labels = labels[number + 1] if number + 1 < len(labels) else None
+            if next_labels is None or next_labels[:level + 1] != row_labels[:level + 1]:
+                if row > start:
+                    worksheet.merged_cells.add(
+                        CellRange(min_col=level + 1, min_row=start, max_col=level + 1, max_row=row)
+                    )
+
+def _write_workbook_streaming(output_df, output_file, country_pivot, batch_rows):
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    all_sheet = workbook.create_sheet('All_Admin_Divisions')
+    
+    # Per-level sheets are created up front so they keep the usual sheet order
+    present_levels = set(output_df['Administrative_Level'].dropna().unique())
+    level_sheets = {
+        level: workbook.create_sheet(level_sheet_name(level))
+        for level in ADMIN_LEVELS if level in present_levels
+    }
+    
+    header = [str(column) for column in output_df.columns]
+    all_sheet.append(header)
+    for sheet in level_sheets.values():
+        sheet.append(header)
+    
+    # One pass over the sorted rows; each row goes to the full sheet and to its level's sheet
+    level_position = list(output_df.columns).index('Administrative_Level')
+    for start in range(0, len(output_df), batch_rows):
+        batch = output_df.iloc[start:start + batch_rows]
+        for row in zip(*(_cell_values(batch[column]) for column in batch.columns)):
+            all_sheet.append(row)
+            level_sheet = level_sheets.get(row[level_position])
+            if level_sheet is not None:
+                level_sheet.append(row)
+    
+    _append_frame(workbook.create_sheet('Country_Summary'), country_pivot)
+    _append_frame(workbook.create_sheet('Top_30_Countries'), country_pivot.head(30))
+    
+    workbook.save(output_file)
+
+def write_master_workbook(output_df, output_file, country_pivot, streaming=False,
+                          batch_rows=DEFAULT_BATCH_ROWS):
+    """Write the master workbook: all divisions, one sheet per level and the country summaries.
+    
+    output_df must already be in its final row order. In streaming mode the rows
+    are written to disk in batches of `batch_rows` as they are converted, instead
+    of every sheet being built in memory first.
+    """
+    if streaming:
+        _write_workbook_streaming(output_df, output_file, country_pivot, batch_rows)
+    else:
+        _write_workbook_in_memory(output_df, output_file, country_pivot)
+    return output_file
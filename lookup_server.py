@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+Long-running local HTTP/JSON service for division lookups.
+The processed data is loaded and indexed once (see admin_lookup.py) and
+served by an asyncio server, so any number of clients share one in-memory
+index instead of loading the data per process. Endpoints (GET, query string
+parameters):
+  /country?code=US[&level=ADM2]     divisions of a country
+  /level?level=ADM1[&country=US]    divisions of a level
+  /search?name=Sao Paulo[&country=BR][&level=ADM1]
+  /feature?id=12345                 one division by Unique_Feature_ID
+  /nearest?lat=48.85&lon=2.35[&k=5][&level=ADM2][&country=FR]
+  /stats                            request, cache, latency and batching counters
+Listing endpoints take limit and offset. POST /batch answers a JSON list of
+{"type": "search", "name": ...} queries in one request.
+Answers are kept in an LRU cache keyed by the normalized query (codes upper
+cased, names reduced to search keys, coordinates rounded) and bounded by both
+entries and total bytes, and nearest
+queries arriving within a few milliseconds of each other are batched into
+one vectorized KD-tree query.
+Usage: python3 lookup_server.py [--host 127.0.0.1] [--port 8765]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+from collections import OrderedDict, deque
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+from admin_lookup import AdminLookup
+from name_search import normalize_name
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Normalized queries whose answers are kept, and the total size of the kept answers
+DEFAULT_CACHE_SIZE = 10_000
+DEFAULT_CACHE_MB = 256
+
+# Answers larger than this (a long listing page) are not cached
+MAX_CACHED_ANSWER_BYTES = 1024 * 1024
+
+# Nearest queries are collected for this long, or until this many are waiting
+BATCH_WINDOW_S = 0.002
+BATCH_MAX_POINTS = 1024
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 10_000
+MAX_NEAREST = 100
+
+# Decimal places coordinates are rounded to for the cache key (about 0.1 m)
+COORDINATE_DECIMALS = 6
+
+# Largest request body read, in bytes; a larger POST /batch is refused with 413
+MAX_BODY_BYTES = 8 * 1024 * 1024
+
+# Pending connections queued by the operating system
+CONNECTION_BACKLOG = 4096
+
+# Division rows whose JSON encoding is kept
+ROW_CACHE_SIZE = 100_000
+
+# Request latencies kept for the percentiles in /stats
+LATENCY_SAMPLES = 10_000
+
+RESULT_COLUMNS = [
+    'Unique_Feature_ID', 'Country_Code', 'Country_Name', 'Administrative_Level',
+    'Administrative_Name', 'latitude', 'longitude', 'Parent_Feature_ID'
+]
+
+QUERY_TYPES = ('country', 'level', 'search', 'feature', 'nearest')
+
+STATUS_TEXT = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    413: 'Payload Too Large', 500: 'Internal Server Error'
+}
+
+class QueryError(ValueError):
+    """A query with missing or invalid parameters."""
+
+def _text(params, name, required=False):
+    value = str(params.get(name) or '').strip()
+    if required and not value:
+        raise QueryError(f"missing parameter: {name}")
+    return value
+
+def _number(params, name, convert, default=None, low=None, high=None):
+    value = params.get(name)
+    if value in (None, ''):
+        if default is None:
+            raise QueryError(f"missing parameter: {name}")
+        return default
+    try:
+        value = convert(value)
+    except (TypeError, ValueError):
+        raise QueryError(f"invalid {name}: {value}")
+    if not math.isfinite(value):
+        raise QueryError(f"invalid {name}: {value}")
+    if (low is not None and value < low) or (high is not None and value > high):
+        raise QueryError(f"{name} must be between {low} and {high}")
+    return value
+
+def normalize_query(kind, params):
+    """Return the cache key of a query: its kind and normalized parameters.
+    
+    Raises QueryError for unknown kinds and missing or invalid parameters.
+    """
+    page = (
+        _number(params, 'limit', int, DEFAULT_LIMIT, 0, MAX_LIMIT),
+        _number(params, 'offset', int, 0, 0)
+    )
+    country = _text(params, 'country').upper()
+    level = _text(params, 'level').upper()
+    if kind == 'country':
+        return kind, _text(params, 'code', required=True).upper(), level, page
+    if kind == 'level':
+        return kind, _text(params, 'level', required=True).upper(), country, page
+    if kind == 'search':
+        key = normalize_name(_text(params, 'name', required=True))
+        if not key:
+            raise QueryError("name has no letters or digits")
+        return kind, key, country, level, page
+    if kind == 'feature':
+        return kind, _number(params, 'id', int)
+    if kind == 'nearest':
+        return (
+            kind,
+            round(_number(params, 'lat', float, low=-90, high=90), COORDINATE_DECIMALS),
+            round(_number(params, 'lon', float, low=-180, high=180), COORDINATE_DECIMALS),
+            _number(params, 'k', int, 1, 1, MAX_NEAREST), level, country
+        )
+    raise QueryError(f"unknown query type: {kind}")
+
+class RowEncoder:
+    """JSON objects of division rows, encoded once per row and kept in an LRU memo.
+    
+    The rows missing from the memo are read from the data in one selection.
+    """
+    
+    def __init__(self, df, size=ROW_CACHE_SIZE):
+        self.df = df
+        self.columns = [column for column in RESULT_COLUMNS if column in df.columns]
+        self.size = size
+        self.memo = OrderedDict()
+    
+    def encode(self, positions):
+        """Return the JSON object of each row position as a string."""
+        positions = [int(position) for position in positions]
+        missing = [position for position in dict.fromkeys(positions) if position not in self.memo]
+        if missing:
+            records = self.df.iloc[missing][self.columns].to_json(orient='records', force_ascii=False)
+            for position, record in zip(missing, json.loads(records)):
+                self.memo[position] = json.dumps(record, ensure_ascii=False)
+        encoded = []
+        for position in positions:
+            self.memo.move_to_end(position)
+            encoded.append(self.memo[position])
+        while len(self.memo) > self.size:
+            self.memo.popitem(last=False)
+        return encoded
+    
+    def answer(self, positions, total=None, offset=0, distances=None):
+        """Return the JSON answer listing the rows at positions, with their distances if given."""
+        records = self.encode(positions)
+        if distances is not None:
+            records = [
+                f'{record[:-1]}, "distance_km": {round(float(distance), 3)}}}'
+                for record, distance in zip(records, distances)
+            ]
+        total = len(records) if total is None else total
+        return f'{{"total": {total}, "offset": {offset}, "results": [{", ".join(records)}]}}'.encode('utf-8')
+
+class ServiceMetrics:
+    """Request, cache, latency and batching counters of a running service."""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.errors = 0
+        self.endpoints = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.batches = 0
+        self.batched_points = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+    
+    def record(self, endpoint, latency, error=False):
+        self.requests += 1
+        self.errors += error
+        self.endpoints[endpoint] = self.endpoints.get(endpoint, 0) + 1
+        self.latencies.append(latency)
+    
+    def summary(self, cache_size, cache_bytes):
+        """Return the counters as a JSON-serializable dict."""
+        uptime = time.perf_counter() - self.started
+        latencies = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            'uptime_s': round(uptime, 1),
+            'requests': self.requests,
+            'errors': self.errors,
+            'requests_per_s': round(self.requests / uptime, 1),
+            'endpoints': self.endpoints,
+            'cache': {
+                'entries': cache_size, 'mb': round(cache_bytes / 2**20, 1), 'hits': self.cache_hits, 'misses': self.cache_misses,
+                'hit_rate': round(self.cache_hits / lookups, 3) if lookups else None
+            },
+            'latency_ms': {
+                'p50': round(p50, 3), 'p95': round(p95, 3), 'p99': round(p99, 3),
+                'max': round(float(latencies.max()), 3)
+            },
+            'nearest_batches': {
+                'batches': self.batches, 'points': self.batched_points,
+                'mean_points': round(self.batched_points / self.batches, 1) if self.batches else None
+            }
+        }
+
+class NearestBatcher:
+    """Collect concurrent nearest queries and answer each group with one KD-tree query."""
+    
+    def __init__(self, spatial, metrics, encoder, window=BATCH_WINDOW_S, max_points=BATCH_MAX_POINTS):
+        self.spatial = spatial
+        self.metrics = metrics
+        self.encoder = encoder
+        self.window = window
+        self.max_points = max_points
+        self.pending = {}
+    
+    async def nearest(self, latitude, longitude, k, level, country):
+        """Return the row positions and distances of the k divisions nearest to a point."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (k, level, country)
+        waiting = self.pending.setdefault(key, [])
+        waiting.append((latitude, longitude, future))
+        if len(waiting) == 1:
+            loop.call_later(self.window, self._flush, key, waiting)
+        elif len(waiting) >= self.max_points:
+            self._flush(key, waiting)
+        return await future
+    
+    def _flush(self, key, waiting):
+        # A full batch may already have been answered before its timer fires
+        if self.pending.get(key) is not waiting:
+            return
+        del self.pending[key]
+        k, level, country = key
+        
+        # A point the KD-tree cannot take fails on its own instead of failing the batch
+        batch = []
+        for latitude, longitude, future in waiting:
+            if math.isfinite(latitude) and math.isfinite(longitude):
+                batch.append((latitude, longitude, future))
+            elif not future.done():
+                future.set_exception(QueryError(f"invalid point: {latitude}, {longitude}"))
+        waiting = batch
+        if not waiting:
+            return
+        try:
+            rows, distances = self.spatial.nearest_positions(
+                np.array([point[0] for point in waiting]), np.array([point[1] for point in waiting]),
+                level or None, country or None, k
+            )
+        except Exception as e:
+            for _, _, future in waiting:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.metrics.batches += 1
+        self.metrics.batched_points += len(waiting)
+        # The matched rows of the whole batch are encoded at once
+        self.encoder.encode(rows[rows >= 0])
+        for number, (_, _, future) in enumerate(waiting):
+            if not future.done():
+                future.set_result((rows[number], distances[number]))
+
+class LookupService:
+    """Cached, batched query answers over one AdminLookup."""
+    
+    def __init__(self, lookup, cache_size=DEFAULT_CACHE_SIZE, cache_mb=DEFAULT_CACHE_MB,
+                 batch_window=BATCH_WINDOW_S):
+        self.lookup = lookup
+        self.cache_size = cache_size
+        self.cache_bytes_limit = int(cache_mb * 2**20)
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.metrics = ServiceMetrics()
+        self.encoder = RowEncoder(lookup.df)
+        self.batch_window = batch_window
+        self._batcher = None
+    
+    def warm(self):
+        """Build the name and spatial indexes up front instead of on the first query."""
+        self.lookup.name_index()
+        try:
+            self.batcher()
+        except ImportError as e:
+            print(f"   Nearest queries unavailable: {e}")
+    
+    def batcher(self):
+        if self._batcher is None:
+            self._batcher = NearestBatcher(
+                self.lookup.spatial_index(), self.metrics, self.encoder, self.batch_window
+            )
+        return self._batcher
+    
+    async def answer(self, kind, params):
+        """Return the JSON answer of a query, from the cache when it was asked before."""
+        key = normalize_query(kind, params)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.metrics.cache_hits += 1
+            return self.cache[key]
+        self.metrics.cache_misses += 1
+        
+        body = await self._compute(key)
+        if len(body) <= MAX_CACHED_ANSWER_BYTES and key not in self.cache:
+            self.cache[key] = body
+            self.cache_bytes += len(body)
+            while len(self.cache) > self.cache_size or self.cache_bytes > self.cache_bytes_limit:
+                self.cache_bytes -= len(self.cache.popitem(last=False)[1])
+        return body
+    
+    async def _compute(self, key):
+        kind = key[0]
+        lookup = self.lookup
+        if kind == 'feature':
+            position = lookup.feature_index.get_indexer([key[1]])[0]
+            return self.encoder.answer([position] if position >= 0 else [])
+        if kind == 'nearest':
+            _, latitude, longitude, k, level, country = key
+            rows, distances = await self.batcher().nearest(latitude, longitude, k, level, country)
+            found = rows >= 0
+            return self.encoder.answer(rows[found], distances=distances[found])
+        
+        if kind == 'country':
+            _, country, level, (limit, offset) = key
+            positions = lookup.search_positions(country_code=country, admin_level=level or None)
+        elif kind == 'level':
+            _, level, country, (limit, offset) = key
+            positions = lookup.search_positions(country_code=country or None, admin_level=level)
+        else:
+            _, name, country, level, (limit, offset) = key
+            positions = lookup.search_positions(country or None, level or None, name)
+        return self.encoder.answer(positions[offset:offset + limit], total=len(positions), offset=offset)
+    
+    async def answer_batch(self, body):
+        """Answer a JSON list of queries, each an object with a "type" and its parameters."""
+        try:
+            queries = json.loads(body or b'null')
+        except ValueError:
+            raise QueryError("body is not valid JSON")
+        if isinstance(queries, dict):
+            queries = queries.get('queries')
+        if not isinstance(queries, list) or not all(isinstance(query, dict) for query in queries):
+            raise QueryError("expected a JSON list of query objects")
+        
+        # Any failing query, such as a nearest query without scipy, answers with its own error
+        async def one(query):
+            try:
+                return await self.answer(str(query.get('type', '')), query)
+            except Exception as e:
+                return json.dumps({'error': str(e)}).encode('utf-8')
+        
+        answers = await asyncio.gather(*(one(query) for query in queries))
+        return b'[' + b', '.join(answers) + b']'
+    
+    async def route(self, method, target, body):
+        """Return the status and JSON body of one HTTP request."""
+        url = urlsplit(target)
+        endpoint = url.path.strip('/')
+        if endpoint == 'stats':
+            return 200, json.dumps(self.metrics.summary(len(self.cache), self.cache_bytes)).encode('utf-8')
+        if endpoint == 'batch':
+            if method != 'POST':
+                return 405, b'{"error": "use POST"}'
+            return 200, await self.answer_batch(body)
+        if endpoint not in QUERY_TYPES:
+            return 404, json.dumps({'error': f"unknown endpoint: /{endpoint}"}).encode('utf-8')
+        if method != 'GET':
+            return 405, b'{"error": "use GET"}'
+        return 200, await self.answer(endpoint, dict(parse_qsl(url.query)))
+    
+    async def respond(self, method, target, body):
+        """Route a request, turning errors into JSON error answers."""
+        try:
+            return await self.route(method.upper(), target, body)
+        except QueryError as e:
+            return 400, json.dumps({'error': str(e)}).encode('utf-8')
+        except Exception as e:
+            return 500, json.dumps({'error': str(e)}).encode('utf-8')
+    
+    async def handle(self, reader, writer):
+        """Serve the HTTP/1.1 requests of one connection until it closes."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                started = time.perf_counter()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                
+                # A body that is not read leaves the rest of the stream unusable, so
+                # a refused body is answered once and the connection closed
+                length = headers.get('content-length') or '0'
+                refused = None
+                if not (length.isascii() and length.isdigit()):
+                    refused = 400, b'{"error": "invalid Content-Length"}'
+                elif int(length) > MAX_BODY_BYTES:
+                    refused = 413, json.dumps({'error': f"body larger than {MAX_BODY_BYTES} bytes"}).encode('utf-8')
+                body = await reader.readexactly(int(length)) if refused is None and int(length) else b''
+                
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    # A malformed request line is answered once and the connection closed
+                    method, target, version = 'GET', '/', 'HTTP/1.0'
+                    status, payload = 400, b'{"error": "malformed request line"}'
+                else:
+                    status, payload = refused or await self.respond(method, target, body)
+                
+                keep_alive = (refused is None and headers.get('connection', '').lower() != 'close'
+                              and version.upper() == 'HTTP/1.1')
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + payload
+                )
+                await writer.drain()
+                self.metrics.record(urlsplit(target).path, time.perf_counter() - started, status >= 400)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+async def serve(lookup, host=DEFAULT_HOST, port=DEFAULT_PORT, cache_size=DEFAULT_CACHE_SIZE,
+                cache_mb=DEFAULT_CACHE_MB):
+    """Serve lookups over HTTP until cancelled."""
+    service = LookupService(lookup, cache_size, cache_mb)
+    print("   Building indexes...")
+    service.warm()
+    server = await asyncio.start_server(service.handle, host, port, backlog=CONNECTION_BACKLOG)
+    print(f"✅ Serving {len(lookup.df):,} divisions on http://{host}:{port}/ (Ctrl+C to stop)")
+    async with server:
+        await server.serve_forever()
+
+def main(argv=None):
+    """Load the processed data once and serve it."""
+    parser = argparse.ArgumentParser(description="Serve division lookups as a local HTTP/JSON service.")
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"address to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument(
+        '--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+        help=f"normalized queries whose answers are cached (default: {DEFAULT_CACHE_SIZE:,})"
+    )
+    parser.add_argument(
+        '--cache-mb', type=float, default=DEFAULT_CACHE_MB,
+        help=f"total size of the cached answers in MB (default: {DEFAULT_CACHE_MB})"
+    )
+    args = parser.parse_args(argv)
+    
+    print("Administrative Division Lookup Service")
+    print("=" * 40)
+    lookup = AdminLookup.load()
+    if lookup is None:
+        sys.exit(1)
+    try:
+        asyncio.run(serve(lookup, args.host, args.port, args.cache_size, args.cache_mb))
+    except KeyboardInterrupt:
+        print("\nStopped.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Accent-insensitive and typo-tolerant name search.
+Names are reduced to search keys (accents removed, case folded, punctuation
+collapsed), so "Sao Paulo" finds "São Paulo". Each distinct key is indexed once
+by its character trigrams. A query is answered in tiers, best first:
+exact key, key prefix, substring, then fuzzy matches ranked by trigram
+similarity. Query results are memoized. Indexes can be pickled, and a
+pickled index is queried without importing pandas.
+"""
+
+import bisect
+import re
+import unicodedata
+from collections import defaultdict, namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+# Letters that do not decompose into a base letter and an accent
+TRANSLITERATIONS = str.maketrans({
+    'ø': 'o', 'Ø': 'o', 'ł': 'l', 'Ł': 'l', 'đ': 'd', 'Đ': 'd', 'ð': 'd', 'Ð': 'd',
+    'þ': 'th', 'Þ': 'th', 'æ': 'ae', 'Æ': 'ae', 'œ': 'oe', 'Œ': 'oe', 'ı': 'i'
+})
+
+# Match tiers, best first
+EXACT, PREFIX, SUBSTRING, FUZZY = range(4)
+
+# Minimum trigram similarity (Jaccard) of a fuzzy match
+DEFAULT_MIN_SIMILARITY = 0.3
+
+# Distinct queries whose matches are kept per index
+QUERY_CACHE_SIZE = 4096
+
+Match = namedtuple('Match', ['name_id', 'tier', 'similarity'])
+
+@lru_cache(maxsize=1 << 16)
+def normalize_name(name):
+    """Return the search key of a name: no accents, case folded, single spaces between words."""
+    text = unicodedata.normalize('NFKD', str(name).translate(TRANSLITERATIONS))
+    text = ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+    return ' '.join(re.split(r'[\W_]+', text)).strip()
+
+def search_keys(names):
+    """Return the search key of every name as an object array, normalizing each distinct name once."""
+    import pandas as pd
+    
+    codes, uniques = pd.factorize(pd.Series(names, dtype=object), use_na_sentinel=True)
+    # Missing names (code -1) get the empty key at the end
+    keys = np.array([normalize_name(name) for name in uniques] + [''], dtype=object)
+    return keys[codes]
+
+def trigrams(key, padded=True):
+    """Return the set of character trigrams of a search key.
+    
+    Padded trigrams also mark the start and end of the key.
+    """
+    if padded:
+        key = f'  {key} '
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+class NameIndex:
+    """Search index over a sequence of names, one per row."""
+    
+    def __init__(self, names):
+        # pandas is only needed to build an index, not to query a pickled one
+        import pandas as pd
+        
+        codes, unique_names = pd.factorize(pd.Series(names).astype(object), use_na_sentinel=True)
+        self.names = list(unique_names)
+        self.keys = [normalize_name(name) for name in self.names]
+        self.rows_of_name = pd.Series(np.arange(len(codes))).groupby(codes).indices
+        self.rows_of_name.pop(-1, None)
+        
+        # Keys in sorted order, for prefix searches
+        self.key_order = sorted(range(len(self.keys)), key=self.keys.__getitem__)
+        self.sorted_keys = [self.keys[name_id] for name_id in self.key_order]
+        
+        postings = defaultdict(list)
+        self.trigram_counts = np.zeros(len(self.keys), dtype=np.int64)
+        for name_id, key in enumerate(self.keys):
+            key_trigrams = trigrams(key)
+            self.trigram_counts[name_id] = len(key_trigrams)
+            for trigram in key_trigrams:
+                postings[trigram].append(name_id)
+        self.postings = {trigram: np.array(ids, dtype=np.int64) for trigram, ids in postings.items()}
+        
+        # The trigrams holding each 1 or 2 character gram, for substring searches of short keys
+        short_grams = defaultdict(set)
+        for trigram in self.postings:
+            for length in (1, 2):
+                for start in range(4 - length):
+                    short_grams[trigram[start:start + length]].add(trigram)
+        self.short_grams = {gram: sorted(held_by) for gram, held_by in short_grams.items()}
+        
+        self._cached_matches = lru_cache(maxsize=QUERY_CACHE_SIZE)(self._matches)
+    
+    def __getstate__(self):
+        # The query cache is rebuilt empty after unpickling
+        state = dict(self.__dict__)
+        del state['_cached_matches']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cached_matches = lru_cache(maxsize=QUERY_CACHE_SIZE)(self._matches)
+    
+    def matches(self, query, min_similarity=DEFAULT_MIN_SIMILARITY):
+        """Return the matching distinct names as Match tuples, best first."""
+        return self._cached_matches(normalize_name(query), min_similarity)
+    
+    def positions(self, query, min_similarity=DEFAULT_MIN_SIMILARITY):
+        """Return the row positions of the matching names, best match first."""
+        found = [self.rows_of_name[match.name_id] for match in self.matches(query, min_similarity)]
+        if not found:
+            return np.empty(0, dtype=np.intp)
+        return np.concatenate(found)
+    
+    def _prefix_ids(self, key):
+        start = bisect.bisect_left(self.sorted_keys, key)
+        end = bisect.bisect_left(self.sorted_keys, key + '\uffff')
+        return self.key_order[start:end]
+    
+    def _candidates(self, query_trigrams):
+        """Count the query trigrams shared by each name holding at least one of them.
+        
+        Only the posting lists of the query trigrams are counted, so the cost
+        grows with the candidates rather than with the index.
+        """
+        lists = [self.postings[trigram] for trigram in query_trigrams if trigram in self.postings]
+        if not lists:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(lists), return_counts=True)
+    
+    def _matches(self, key, min_similarity):
+        if not key:
+            return ()
+        
+        tiers = {}
+        for name_id in self._prefix_ids(key):
+            tiers[name_id] = EXACT if self.keys[name_id] == key else PREFIX
+        
+        # Substrings contain every unpadded trigram of the query
+        if len(key) >= 3:
+            inner = trigrams(key, padded=False)
+            candidates, shared = self._candidates(inner)
+            substring_ids = candidates[shared == len(inner)]
+        else:
+            # A shorter key lies inside one of the padded trigrams of every name containing it
+            substring_ids, _ = self._candidates(self.short_grams.get(key, ()))
+        for name_id in substring_ids:
+            if name_id not in tiers and key in self.keys[name_id]:
+                tiers[name_id] = SUBSTRING
+        
+        matches = [
+            Match(int(name_id), tier, 1.0)
+            for name_id, tier in sorted(
+                tiers.items(), key=lambda item: (item[1], len(self.keys[item[0]]), item[0])
+            )
+        ]
+        
+        # Fuzzy matches ranked by Jaccard similarity of the padded trigram sets
+        query_trigrams = trigrams(key)
+        candidates, shared = self._candidates(query_trigrams)
+        similarity = shared / (len(query_trigrams) + self.trigram_counts[candidates] - shared)
+        similar = similarity >= min_similarity
+        candidates, similarity = candidates[similar], similarity[similar]
+        for position in np.lexsort((candidates, -similarity)):
+            name_id = int(candidates[position])
+            if name_id not in tiers:
+                matches.append(Match(name_id, FUZZY, float(similarity[position])))
+        return tuple(matches)
+
+def best_matches(matches):
+    """Narrow ranked matches down to the most likely intended names.
+    
+    An exact match wins outright; otherwise all prefix and substring matches are
+    kept, and only without those the most similar fuzzy matches.
+    """
+    if not matches:
+        return []
+    best = matches[0]
+    if best.tier == EXACT:
+        return [match for match in matches if match.tier == EXACT]
+    if best.tier == FUZZY:
+        return [match for match in matches if match.similarity == best.similarity]
+    return [match for match in matches if match.tier != FUZZY]
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Per-stage metrics of the processing pipelines.
+Each numbered stage of a processor records its wall time, CPU time (of the
+process and of its finished worker processes), resident memory at the end,
+peak resident memory and the rows going in and out. A stage whose work is
+done inside another one (a filter applied by the reader) is recorded as
+derived, with its row counts only. Each finished stage is
+appended to a JSON lines file as one object, followed by one summary object
+for the whole run, so schedulers can size nodes and alert on slow stages.
+Every record has a status: 'ok', or 'error' for the stage that was running
+when the run failed.
+The peak memory is the stage's own peak where the kernel allows resetting
+the high-water mark (Linux), and the process peak so far elsewhere
+(peak_scope tells which). With a profile directory every stage also runs
+under cProfile and its statistics are written to <pipeline>_<number>_<name>.prof
+(read them with python3 -m pstats or snakeviz).
+"""
+
+import cProfile
+import json
+import os
+import re
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+def rss_mb():
+    """Return the current resident memory of the process in MB (None where /proc is missing)."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError):
+        return None
+
+def reset_peak_rss():
+    """Reset the kernel's peak resident memory mark of the process; return False if unsupported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb():
+    """Return the peak resident memory in MB, since the last reset where supported."""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+def children_cpu_s():
+    """Return the CPU time used by finished child processes (worker pools) so far."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def format_record(record):
+    """Return a one-line console summary of a stage record."""
+    rows = '' if record.get('rows_out') is None else f" {record['rows_out']:>12,} rows"
+    return (f"{record['name']:<12} {record['wall_s']:>9.2f}s wall {record['cpu_s']:>9.2f}s cpu "
+            f"{record['peak_rss_mb']:>9.0f} MB peak{rows}")
+
+class PipelineMetrics:
+    """Record the metrics of the numbered stages of one pipeline run.
+    
+    Stages are started with start() and end when the next one starts or on
+    finish()/close(); stage() wraps one stage in a with block instead.
+    """
+    
+    def __init__(self, pipeline, metrics_file=None, profile_dir=None):
+        self.pipeline = pipeline
+        self.metrics_file = metrics_file
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.run_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{os.getpid()}"
+        self.records = []
+        self._current = None
+        self._started = (time.perf_counter(), time.process_time())
+        if self.profile_dir:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+    
+    def start(self, number, name, rows_in=None):
+        """Start a stage, finishing the current one first."""
+        self.finish()
+        record = {
+            'pipeline': self.pipeline, 'run_id': self.run_id, 'stage': number, 'name': name,
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'rows_in': rows_in, 'rows_out': None
+        }
+        record['peak_scope'] = 'stage' if reset_peak_rss() else 'process'
+        profiler = None
+        if self.profile_dir:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        self._current = (record, profiler, time.perf_counter(), time.process_time(), children_cpu_s())
+        return record
+    
+    def finish(self, rows_out=None, rows_in=None, status='ok'):
+        """Finish the current stage, if any, and return its record.
+        
+        Row counts only known at the end of the stage can be given here.
+        """
+        if self._current is None:
+            return None
+        record, profiler, wall, cpu, child_cpu = self._current
+        self._current = None
+        record['status'] = status
+        record['wall_s'] = round(time.perf_counter() - wall, 3)
+        record['cpu_s'] = round(time.process_time() - cpu, 3)
+        record['child_cpu_s'] = round(children_cpu_s() - child_cpu, 3)
+        if profiler is not None:
+            profiler.disable()
+            slug = re.sub(r'\W+', '_', record['name']).strip('_').lower()
+            profile_file = self.profile_dir / f"{self.pipeline}_{record['stage']}_{slug}.prof"
+            profiler.dump_stats(profile_file)
+            record['profile'] = str(profile_file)
+        if rows_in is not None:
+            record['rows_in'] = rows_in
+        if rows_out is not None:
+            record['rows_out'] = rows_out
+        current = rss_mb()
+        record['rss_mb'] = None if current is None else round(current, 1)
+        record['peak_rss_mb'] = round(peak_rss_mb(), 1)
+        self.records.append(record)
+        self._write(record)
+        return record
+    
+    def derived(self, number, name, rows_in, rows_out):
+        """Record a stage done inside another one, with its row counts and no time or memory figures."""
+        self.finish()
+        record = {
+            'pipeline': self.pipeline, 'run_id': self.run_id, 'stage': number, 'name': name,
+            'derived': True, 'rows_in': rows_in, 'rows_out': rows_out, 'status': 'ok'
+        }
+        self.records.append(record)
+        self._write(record)
+        return record
+    
+    @contextmanager
+    def stage(self, number, name, rows_in=None):
+        """Measure the body of a with block as one stage; set record['rows_out'] inside it."""
+        record = self.start(number, name, rows_in)
+        try:
+            yield record
+        except BaseException:
+            self.finish(status='error')
+            raise
+        self.finish()
+    
+    def close(self, status='ok'):
+        """Finish the current stage with status and write the summary of the run."""
+        self.finish(status=status)
+        wall, cpu = self._started
+        summary = {
+            'pipeline': self.pipeline, 'run_id': self.run_id, 'stage': 'total', 'status': status,
+            'wall_s': round(time.perf_counter() - wall, 3), 'cpu_s': round(time.process_time() - cpu, 3),
+            'peak_rss_mb': max(
+                (record['peak_rss_mb'] for record in self.records if 'peak_rss_mb' in record), default=None
+            ),
+            'stages': len(self.records)
+        }
+        self._write(summary)
+        return summary
+    
+    def _write(self, record):
+        if not self.metrics_file:
+            return
+        if self.metrics_file == '-':
+            print(json.dumps(record), file=sys.stderr)
+            return
+        with open(self.metrics_file, 'a') as output:
+            output.write(json.dumps(record) + '\n')
+
+def add_metrics_arguments(parser):
+    """Add the --metrics-file and --profile options to a processor's argument parser."""
+    parser.add_argument(
+        '--metrics-file',
+        help="append per-stage time, CPU, memory and row counts to this JSON lines file ('-' for stderr)"
+    )
+    parser.add_argument(
+        '--profile', nargs='?', const='profiles', default=None, metavar='DIR',
+        help="run every stage under cProfile and write the statistics to DIR (default: profiles)"
+    )
@@ -8,104 +8,114 @@ This script processes the GNS (GEOnet Names Server) data files to extract:
 """
 
 import pandas as pd
+import argparse
 import sys
 from pathlib import Path
 import warnings
+from admin_hierarchy import assign_parents
+from gns_dedup import RANKING_PROFILES, deduplicate_names
+from gns_schema import report_memory
+from gns_summary import summarize
+from gns_workbook import write_master_workbook
+from gns_reader import ADMIN_COLUMNS, ADMIN_REGIONS_FILE, read_admin_regions
+from pipeline_metrics import PipelineMetrics, add_metrics_arguments
 warnings.filterwarnings('ignore')
 
-def process_gns_administrative_data():
-    """Process GNS administrative data with coordinates."""
+def process_gns_administrative_data(use_cache=True, streaming_excel=False, metrics=None):
+    """Process GNS administrative data with coordinates.
+    
+    With use_cache the parsed GNS file is kept in a columnar cache
+    (see gns_cache.py) and reused while the source file is unchanged. With
+    streaming_excel the workbook is written in one streaming pass (see gns_workbook.py).
+    The time, memory and row counts of each numbered stage are recorded in
+    metrics (see pipeline_metrics.py); the filter stages 3 and 4 are done by
+    the reader in stage 2 and only record their row counts.
+    """
+    
+    if metrics is None:
+        metrics = PipelineMetrics('process_all_admin_levels_simple')
     
     print("Processing GNS Administrative Data with Coordinates")
     print("=" * 55)
     
     try:
         print("1. Reading country codes...")
+        metrics.start(1, 'read country codes')
         countries_df = pd.read_csv('Country_Codes.csv')
         print(f"   Found {len(countries_df)} countries")
+        metrics.finish(rows_out=len(countries_df))
         
         print("\n2. Reading administrative regions data...")
         print("   This may take a while due to large file size...")
+        metrics.start(2, 'read administrative regions')
         
         # Read the large administrative regions file with all relevant columns
-        admin_df = pd.read_csv(
-            'Administrative_Regions/Administrative_Regions.txt',
-            sep='\t',
-            low_memory=False
+        admin_filtered, filter_counts = read_admin_regions(
+            ADMIN_REGIONS_FILE,
+            usecols=ADMIN_COLUMNS,
+            require_display_flag=False,
+            use_cache=use_cache
         )
         
-        print(f"   Loaded {len(admin_df)} total records")
-        print(f"   Columns available: {len(admin_df.columns)}")
+        print(f"   Loaded {filter_counts['read']} total records")
+        print(f"   Columns available: {len(admin_filtered.columns)}")
+        report_memory(admin_filtered, 'filtered candidates')
+        metrics.finish(rows_in=filter_counts['read'], rows_out=len(admin_filtered))
         
+        # Stages 3 and 4 run inside the reader in stage 2, so only their row counts are recorded
         print("\n3. Filtering for administrative divisions...")
         
-        # Filter for administrative divisions (ADM1, ADM2, ADM3, ADM4, ADMD)
-        adm_mask = admin_df['desig_cd'].str.startswith(('ADM1', 'ADM2', 'ADM3', 'ADM4', 'ADMD'), na=False)
-        admin_filtered = admin_df[adm_mask].copy()
+        # Administrative divisions (ADM1, ADM2, ADM3, ADM4, ADMD) are selected by the reader
+        print(f"   Administrative records found: {filter_counts['administrative']:,}")
+        metrics.derived(3, 'administrative filter', filter_counts['read'], filter_counts['administrative'])
         
-        print(f"   Administrative records found: {len(admin_filtered):,}")
+        print("\n4. Applying quality filters...")
+        
+        # Display and coordinate filters are also applied by the reader
+        if 'display' in filter_counts:
+            print(f"   After display filter: {filter_counts['display']:,}")
+        print(f"   After coordinate filter: {filter_counts['coordinates']:,}")
         
         # Check what designation codes we have
         print("\n   Administrative levels found:")
         level_counts = admin_filtered['desig_cd'].value_counts()
         for level, count in level_counts.head(10).items():
             print(f"     {level}: {count:,} records")
-        
-        print("\n4. Applying quality filters...")
-        
-        # Filter for records with display values (not empty)
-        if 'display' in admin_filtered.columns:
-            display_mask = admin_filtered['display'].notna() & (admin_filtered['display'] != '')
-            admin_filtered = admin_filtered[display_mask]
-            print(f"   After display filter: {len(admin_filtered):,}")
-        
-        # Remove records without coordinates
-        coord_mask = (pd.to_numeric(admin_filtered['lat_dd'], errors='coerce').notna() & 
-                     pd.to_numeric(admin_filtered['long_dd'], errors='coerce').notna())
-        admin_filtered = admin_filtered[coord_mask]
-        print(f"   After coordinate filter: {len(admin_filtered):,}")
+        metrics.derived(4, 'quality filters', filter_counts['administrative'], len(admin_filtered))
         
         print("\n5. Applying deduplication strategy...")
+        metrics.start(5, 'deduplicate', rows_in=len(admin_filtered))
         print("   Priority: Approved (N) > Conventional (C) > Non-auth (D) > Variant (V)")
         print("   Secondary: Lower name_rank > English language > others")
         
-        # Set up priority scoring
-        name_type_priority = {'N': 1, 'C': 2, 'D': 3, 'V': 4}
-        admin_filtered['nt_priority'] = admin_filtered['nt'].map(name_type_priority).fillna(999)
-        
-        # Convert name_rank to numeric (lower is better)
-        admin_filtered['name_rank_num'] = pd.to_numeric(admin_filtered['name_rank'], errors='coerce').fillna(999)
-        
-        # Language priority: English first, then others
-        admin_filtered['lang_priority'] = admin_filtered['lang_cd'].apply(
-            lambda x: 1 if x == 'eng' else 2
-        )
-        
-        # Sort by quality criteria to get best records first
-        admin_filtered = admin_filtered.sort_values([
-            'ufi',                # Group by unique feature ID
-            'nt_priority',        # Name type priority (N=1, C=2, D=3, V=4)
-            'name_rank_num',      # Name rank (lower is better)
-            'lang_priority'       # Language priority (eng=1, others=2)
-        ])
-        
-        # Keep only the first (best) record for each unique feature
-        admin_deduplicated = admin_filtered.groupby('ufi').first().reset_index()
+        # Name type, name rank and language are combined into one score and the
+        # lowest scoring row of each feature is kept (see gns_dedup.py).
+        # Language priority here is English first, then all others equally
+        # (the 'english' ranking profile).
+        admin_deduplicated = deduplicate_names(admin_filtered, profile=RANKING_PROFILES['english'])
         
         print(f"   After deduplication: {len(admin_deduplicated):,} unique divisions")
+        report_memory(admin_deduplicated, 'deduplicated')
+        
+        # Counts per country and level of the deduplicated rows, from which the
+        # summary sheets and statistics below are taken (see gns_summary.py)
+        summary = summarize(admin_deduplicated)
         
         # Count by administrative level after deduplication
-        final_level_counts = admin_deduplicated['desig_cd'].value_counts()
+        final_level_counts = summary.level_counts(located=False).sort_values(ascending=False, kind='stable')
+        final_level_counts = final_level_counts[final_level_counts > 0]
         print("\n   Final counts by administrative level:")
         for level, count in final_level_counts.items():
             if level.startswith('ADM'):
                 print(f"     {level}: {count:,} unique divisions")
+        metrics.finish(rows_out=len(admin_deduplicated))
         
         print("\n6. Processing coordinates and country information...")
+        metrics.start(6, 'attach country info', rows_in=len(admin_deduplicated))
         
-        # Clean coordinates
-        admin_deduplicated['latitude'] = pd.to_numeric(admin_deduplicated['lat_dd'], errors='coerce')
-        admin_deduplicated['longitude'] = pd.to_numeric(admin_deduplicated['long_dd'], errors='coerce')
+        # Coordinates were already parsed to floats by the reader
+        admin_deduplicated['latitude'] = admin_deduplicated['lat_dd']
+        admin_deduplicated['longitude'] = admin_deduplicated['long_dd']
         
         # Merge with country information
         admin_coords = admin_deduplicated.merge(
@@ -118,14 +128,19 @@ def process_gns_administrative_data():
         
         print(f"   Records with country info: {len(admin_coords)}")
         
+        # Link each ADM2-ADM4 division to the division one level up (see admin_hierarchy.py)
+        admin_coords['Parent_Feature_ID'] = assign_parents(admin_coords)
+        metrics.finish(rows_out=len(admin_coords))
+        
         print("\n7. Creating structured output...")
+        metrics.start(7, 'structure output', rows_in=len(admin_coords))
         
         # Create the final output dataframe
         output_df = admin_coords[[
             'Country_Code', 'Short_Name', 'Full_Name',
             'desig_cd', 'full_name', 'adm1',
             'latitude', 'longitude',
-            'ufi', 'uni', 'nt', 'name_rank', 'lang_cd',
+            'ufi', 'uni', 'Parent_Feature_ID', 'nt', 'name_rank', 'lang_cd',
             'transl_cd', 'script_cd', 'generic'
         ]].copy()
         
@@ -152,42 +167,18 @@ def process_gns_administrative_data():
             'Administrative_Level', 
             'Administrative_Name'
         ])
+        report_memory(output_df, 'output')
+        metrics.finish(rows_out=len(output_df))
         
         print("\n8. Creating Excel output with multiple sheets...")
+        metrics.start(8, 'write workbook', rows_in=len(output_df))
         
         output_file = 'Complete_Administrative_Divisions_with_Coordinates.xlsx'
         
-        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-            # All administrative divisions
-            output_df.to_excel(writer, sheet_name='All_Admin_Divisions', index=False)
-            
-            # Separate sheets by administrative level
-            for level in ['ADM1', 'ADM2', 'ADM3', 'ADM4', 'ADMD']:
-                level_data = output_df[output_df['Administrative_Level'] == level]
-                if not level_data.empty:
-                    sheet_name = f'{level}_Divisions'
-                    level_data.to_excel(writer, sheet_name=sheet_name, index=False)
-            
-            # Country summary
-            country_summary = output_df.groupby([
-                'Country_Code', 'Country_Name', 'Administrative_Level'
-            ]).size().reset_index(name='Count')
-            
-            country_pivot = country_summary.pivot(
-                index=['Country_Code', 'Country_Name'], 
-                columns='Administrative_Level', 
-                values='Count'
-            ).fillna(0).astype(int)
-            
-            # Add total column
-            country_pivot['Total'] = country_pivot.sum(axis=1)
-            country_pivot = country_pivot.sort_values('Total', ascending=False)
-            
-            country_pivot.to_excel(writer, sheet_name='Country_Summary')
-            
-            # Top countries by total administrative divisions
-            top_countries = country_pivot.head(30).copy()
-            top_countries.to_excel(writer, sheet_name='Top_30_Countries')
+        # Divisions per country and level, for the summary sheets and the report below
+        country_pivot = summary.country_pivot(countries_df)
+        write_master_workbook(output_df, output_file, country_pivot, streaming=streaming_excel)
+        metrics.finish(rows_out=len(output_df))
         
         print(f"\n✅ SUCCESS! Created {output_file}")
         print("\nFile contains the following sheets:")
@@ -203,11 +194,12 @@ def process_gns_administrative_data():
         # Display summary statistics
         print(f"\n📊 SUMMARY STATISTICS:")
         print(f"   Total administrative divisions: {len(output_df):,}")
-        print(f"   Countries represented: {output_df['Country_Code'].nunique()}")
-        print(f"   Administrative levels: {output_df['Administrative_Level'].nunique()}")
+        level_summary = summary.level_counts()
+        level_summary = level_summary[level_summary > 0]
+        print(f"   Countries represented: {summary.country_count(countries_df)}")
+        print(f"   Administrative levels: {len(level_summary)}")
         
         print(f"\n📍 BY ADMINISTRATIVE LEVEL:")
-        level_summary = output_df['Administrative_Level'].value_counts().sort_index()
         for level, count in level_summary.items():
             print(f"   {level}: {count:,} divisions")
         
@@ -229,6 +221,7 @@ def process_gns_administrative_data():
         print(f"   Display filter: Only public-display records included")
         print(f"   Coordinate coverage: 100% (filtered for valid coordinates)")
         
+        metrics.close()
         return output_file
         
     except FileNotFoundError as e:
@@ -236,14 +229,34 @@ def process_gns_administrative_data():
         print("Make sure the following files exist:")
         print("  - Country_Codes.csv")
         print("  - Administrative_Regions/Administrative_Regions.txt")
+        metrics.close('error')
         return None
     except Exception as e:
         print(f"❌ Error processing data: {e}")
         import traceback
         traceback.print_exc()
+        metrics.close('error')
         return None
 
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(
+        description="Process GNS administrative divisions with coordinates."
+    )
+    parser.add_argument(
+        '--no-cache', dest='use_cache', action='store_false',
+        help="always parse the GNS text file instead of using the columnar cache"
+    )
+    parser.add_argument(
+        '--streaming-excel', action='store_true',
+        help="write the workbook in one streaming pass instead of building every sheet in memory"
+    )
+    add_metrics_arguments(parser)
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
+    
     print("🌍 GNS Administrative Data Processor with Coordinates")
     print("=" * 55)
     print("This script will process the complete GNS dataset to extract:")
@@ -254,7 +267,10 @@ if __name__ == "__main__":
     print()
     
     # Process the main administrative data
-    output_file = process_gns_administrative_data()
+    output_file = process_gns_administrative_data(
+        use_cache=args.use_cache, streaming_excel=args.streaming_excel,
+        metrics=PipelineMetrics('process_all_admin_levels_simple', args.metrics_file, args.profile)
+    )
     
     if output_file:
         print(f"\n🎉 Processing complete!")
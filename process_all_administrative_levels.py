@@ -8,244 +8,422 @@ This script processes the GNS (GEOnet Names Server) data files to extract:
 """
 
 import pandas as pd
+import argparse
 import sys
 from pathlib import Path
 import warnings
+from admin_hierarchy import assign_parents
+from admin_snapshot import write_snapshot
+from gns_dedup import (
+    RANKING_PROFILES, best_rows_by_profile, deduplicate_names, deduplicate_profiles, describe_profile,
+    load_profiles, profile_scores, resolve_profiles
+)
+from gns_asof import NameValidityIndex, as_of_date
+from gns_cache import cache_available, find_cached_source
+from gns_incremental import (
+    affected_country_codes, build_change_report, incremental_deduplicate,
+    load_snapshot, save_snapshot, write_change_report
+)
+from gns_parallel import (
+    parallel_best_rows, parallel_deduplicate, read_admin_regions_parallel, resolve_workers
+)
+from gns_schema import SCHEMA_VERSION, report_memory
+from split_by_country import export_countries, write_master_intermediate
+from gns_exporters import EXPORTERS, OUTPUT_STEM, export_frame, hilbert_order, missing_requirements, output_path
+from gns_summary import summarize_profiles
+from gns_reader import ADM_PREFIXES, ADMIN_COLUMNS, ADMIN_REGIONS_FILE, DEFAULT_CHUNKSIZE, read_admin_regions
+from gns_stages import StageStore, source_stamp, stage_key
+from pipeline_metrics import PipelineMetrics, add_metrics_arguments
 warnings.filterwarnings('ignore')
 
-def process_gns_administrative_data():
-    """Process GNS administrative data with coordinates."""
+def attach_country_info(admin_deduplicated, countries_df):
+    """Keep the divisions with coordinates, add their country names and link them to their parents."""
+    # Clean and process the data
+    # Coordinates were already parsed to floats by the reader
+    admin_deduplicated['latitude'] = admin_deduplicated['lat_dd']
+    admin_deduplicated['longitude'] = admin_deduplicated['long_dd']
+    
+    # Final coordinate check (should be minimal after earlier filtering)
+    coord_mask = admin_deduplicated['latitude'].notna() & admin_deduplicated['longitude'].notna()
+    admin_coords = admin_deduplicated[coord_mask].copy()
+    
+    # Merge with country information
+    admin_coords = admin_coords.merge(
+        countries_df[['Country_Code', 'Short_Name', 'Full_Name']], 
+        left_on='cc_ft', 
+        right_on='Country_Code', 
+        how='left',
+        suffixes=('', '_country')
+    )
+    
+    # Link each ADM2-ADM4 division to the division one level up (see admin_hierarchy.py)
+    admin_coords['Parent_Feature_ID'] = assign_parents(admin_coords)
+    return admin_coords
+
+def structure_output(admin_coords):
+    """Rename, select and sort the columns of the output dataset."""
+    # Rename columns for clarity
+    output_df = admin_coords.rename(columns={
+        'full_name': 'Administrative_Name',
+        'desig_cd': 'Administrative_Level',
+        'cc_ft': 'Country_Code_Original',
+        'Country_Code': 'Country_Code',
+        'Short_Name': 'Country_Name',  
+        'Full_Name': 'Country_Full_Name',
+        'adm1': 'ADM1_Code',
+        'ufi': 'Unique_Feature_ID',
+        'uni': 'Unique_Name_ID',
+        'nt': 'Name_Type',
+        'name_rank': 'Name_Rank',
+        'lang_cd': 'Language_Code',
+        'transl_cd': 'Transliteration_Code',
+        'script_cd': 'Script_Code',
+        'generic': 'Generic_Term'
+    })
+    
+    # Use the merged country code
+    output_df['Country_Code'] = output_df['Country_Code']
+    
+    # Select and reorder columns
+    final_columns = [
+        'Country_Code',
+        'Country_Name',
+        'Country_Full_Name', 
+        'Administrative_Level',
+        'Administrative_Name',
+        'ADM1_Code',
+        'latitude',
+        'longitude',
+        'Unique_Feature_ID',
+        'Unique_Name_ID',
+        'Parent_Feature_ID',
+        'Name_Type',
+        'Name_Rank',
+        'Language_Code',
+        'Transliteration_Code',
+        'Script_Code',
+        'Generic_Term'
+    ]
+    
+    output_df = output_df[final_columns]
+    
+    # Sort by country, then administrative level, then name
+    output_df = output_df.sort_values([
+        'Country_Name', 
+        'Administrative_Level', 
+        'Administrative_Name'
+    ])
+    return output_df
+
+def write_output_formats(output_df, formats, stages, export_key, stem=OUTPUT_STEM,
+                         spatial_order=False, streaming_excel=False, country_pivot=None):
+    """Write output_df in each format and return the files, skipping files that are still current.
+    
+    A file written from the same enriched rows (export_key) is not written
+    again, so a run that failed on one format resumes with the next.
+    """
+    # Map formats can take the rows in Hilbert curve order; the workbook and the
+    # SQLite file keep the sorted order, so lookups return rows in the same order
+    map_df = hilbert_order(output_df) if spatial_order else output_df
+    # Only the files of the map formats depend on the row order, and only the
+    # workbook on the writer it was written with
+    map_key = stage_key('export-map', [export_key], {'spatial_order': spatial_order})
+    workbook_key = stage_key('export-xlsx', [export_key], {'streaming_excel': streaming_excel})
+    format_keys = {'xlsx': workbook_key, 'sqlite': export_key}
+    
+    output_files = []
+    for format_name in formats:
+        target = output_path(format_name, stem)
+        export_stage = f'export-{target}'
+        format_key = format_keys.get(format_name, map_key)
+        if stages.output_current(export_stage, format_key, target):
+            print(f"   {target} is up to date")
+            output_files.append(target)
+        elif format_name == 'xlsx':
+            if streaming_excel:
+                print("   Streaming rows to the workbook")
+            output_files.append(export_frame(
+                output_df, 'xlsx', target, country_pivot=country_pivot, streaming_excel=streaming_excel
+            ))
+        elif format_name == 'sqlite':
+            output_files.append(export_frame(output_df, 'sqlite', target))
+        else:
+            output_files.append(export_frame(map_df, format_name, target))
+        stages.mark_output(export_stage, format_key, output_files[-1])
+    return output_files
+
+def process_gns_administrative_data(streaming=False, chunksize=DEFAULT_CHUNKSIZE, use_cache=True,
+                                    incremental=False, workers=1, export_country_files=False,
+                                    streaming_excel=False, formats=('xlsx',), spatial_order=False,
+                                    metrics=None, use_stage_cache=True, profiles=None, as_of=None):
+    """Process GNS administrative data with coordinates.
+    
+    With streaming enabled the GNS file is parsed in chunks of `chunksize` rows
+    and filtered chunk by chunk instead of being loaded whole. With use_cache
+    the parsed file is kept in a columnar cache (see gns_cache.py) and reused
+    while the source file is unchanged. In incremental mode only features that
+    changed since the previous incremental run are deduplicated again, only the
+    affected Country_Exports files are rewritten and a change report is written
+    (see gns_incremental.py). With more than one worker, parsing (unless the
+    cache is used), ranking and incremental deduplication run in a process pool
+    (see gns_parallel.py).
+    With export_country_files, Country_Exports is written directly from the
+    result instead of by a separate split_by_country.py run. With streaming_excel
+    the workbook is written row batch by row batch in one pass (see gns_workbook.py).
+    formats lists the output formats to write (see gns_exporters.py); with
+    spatial_order the rows of the non-Excel formats are put in Hilbert curve order.
+    The time, memory and row counts of each numbered stage are recorded in
+    metrics (see pipeline_metrics.py). With use_stage_cache the outputs of the
+    load, rank, dedup and enrich stages are stored keyed by their inputs and
+    parameters and reused by later runs, and output files that are still
+    current are not written again (see gns_stages.py). profiles lists the
+    ranking profiles to select names with (default: the 'default' profile); all
+    of them are scored in one pass over the candidates, the first one gives the
+    main outputs and every other one its own output files, named after it.
+    With an as_of date only the names valid on that date (by their effective
+    and termination dates, see gns_asof.py) are candidates, and the outputs
+    are written as a dated historical snapshot, e.g. ..._as_of_2010-01-01.xlsx;
+    it raises ValueError together with incremental or export_country_files.
+    Returns the first output file written.
+    """
+    
+    if as_of is not None and (incremental or export_country_files):
+        # Both would replace state of the current release (the snapshot of
+        # incremental runs, Country_Exports) with the rows valid on as_of
+        raise ValueError("an as_of snapshot cannot be combined with incremental or export_country_files")
+    
+    if metrics is None:
+        metrics = PipelineMetrics('process_all_administrative_levels')
     
     print("Processing GNS Administrative Data with Coordinates")
     print("=" * 55)
     
+    stages = StageStore(enabled=use_stage_cache)
+    profiles = list(profiles or [RANKING_PROFILES['default']])
+    
     try:
         print("1. Reading country codes...")
+        metrics.start(1, 'read country codes')
         countries_df = pd.read_csv('Country_Codes.csv')
         print(f"   Found {len(countries_df)} countries")
+        metrics.finish(rows_out=len(countries_df))
         
         print("\n2. Reading administrative regions data...")
         print("   This may take a while due to large file size...")
+        metrics.start(2, 'read administrative regions')
         
         # Read the large administrative regions file with all relevant columns
-        admin_columns = [
-            'rk', 'ufi', 'uni', 'full_name', 'nt', 'lat_dd', 'long_dd', 
-            'efctv_dt', 'term_dt_f', 'term_dt_n', 'desig_cd', 'fc', 'cc_ft', 'adm1',
-            'name_rank', 'lang_cd', 'transl_cd', 'script_cd', 'display', 'generic'
-        ]
-        
-        admin_df = pd.read_csv(
-            'Administrative_Regions/Administrative_Regions.txt',
-            sep='\t',
-            usecols=admin_columns,
-            low_memory=False
-        )
+        def load():
+            cache_file = find_cached_source(ADMIN_REGIONS_FILE, ADMIN_COLUMNS, schema_version=SCHEMA_VERSION) \
+                if use_cache and cache_available() else None
+            if workers > 1 and cache_file is None:
+                # Each worker parses and filters its own byte ranges of the text file
+                print(f"   Parsing in parallel with {workers} workers")
+                return read_admin_regions_parallel(
+                    ADMIN_REGIONS_FILE,
+                    usecols=ADMIN_COLUMNS,
+                    workers=workers
+                )
+            return read_admin_regions(
+                ADMIN_REGIONS_FILE,
+                usecols=ADMIN_COLUMNS,
+                chunksize=chunksize if streaming else None,
+                use_cache=use_cache
+            )
+        
+        # The reader applies the filters while parsing, so loading and filtering are one stage
+        load_key = stage_key('load', [source_stamp(ADMIN_REGIONS_FILE)], {
+            'columns': ADMIN_COLUMNS,
+            'schema_version': SCHEMA_VERSION,
+            'adm_prefixes': ADM_PREFIXES
+        })
+        admin_filtered, filter_counts = stages.run('load', load_key, load)
         
-        print(f"   Loaded {len(admin_df)} administrative records")
+        print(f"   Loaded {filter_counts['read']} administrative records")
+        report_memory(admin_filtered, 'filtered candidates')
+        metrics.finish(rows_in=filter_counts['read'], rows_out=len(admin_filtered))
         
         print("\n3. Filtering and deduplicating administrative divisions...")
+        metrics.start(3, 'deduplicate', rows_in=len(admin_filtered))
         
-        # Filter for administrative divisions (ADM1, ADM2, ADM3, ADM4, ADMD)
-        adm_mask = admin_df['desig_cd'].str.startswith(('ADM1', 'ADM2', 'ADM3', 'ADM4', 'ADMD'), na=False)
-        admin_filtered = admin_df[adm_mask].copy()
-        
-        print(f"   Initial administrative records: {len(admin_filtered):,}")
-        
-        # Filter for quality records
+        # The ADM, display and coordinate filters are applied by the reader,
+        # chunk by chunk in streaming mode
+        print(f"   Initial administrative records: {filter_counts['administrative']:,}")
         print("   Applying quality filters...")
-        
-        # 1. Only include records marked for display
-        if 'display' in admin_filtered.columns:
-            display_mask = admin_filtered['display'].fillna('').str.upper() == 'Y'
-            admin_filtered = admin_filtered[display_mask]
-            print(f"   After display filter: {len(admin_filtered):,}")
-        
-        # 2. Apply display filter first - only show records marked for public display
-        if 'display' in admin_filtered.columns:
-            # Check what values exist in display column
-            display_values = admin_filtered['display'].value_counts()
-            print(f"   Display field sample values: {dict(list(display_values.items())[:5])}")
-            
-            # Filter for records that have display values (non-empty)
-            # Display field contains comma-separated numbers indicating display contexts
-            display_mask = admin_filtered['display'].notna() & (admin_filtered['display'] != '')
-            admin_filtered = admin_filtered[display_mask]
-            print(f"   After display filter: {len(admin_filtered):,}")
-        
-        # 3. Prefer official names based on Name Type (nt)
-        # Priority: N (Approved/Official) > C (Conventional) > D (Non-authoritative) > V (Variant)
-        name_type_priority = {'N': 1, 'C': 2, 'D': 3, 'V': 4}
-        admin_filtered['nt_priority'] = admin_filtered['nt'].map(name_type_priority).fillna(999)
-        
-        # 4. Use name_rank to get primary names (lower rank = higher priority)
-        admin_filtered['name_rank_num'] = pd.to_numeric(admin_filtered['name_rank'], errors='coerce').fillna(999)
-        
-        # 5. Language priority: English > common local languages > others
-        # Priority: English (eng) = 1, common locals = 2, others = 3
-        common_local_langs = {'spa', 'fra', 'deu', 'ita', 'por', 'rus', 'ara', 'zho', 'jpn', 'hin'}
-        admin_filtered['lang_priority'] = admin_filtered['lang_cd'].apply(
-            lambda x: 1 if x == 'eng' else (2 if x in common_local_langs else 3)
-        )
-        
-        # Remove records without coordinates
-        coord_mask = (pd.to_numeric(admin_filtered['lat_dd'], errors='coerce').notna() & 
-                     pd.to_numeric(admin_filtered['long_dd'], errors='coerce').notna())
-        admin_filtered = admin_filtered[coord_mask]
-        print(f"   After coordinate filter: {len(admin_filtered):,}")
+        if 'display' in filter_counts:
+            print(f"   After display filter: {filter_counts['display']:,}")
+        print(f"   After coordinate filter: {filter_counts['coordinates']:,}")
+        if as_of is not None:
+            # Names that were not yet effective or already terminated on the date drop out
+            admin_filtered = NameValidityIndex(admin_filtered).candidates_at(as_of)
+            print(f"   Valid on {as_of:%Y-%m-%d}: {len(admin_filtered):,}")
         
         # Deduplicate: for each unique feature (ufi), keep the best name
         print("   Applying deduplication strategy...")
-        print("   Priority: Approved (N) > Conventional (C) > Non-auth (D) > Variant (V)")
-        print("   Secondary: Lower name_rank > English language > others")
-        
-        # Sort by quality criteria to get best records first
-        admin_filtered = admin_filtered.sort_values([
-            'ufi',                # Group by unique feature
-            'nt_priority',        # Name type priority (N=1, C=2, D=3, V=4)
-            'name_rank_num',      # Name rank (lower is better)
-            'lang_priority'       # Language priority (eng=1, others=2)
-        ])
+        name_type_order, secondary_order = describe_profile(profiles[0])
+        print(f"   Priority: {name_type_order}")
+        print(f"   Secondary: {secondary_order}")
+        if [profile.name for profile in profiles] != ['default']:
+            print(f"   Ranking profiles: {', '.join(profile.name for profile in profiles)}")
+        
+        # Country languages of 'local' tiers are taken from all candidates, before any sharding
+        profiles = resolve_profiles(profiles, admin_filtered)
+        primary = profiles[0]
+        
+        # Name type, name rank and language are combined into one score and the
+        # lowest scoring row of each feature is kept (see gns_dedup.py)
+        def deduplicate(candidates):
+            if workers > 1:
+                # Candidate rows are sharded by country and deduplicated in a worker pool
+                return parallel_deduplicate(candidates, workers=workers, profile=primary)
+            return deduplicate_names(candidates, profile=primary)
+        
+        # The ranking scores and the winning rows of every profile are stages keyed by the profiles
+        ranking = {profile.name: profile._asdict() for profile in profiles}
+        rank_key = stage_key('rank', [load_key], {
+            'profiles': ranking,
+            'as_of': None if as_of is None else f"{as_of:%Y-%m-%d}"
+        })
+        dedup_key = stage_key('dedup', [rank_key])
+        
+        def deduplicate_all():
+            candidates = admin_filtered.reset_index(drop=True)
+            if workers > 1 and not stages.has('rank', rank_key):
+                # Candidate rows are sharded by country and each worker scores its shard and
+                # picks its best rows; the scores are stored for later runs like a serial run's
+                scores, best_rows, summaries = parallel_best_rows(candidates, profiles, workers=workers)
+                stages.save('rank', rank_key, scores)
+                return best_rows, summaries
+            # Serial and parallel runs store the same scores under the same key
+            scores = stages.run('rank', rank_key, lambda: profile_scores(candidates, profiles))
+            best_rows = best_rows_by_profile(candidates, scores)
+            return best_rows, summarize_profiles(best_rows)
+        
+        # Everything that changes which rows are candidates or which one wins;
+        # a snapshot taken with different settings cannot be reused
+        snapshot_settings = {
+            'columns': ADMIN_COLUMNS,
+            'schema_version': SCHEMA_VERSION,
+            'ranking': primary._asdict(),
+            'countries': countries_df[['Country_Code', 'Short_Name', 'Full_Name']].values.tolist()
+        }
+        snapshot = load_snapshot(snapshot_settings) if incremental else None
+        
+        if snapshot is not None:
+            # Only features whose name rows changed since the last run are deduplicated again
+            admin_deduplicated, changed_ufis = incremental_deduplicate(admin_filtered, snapshot, deduplicate)
+            print(f"   Incremental mode: {len(changed_ufis):,} features changed since the previous snapshot")
+            deduplicated = {primary.name: admin_deduplicated}
+            deduplicated.update(deduplicate_profiles(admin_filtered, profiles[1:]))
+            summaries = summarize_profiles(deduplicated)
+            stages.save('dedup', dedup_key, (deduplicated, summaries))
+        else:
+            if incremental:
+                print("   Incremental mode: no usable snapshot, running a full deduplication")
+            deduplicated, summaries = stages.run('dedup', dedup_key, deduplicate_all)
+            admin_deduplicated = deduplicated[primary.name]
         
-        # Keep only the first (best) record for each unique feature
-        admin_deduplicated = admin_filtered.groupby('ufi').first().reset_index()
+        if incremental:
+            save_snapshot(admin_filtered, admin_deduplicated, snapshot_settings)
         
         print(f"   After deduplication: {len(admin_deduplicated):,} unique divisions")
+        for profile in profiles[1:]:
+            print(f"   Profile {profile.name}: {len(deduplicated[profile.name]):,} unique divisions")
+        report_memory(admin_deduplicated, 'deduplicated')
+        
+        # Counts per country and level, coordinate coverage and bounding boxes, built with the
+        # winning rows (per shard in parallel runs) and stored with them in the dedup stage;
+        # the summary sheets and statistics below are taken from these (see gns_summary.py)
+        summary = summaries[primary.name]
         
         # Count by administrative level
-        level_counts = admin_deduplicated['desig_cd'].value_counts()
+        level_counts = summary.level_counts(located=False).sort_values(ascending=False, kind='stable')
+        level_counts = level_counts[level_counts > 0]
         for level, count in level_counts.items():
             if level.startswith('ADM'):
                 print(f"     {level}: {count:,} divisions")
         
-        print("\n4. Processing coordinates and country information...")
+        metrics.finish(rows_out=len(admin_deduplicated))
         
-        # Clean and process the data
-        admin_deduplicated['latitude'] = pd.to_numeric(admin_deduplicated['lat_dd'], errors='coerce')
-        admin_deduplicated['longitude'] = pd.to_numeric(admin_deduplicated['long_dd'], errors='coerce')
-        
-        # Final coordinate check (should be minimal after earlier filtering)
-        coord_mask = admin_deduplicated['latitude'].notna() & admin_deduplicated['longitude'].notna()
-        admin_coords = admin_deduplicated[coord_mask].copy()
+        print("\n4. Processing coordinates and country information...")
+        metrics.start(4, 'attach country info', rows_in=len(admin_deduplicated))
         
+        enrich_key = stage_key('enrich', [dedup_key, source_stamp('Country_Codes.csv')])
+        enriched = stages.run('enrich', enrich_key, lambda: {
+            name: attach_country_info(frame, countries_df) for name, frame in deduplicated.items()
+        })
+        admin_coords = enriched[primary.name]
         print(f"   Final dataset: {len(admin_coords)} divisions with coordinates")
+        print(f"   Divisions linked to a parent division: {admin_coords['Parent_Feature_ID'].notna().sum():,}")
         
-        # Merge with country information
-        admin_coords = admin_coords.merge(
-            countries_df[['Country_Code', 'Short_Name', 'Full_Name']], 
-            left_on='cc_ft', 
-            right_on='Country_Code', 
-            how='left',
-            suffixes=('', '_country')
-        )
+        metrics.finish(rows_out=len(admin_coords))
         
         print("\n5. Creating structured output...")
+        metrics.start(5, 'structure output', rows_in=len(admin_coords))
         
-        # Rename columns for clarity
-        output_df = admin_coords.rename(columns={
-            'full_name': 'Administrative_Name',
-            'desig_cd': 'Administrative_Level',
-            'cc_ft': 'Country_Code_Original',
-            'Country_Code': 'Country_Code',
-            'Short_Name': 'Country_Name',  
-            'Full_Name': 'Country_Full_Name',
-            'adm1': 'ADM1_Code',
-            'ufi': 'Unique_Feature_ID',
-            'uni': 'Unique_Name_ID',
-            'nt': 'Name_Type',
-            'name_rank': 'Name_Rank',
-            'lang_cd': 'Language_Code',
-            'transl_cd': 'Transliteration_Code',
-            'script_cd': 'Script_Code',
-            'generic': 'Generic_Term'
-        })
+        output_df = structure_output(admin_coords)
+        report_memory(output_df, 'output')
+        metrics.finish(rows_out=len(output_df))
         
-        # Use the merged country code
-        output_df['Country_Code'] = output_df['Country_Code']
-        
-        # Select and reorder columns
-        final_columns = [
-            'Country_Code',
-            'Country_Name',
-            'Country_Full_Name', 
-            'Administrative_Level',
-            'Administrative_Name',
-            'ADM1_Code',
-            'latitude',
-            'longitude',
-            'Unique_Feature_ID',
-            'Unique_Name_ID',
-            'Name_Type',
-            'Name_Rank',
-            'Language_Code',
-            'Transliteration_Code',
-            'Script_Code',
-            'Generic_Term'
-        ]
-        
-        output_df = output_df[final_columns]
-        
-        # Sort by country, then administrative level, then name
-        output_df = output_df.sort_values([
-            'Country_Name', 
-            'Administrative_Level', 
-            'Administrative_Name'
-        ])
-        
-        print("\n6. Creating Excel output with multiple sheets...")
-        
-        output_file = 'Complete_Administrative_Divisions_with_Coordinates.xlsx'
-        
-        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-            # All administrative divisions
-            output_df.to_excel(writer, sheet_name='All_Admin_Divisions', index=False)
-            
-            # Separate sheets by administrative level
-            for level in ['ADM1', 'ADM2', 'ADM3', 'ADM4', 'ADMD']:
-                level_data = output_df[output_df['Administrative_Level'] == level]
-                if not level_data.empty:
-                    sheet_name = f'{level}_Divisions'
-                    level_data.to_excel(writer, sheet_name=sheet_name, index=False)
-            
-            # Country summary
-            country_summary = output_df.groupby([
-                'Country_Code', 'Country_Name', 'Administrative_Level'
-            ]).size().reset_index(name='Count')
-            
-            country_pivot = country_summary.pivot(
-                index=['Country_Code', 'Country_Name'], 
-                columns='Administrative_Level', 
-                values='Count'
-            ).fillna(0).astype(int)
-            
-            # Add total column
-            country_pivot['Total'] = country_pivot.sum(axis=1)
-            country_pivot = country_pivot.sort_values('Total', ascending=False)
-            
-            country_pivot.to_excel(writer, sheet_name='Country_Summary')
-            
-            # Top countries by total administrative divisions
-            top_countries = country_pivot.head(30).copy()
-            top_countries.to_excel(writer, sheet_name='Top_30_Countries')
-        
-        print(f"\n✅ SUCCESS! Created {output_file}")
-        print("\nFile contains the following sheets:")
-        print("  📊 All_Admin_Divisions: Complete dataset with coordinates")
-        print("  📍 ADM1_Divisions: First-order divisions (states/provinces)")  
-        print("  📍 ADM2_Divisions: Second-order divisions (counties/districts)")
-        print("  📍 ADM3_Divisions: Third-order divisions (municipalities)")
-        print("  📍 ADM4_Divisions: Fourth-order divisions (local areas)")
-        print("  📍 ADMD_Divisions: General administrative divisions")
-        print("  📈 Country_Summary: Administrative divisions by country and level")
-        print("  🏆 Top_30_Countries: Countries with most administrative divisions")
+        print("\n6. Writing output files...")
+        metrics.start(6, 'write outputs', rows_in=len(output_df))
+        
+        # Divisions per country and level, for the summary sheets and the report below
+        country_pivot = summary.country_pivot(countries_df)
+        
+        export_key = stage_key('export', [enrich_key])
+        # A historical snapshot is written next to the current outputs, not over them
+        stem = OUTPUT_STEM if as_of is None else f"{OUTPUT_STEM}_as_of_{as_of:%Y-%m-%d}"
+        output_files = write_output_formats(
+            output_df, formats, stages, export_key, stem=stem, spatial_order=spatial_order,
+            streaming_excel=streaming_excel, country_pivot=country_pivot
+        )
+        output_file = output_files[0]
+        
+        # The other ranking profiles get their own files, e.g. ..._local.xlsx
+        for profile in profiles[1:]:
+            output_files.extend(write_output_formats(
+                structure_output(enriched[profile.name]), formats, stages, export_key,
+                stem=f"{stem}_{profile.name}",
+                spatial_order=spatial_order, streaming_excel=streaming_excel,
+                country_pivot=summaries[profile.name].country_pivot(countries_df)
+            ))
+        
+        # Parquet copy of the result, read by split_by_country.py instead of the workbook,
+        # and a memory-mapped copy that the lookup tools open without parsing (see
+        # admin_snapshot.py); both hold the current names, so as-of runs leave them alone
+        intermediate_file = snapshot_dir = None
+        if as_of is None:
+            intermediate_file = write_master_intermediate(output_df)
+            snapshot_dir = write_snapshot(output_df)
+        metrics.finish(rows_out=len(output_df))
+        
+        for created_file in output_files:
+            print(f"\n✅ SUCCESS! Created {created_file}")
+        if intermediate_file:
+            print(f"   Intermediate copy for later steps: {intermediate_file}")
+        if snapshot_dir:
+            print(f"   Memory-mapped snapshot for lookups: {snapshot_dir}")
+        if 'xlsx' in formats:
+            print("\nWorkbook contains the following sheets:")
+            print("  📊 All_Admin_Divisions: Complete dataset with coordinates")
+            print("  📍 ADM1_Divisions: First-order divisions (states/provinces)")  
+            print("  📍 ADM2_Divisions: Second-order divisions (counties/districts)")
+            print("  📍 ADM3_Divisions: Third-order divisions (municipalities)")
+            print("  📍 ADM4_Divisions: Fourth-order divisions (local areas)")
+            print("  📍 ADMD_Divisions: General administrative divisions")
+            print("  📈 Country_Summary: Administrative divisions by country and level")
+            print("  🏆 Top_30_Countries: Countries with most administrative divisions")
         
         # Display summary statistics
         print(f"\n📊 SUMMARY STATISTICS:")
         print(f"   Total administrative divisions: {len(output_df):,}")
-        print(f"   Countries represented: {output_df['Country_Code'].nunique()}")
-        print(f"   Administrative levels: {output_df['Administrative_Level'].nunique()}")
+        level_summary = summary.level_counts()
+        level_summary = level_summary[level_summary > 0]
+        print(f"   Countries represented: {summary.country_count(countries_df)}")
+        print(f"   Administrative levels: {len(level_summary)}")
         
         print(f"\n📍 BY ADMINISTRATIVE LEVEL:")
-        level_summary = output_df['Administrative_Level'].value_counts().sort_index()
         for level, count in level_summary.items():
             print(f"   {level}: {count:,} divisions")
         
@@ -265,6 +443,28 @@ def process_gns_administrative_data():
         print(f"   Display filter: Only public-display records included")
         print(f"   See DATA_QUALITY_INFO.md for detailed filtering criteria")
         
+        if incremental or export_country_files:
+            print("\n7. Updating country exports...")
+            metrics.start(7, 'country exports', rows_in=len(output_df))
+            
+            if not incremental or snapshot is None:
+                # Every country file is (re)written, straight from the in-memory result
+                export_countries(output_df, workers=workers)
+            else:
+                report = build_change_report(snapshot.deduplicated, admin_deduplicated)
+                report_file = write_change_report(report)
+                changes = report['summary']
+                print(f"   Added: {changes['added']:,}, removed: {changes['removed']:,}, "
+                      f"renamed: {changes['renamed']:,}, moved: {changes['moved']:,}")
+                print(f"   Change report: {report_file}")
+                
+                # Only the files of countries holding a changed feature are rewritten
+                changed_codes = affected_country_codes(snapshot.deduplicated, admin_deduplicated, changed_ufis)
+                country_names = countries_df.loc[countries_df['Country_Code'].isin(changed_codes), 'Short_Name']
+                print(f"   Countries affected: {len(country_names)}")
+                export_countries(output_df, country_names.unique(), workers=workers)
+        
+        metrics.close()
         return output_file
         
     except FileNotFoundError as e:
@@ -272,11 +472,13 @@ def process_gns_administrative_data():
         print("Make sure the following files exist:")
         print("  - Country_Codes.csv")
         print("  - Administrative_Regions/Administrative_Regions.txt")
+        metrics.close('error')
         return None
     except Exception as e:
         print(f"❌ Error processing data: {e}")
         import traceback
         traceback.print_exc()
+        metrics.close('error')
         return None
 
 def create_coordinate_lookup_tool():
@@ -285,129 +487,13 @@ def create_coordinate_lookup_tool():
     lookup_script = '''#!/usr/bin/env python3
 """
 Quick lookup tool for administrative division coordinates.
-Usage: python3 coordinate_lookup.py [country_code] [admin_level]
+Usage: python3 coordinate_lookup.py [country_code] [admin_level] [--backend auto|memory|sqlite]
+       python3 coordinate_lookup.py serve [--port 8765]
+The data is loaded once and queried through the indexes of admin_lookup.py;
+serve keeps it loaded behind a local HTTP/JSON service (see lookup_server.py).
 """
 
-import pandas as pd
-import sys
-
-def load_admin_data():
-    """Load the processed administrative data."""
-    try:
-        df = pd.read_excel('Complete_Administrative_Divisions_with_Coordinates.xlsx', 
-                          sheet_name='All_Admin_Divisions')
-        return df
-    except FileNotFoundError:
-        print("Error: Complete_Administrative_Divisions_with_Coordinates.xlsx not found")
-        print("Please run the main processing script first.")
-        return None
-
-def search_divisions(df, country_code=None, admin_level=None, name_filter=None):
-    """Search for administrative divisions."""
-    result = df.copy()
-    
-    if country_code:
-        result = result[result['Country_Code'].str.upper() == country_code.upper()]
-    
-    if admin_level:
-        result = result[result['Administrative_Level'].str.upper() == admin_level.upper()]
-    
-    if name_filter:
-        result = result[result['Administrative_Name'].str.contains(name_filter, case=False, na=False)]
-    
-    return result
-
-def main():
-    """Main function for coordinate lookup."""
-    df = load_admin_data()
-    if df is None:
-        sys.exit(1)
-    
-    if len(sys.argv) == 1:
-        # Interactive mode
-        print("Administrative Division Coordinate Lookup")
-        print("=" * 40)
-        print("Available commands:")
-        print("  country <CODE>     - Show all divisions for a country")
-        print("  level <LEVEL>      - Show divisions by level (ADM1, ADM2, etc.)")
-        print("  search <NAME>      - Search divisions by name")
-        print("  stats              - Show statistics")
-        print("  quit               - Exit")
-        print()
-        
-        while True:
-            try:
-                cmd = input("Enter command: ").strip().split()
-                if not cmd:
-                    continue
-                
-                if cmd[0].lower() in ['quit', 'exit', 'q']:
-                    break
-                
-                elif cmd[0].lower() == 'country' and len(cmd) > 1:
-                    results = search_divisions(df, country_code=cmd[1])
-                    if results.empty:
-                        print(f"No divisions found for country code: {cmd[1]}")
-                    else:
-                        print(f"\\nDivisions for {results.iloc[0]['Country_Name']} ({cmd[1].upper()}):")
-                        for _, row in results.iterrows():
-                            print(f"  {row['Administrative_Level']}: {row['Administrative_Name']} "
-                                  f"({row['latitude']:.4f}, {row['longitude']:.4f})")
-                
-                elif cmd[0].lower() == 'level' and len(cmd) > 1:
-                    results = search_divisions(df, admin_level=cmd[1])
-                    if results.empty:
-                        print(f"No divisions found for level: {cmd[1]}")
-                    else:
-                        print(f"\\n{cmd[1].upper()} divisions (showing first 20):")
-                        for _, row in results.head(20).iterrows():
-                            print(f"  {row['Country_Name']}: {row['Administrative_Name']} "
-                                  f"({row['latitude']:.4f}, {row['longitude']:.4f})")
-                
-                elif cmd[0].lower() == 'search' and len(cmd) > 1:
-                    search_term = ' '.join(cmd[1:])
-                    results = search_divisions(df, name_filter=search_term)
-                    if results.empty:
-                        print(f"No divisions found matching: {search_term}")
-                    else:
-                        print(f"\\nDivisions matching '{search_term}' (showing first 20):")
-                        for _, row in results.head(20).iterrows():
-                            print(f"  {row['Country_Name']}: {row['Administrative_Name']} "
-                                  f"({row['Administrative_Level']}) - "
-                                  f"({row['latitude']:.4f}, {row['longitude']:.4f})")
-                
-                elif cmd[0].lower() == 'stats':
-                    print(f"\\nDataset Statistics:")
-                    print(f"  Total divisions: {len(df):,}")
-                    print(f"  Countries: {df['Country_Code'].nunique()}")
-                    print(f"  Administrative levels: {df['Administrative_Level'].nunique()}")
-                    print(f"\\nBy level:")
-                    for level, count in df['Administrative_Level'].value_counts().sort_index().items():
-                        print(f"    {level}: {count:,}")
-                
-                else:
-                    print("Unknown command. Type 'quit' to exit.")
-                    
-            except KeyboardInterrupt:
-                break
-            except Exception as e:
-                print(f"Error: {e}")
-    
-    else:
-        # Command line mode
-        country_code = sys.argv[1] if len(sys.argv) > 1 else None
-        admin_level = sys.argv[2] if len(sys.argv) > 2 else None
-        
-        results = search_divisions(df, country_code, admin_level)
-        
-        if results.empty:
-            print("No matching divisions found")
-        else:
-            print(f"Found {len(results)} divisions:")
-            for _, row in results.iterrows():
-                print(f"{row['Country_Name']}: {row['Administrative_Name']} "
-                      f"({row['Administrative_Level']}) - "
-                      f"Lat: {row['latitude']:.6f}, Lon: {row['longitude']:.6f}")
+from admin_lookup import main
 
 if __name__ == "__main__":
     main()
@@ -455,6 +541,10 @@ Deduplication prioritizes records based on:
    - Local/national languages (medium priority)
    - Other languages (lowest priority)
 
+4. **Ties:** the record with the lowest Unique_Name_ID wins
+
+All output fields of a division come from its single winning name record.
+
 ### 5. Result
 - Each unique administrative division (identified by UFI) appears only once
 - The most official, preferred name is selected for each division
@@ -468,12 +558,100 @@ Deduplication prioritizes records based on:
 - **Language_Code**: Language of the administrative name
 - **Unique_Feature_ID**: Unique identifier for the geographic feature
 - **Unique_Name_ID**: Unique identifier for this specific name variant
+- **Parent_Feature_ID**: Unique_Feature_ID of the containing division one level up (ADM2-ADM4 only)
 '''
     
     with open('DATA_QUALITY_INFO.md', 'w') as f:
         f.write(quality_doc)
 
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(
+        description="Process GNS administrative divisions with coordinates."
+    )
+    parser.add_argument(
+        '--stream', action='store_true',
+        help="parse the GNS file in chunks and filter each chunk as it is read"
+    )
+    parser.add_argument(
+        '--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+        help=f"rows per chunk in streaming mode (default: {DEFAULT_CHUNKSIZE:,})"
+    )
+    parser.add_argument(
+        '--no-cache', dest='use_cache', action='store_false',
+        help="always parse the GNS text file instead of using the columnar cache"
+    )
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help="reuse the previous run's snapshot, update only changed country exports "
+             "and write a change report"
+    )
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help="worker processes for parsing, deduplication and country exports "
+             "(0 = one per CPU core, default: 1)"
+    )
+    parser.add_argument(
+        '--export-countries', action='store_true',
+        help="also write the Country_Exports files from the in-memory result"
+    )
+    parser.add_argument(
+        '--streaming-excel', action='store_true',
+        help="write the workbook in one streaming pass instead of building every sheet in memory"
+    )
+    parser.add_argument(
+        '--format', dest='formats', nargs='+', default=['xlsx'], choices=sorted(EXPORTERS),
+        help="output formats to write (default: xlsx); "
+             + "; ".join(f"{name}: {exporter.description}" for name, exporter in sorted(EXPORTERS.items()))
+    )
+    parser.add_argument(
+        '--spatial-order', action='store_true',
+        help="write the rows of the non-Excel formats in Hilbert curve order"
+    )
+    parser.add_argument(
+        '--no-stage-cache', dest='use_stage_cache', action='store_false',
+        help="recompute every stage instead of reusing the stored stage outputs in .gns_cache/stages/"
+    )
+    parser.add_argument(
+        '--ranking', nargs='+', default=['default'], metavar='PROFILE',
+        help="name ranking profiles, scored in one pass; the first gives the main outputs and "
+             "each other one its own files (built in: " + ", ".join(RANKING_PROFILES) + "; default: default)"
+    )
+    parser.add_argument(
+        '--ranking-file', metavar='JSON',
+        help="JSON file defining more ranking profiles by name_type_priority, "
+             "language_tiers and country_langs (see gns_dedup.py)"
+    )
+    parser.add_argument(
+        '--as-of', type=as_of_date, metavar='DATE',
+        help="keep only names valid on DATE (YYYY-MM-DD or 'today') by their effective and "
+             "termination dates, and write the outputs as a snapshot named after the date"
+    )
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if args.as_of is not None and (args.incremental or args.export_countries):
+        parser.error("--as-of writes a historical snapshot and cannot be combined with "
+                     "--incremental or --export-countries")
+    
+    available = dict(RANKING_PROFILES)
+    if args.ranking_file:
+        available.update(load_profiles(args.ranking_file))
+    unknown = [name for name in args.ranking if name not in available]
+    if unknown:
+        parser.error(f"unknown ranking profile(s): {', '.join(unknown)}")
+    args.profiles = [available[name] for name in dict.fromkeys(args.ranking)]
+    
+    # Formats whose libraries are missing would only fail after the other outputs are written
+    for format_name in args.formats:
+        missing = missing_requirements(format_name)
+        if missing:
+            parser.error(f"--format {format_name} requires {', '.join(missing)} "
+                         f"(pip install {' '.join(missing)})")
+    return args
+
 if __name__ == "__main__":
+    args = parse_args()
+    
     print("🌍 GNS Administrative Data Processor with Coordinates")
     print("=" * 55)
     print("This script will process the complete GNS dataset to extract:")
@@ -483,7 +661,14 @@ if __name__ == "__main__":
     print()
     
     # Process the main administrative data
-    output_file = process_gns_administrative_data()
+    output_file = process_gns_administrative_data(
+        streaming=args.stream, chunksize=args.chunksize, use_cache=args.use_cache,
+        incremental=args.incremental, workers=resolve_workers(args.workers),
+        export_country_files=args.export_countries, streaming_excel=args.streaming_excel,
+        formats=args.formats, spatial_order=args.spatial_order, use_stage_cache=args.use_stage_cache,
+        profiles=args.profiles, as_of=args.as_of,
+        metrics=PipelineMetrics('process_all_administrative_levels', args.metrics_file, args.profile)
+    )
     
     if output_file:
         print(f"\n🎉 Processing complete!")
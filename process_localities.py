@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Script to extract populated places from the GNS Areas_Localities file and
+attach each one to an administrative division.
+The file is far larger than the administrative regions file, so it is never
+loaded whole:
+- the file is parsed in chunks; each chunk is filtered to populated places
+  (PPL designation codes) and spilled to partition files by feature ID
+- each partition holds every name row of its features, so partitions are
+  deduplicated one at a time with the same name ranking as the divisions
+- each locality is linked to the division that contains it by country and
+  first-order code, or else the nearest one (see admin_hierarchy.py)
+- the results are appended to one Parquet file per country
+Memory is bounded by the chunk size and the size of a single partition. Run
+process_all_administrative_levels.py first to produce the divisions.
+"""
+
+import argparse
+import math
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from admin_hierarchy import level_depths, link_to_divisions, placements
+from admin_spatial import chord_to_km
+from gns_cache import PartitionWriter, cache_available
+from gns_dedup import COMMON_LOCAL_LANGS, NAME_TYPE_PRIORITY, deduplicate_names
+from gns_reader import ADMIN_COLUMNS, DEFAULT_CHUNKSIZE, filter_gns_records, iter_gns_blocks
+from gns_schema import apply_schema
+from gns_workbook import ADMIN_LEVELS
+from split_by_country import load_master_data
+
+LOCALITIES_FILE = 'Areas_Localities/Areas_Localities.txt'
+LOCALITY_EXPORT_DIR = Path('Locality_Exports')
+SPILL_DIR = Path('.gns_localities')
+
+# Designation codes of populated places, and the ones that no longer exist
+LOCALITY_PREFIXES = ('PPL',)
+EXCLUDED_DESIGNATIONS = frozenset({'PPLH', 'PPLQ', 'PPLW', 'PPLCH'})
+
+# Bytes of the source file per spill partition; sets the partition count
+PARTITION_SOURCE_BYTES = 512 * 1024 * 1024
+
+OUTPUT_COLUMNS = {
+    'cc_ft': 'Country_Code',
+    'desig_cd': 'Designation',
+    'full_name': 'Locality_Name',
+    'adm1': 'ADM1_Code',
+    'lat_dd': 'latitude',
+    'long_dd': 'longitude',
+    'ufi': 'Unique_Feature_ID',
+    'uni': 'Unique_Name_ID',
+    'nt': 'Name_Type',
+    'name_rank': 'Name_Rank',
+    'lang_cd': 'Language_Code',
+    'transl_cd': 'Transliteration_Code',
+    'script_cd': 'Script_Code'
+}
+
+def partition_count(path):
+    """Return the number of spill partitions for a source file."""
+    return max(1, math.ceil(os.path.getsize(path) / PARTITION_SOURCE_BYTES))
+
+def spill_localities(path, spill, partitions, chunksize, use_cache):
+    """Filter the source file chunk by chunk and spill the kept rows by feature ID.
+    
+    Returns the per-filter row counts summed over the whole file.
+    """
+    counts = {}
+    for block in iter_gns_blocks(path, ADMIN_COLUMNS, chunksize, use_cache):
+        filtered, block_counts = filter_gns_records(block, LOCALITY_PREFIXES)
+        filtered = filtered[~filtered['desig_cd'].isin(EXCLUDED_DESIGNATIONS)]
+        block_counts['current'] = len(filtered)
+        for stage, count in block_counts.items():
+            counts[stage] = counts.get(stage, 0) + count
+        
+        filtered = apply_schema(filtered)
+        partition = filtered['ufi'].to_numpy() % partitions
+        for key in np.unique(partition):
+            spill.write(int(key), filtered[partition == key])
+        print(f"   Read {counts['read']:,} rows, kept {len(filtered):,} of the last chunk")
+    return counts
+
+def load_divisions():
+    """Load the processed administrative divisions that localities are attached to."""
+    divisions = load_master_data()
+    divisions = divisions[divisions['Administrative_Level'].isin(ADMIN_LEVELS)].reset_index(drop=True)
+    return divisions, placements(divisions, 'Country_Code', 'ADM1_Code', 'latitude', 'longitude')
+
+def attach_divisions(localities, divisions, division_placement):
+    """Add the feature ID, level, name and distance of the division each locality belongs to."""
+    # The deepest level is tried first; ADMD divisions are not part of the hierarchy
+    localities = localities.reset_index(drop=True)
+    depth = level_depths(divisions['Administrative_Level'])
+    locality_placement = placements(localities)
+    rows = link_to_divisions(
+        locality_placement, division_placement, depth, range(depth.max(initial=0), 0, -1)
+    )
+    
+    found = rows >= 0
+    matched = divisions.iloc[np.maximum(rows, 0)].reset_index(drop=True)
+    localities['Admin_Feature_ID'] = matched['Unique_Feature_ID'].astype('Int64').where(found)
+    localities['Admin_Level'] = matched['Administrative_Level'].astype(object).where(found)
+    localities['Admin_Name'] = matched['Administrative_Name'].astype(object).where(found)
+    
+    chords = np.linalg.norm(locality_placement.points - division_placement.points[np.maximum(rows, 0)], axis=1)
+    localities['Admin_Distance_km'] = np.where(found, chord_to_km(chords), np.nan)
+    return localities
+
+def process_localities(path=LOCALITIES_FILE, output_dir=LOCALITY_EXPORT_DIR, chunksize=DEFAULT_CHUNKSIZE,
+                       partitions=None, use_cache=True):
+    """Extract, deduplicate and attach the populated places of the GNS localities file.
+    
+    Writes one Parquet file per country code to output_dir and returns the
+    number of localities written, or None if the inputs are missing.
+    """
+    print("Processing GNS Populated Places")
+    print("=" * 55)
+    
+    if not cache_available():
+        print("❌ Error: pyarrow is required to spill and write the localities")
+        return None
+    
+    try:
+        print("1. Reading administrative divisions...")
+        divisions, division_placement = load_divisions()
+        print(f"   Loaded {len(divisions):,} divisions")
+        
+        partitions = partitions or partition_count(path)
+        print(f"\n2. Streaming {path} in chunks of {chunksize:,} rows into {partitions} partitions...")
+        shutil.rmtree(SPILL_DIR, ignore_errors=True)
+        with PartitionWriter(SPILL_DIR) as spill:
+            counts = spill_localities(path, spill, partitions, chunksize, use_cache)
+            spill_files = [spill.path(key) for key in sorted(spill.writers)]
+        
+        print(f"   Populated places: {counts.get('designation', 0):,}")
+        print(f"   After display filter: {counts.get('display', 0):,}")
+        print(f"   After coordinate filter: {counts.get('coordinates', 0):,}")
+        print(f"   Excluding historical, abandoned and destroyed places: {counts.get('current', 0):,}")
+    except FileNotFoundError as e:
+        print(f"❌ Error: Could not find required file - {e}")
+        print("Make sure the following files exist:")
+        print(f"  - {path}")
+        print("  - the processed divisions (run process_all_administrative_levels.py first)")
+        return None
+    
+    print("\n3. Deduplicating and attaching localities partition by partition...")
+    shutil.rmtree(output_dir, ignore_errors=True)
+    total = 0
+    with PartitionWriter(output_dir) as exports:
+        for number, spill_file in enumerate(spill_files, 1):
+            candidates = pd.read_parquet(spill_file)
+            localities = deduplicate_names(
+                candidates,
+                name_type_priority=NAME_TYPE_PRIORITY,
+                local_langs=COMMON_LOCAL_LANGS
+            )
+            localities = attach_divisions(localities, divisions, division_placement)
+            localities = localities.rename(columns=OUTPUT_COLUMNS)[
+                list(OUTPUT_COLUMNS.values()) + ['Admin_Feature_ID', 'Admin_Level', 'Admin_Name', 'Admin_Distance_km']
+            ]
+            
+            for country, country_rows in localities.groupby(
+                localities['Country_Code'].astype(object).fillna('XX'), sort=False
+            ):
+                exports.write(country, country_rows)
+            total += len(localities)
+            print(f"   Partition {number}/{len(spill_files)}: {len(localities):,} localities")
+            spill_file.unlink()
+    
+    shutil.rmtree(SPILL_DIR, ignore_errors=True)
+    print(f"\n✅ SUCCESS! {total:,} localities written to '{output_dir}' (one Parquet file per country code)")
+    return total
+
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(
+        description="Extract GNS populated places and attach them to administrative divisions."
+    )
+    parser.add_argument('--input', default=LOCALITIES_FILE, help=f"GNS localities file (default: {LOCALITIES_FILE})")
+    parser.add_argument(
+        '--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+        help=f"rows parsed per chunk (default: {DEFAULT_CHUNKSIZE:,})"
+    )
+    parser.add_argument(
+        '--partitions', type=int, default=None,
+        help="spill partitions; more partitions use less memory (default: one per 512 MB of input)"
+    )
+    parser.add_argument(
+        '--no-cache', dest='use_cache', action='store_false',
+        help="parse the text file instead of using the columnar cache"
+    )
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    total = process_localities(
+        args.input, chunksize=args.chunksize, partitions=args.partitions, use_cache=args.use_cache
+    )
+    if total is None:
+        sys.exit(1)
@@ -1,22 +1,43 @@
 #!/usr/bin/env python3
 """
 Interactive script to query subdivisions for specific countries.
+The merged country and subdivision data is turned into a prebuilt index
+(country code lookups, name search indexes and the subdivisions of each
+country without the general -000 entries) and pickled under .gns_cache/.
+Later calls load the pickle while both CSV files keep their size and
+modification time, and answer without parsing CSV or importing pandas.
 Usage: python query_subdivisions.py [country_code_or_name]
 """
 
-import pandas as pd
+import os
+import pickle
 import sys
+from pathlib import Path
+
+import numpy as np
+from name_search import NameIndex, best_matches
+
+SOURCE_FILES = ('ADM1_Codes.csv', 'Country_Codes.csv')
+
+# Kept in the GNS cache directory (gns_cache.CACHE_DIR), which is not imported
+# here since it would load pyarrow on every call
+INDEX_FILE = Path('.gns_cache') / 'query_subdivisions.pickle'
+
+# Bump when SubdivisionIndex changes so older pickles are rebuilt
+INDEX_VERSION = 2
 
 def load_data():
     """Load subdivision and country data."""
+    import pandas as pd
+    
     try:
         subdivisions_df = pd.read_csv('ADM1_Codes.csv')
         countries_df = pd.read_csv('Country_Codes.csv')
         
         # Merge the data
         merged_df = subdivisions_df.merge(
-            countries_df[['Country_Code', 'Short_Name', 'Full_Name']], 
-            on='Country_Code', 
+            countries_df[['Country_Code', 'Short_Name', 'Full_Name']],
+            on='Country_Code',
             how='left',
             suffixes=('_Subdivision', '_Country')
         )
@@ -34,58 +55,138 @@ def load_data():
         print(f"Error: Could not find required file - {e}")
         return None
 
-def search_country(df, query):
-    """Search for a country by code or name."""
-    query_upper = query.upper()
+def build_country_name_indexes(df):
+    """Build the name search indexes of the short and full country names (see name_search.py)."""
+    return NameIndex(df['Country_Short_Name']), NameIndex(df['Country_Full_Name'])
+
+def match_country_names(name_indexes, query):
+    """Return the sorted row positions of the countries whose name best matches a query.
     
+    Names match ignoring case and accents, by prefix or substring, or
+    approximately when nothing else matches. Short names are tried before
+    full names, and only the best kind of match is kept, so an exact name
+    wins over names that merely contain it.
+    """
+    for name_index in name_indexes:
+        matches = best_matches(name_index.matches(query))
+        if matches:
+            return np.sort(np.concatenate([name_index.rows_of_name[match.name_id] for match in matches]))
+    return np.empty(0, dtype=np.intp)
+
+def search_country(df, query, name_indexes=None):
+    """Search for a country by code or name (see match_country_names)."""
     # Search by country code
-    country_code_match = df[df['Country_Code'] == query_upper]
+    country_code_match = df[df['Country_Code'] == query.upper()]
     if not country_code_match.empty:
         return country_code_match
     
-    # Search by country name (case insensitive)
-    name_match = df[df['Country_Short_Name'].str.upper().str.contains(query_upper, na=False)]
-    if not name_match.empty:
-        return name_match
+    if name_indexes is None:
+        name_indexes = build_country_name_indexes(df)
+    return df.iloc[match_country_names(name_indexes, query)]
+
+class SubdivisionIndex:
+    """Prebuilt country and subdivision lookups over the merged data.
+    
+    Holds only plain Python values and name indexes, so a pickled copy is
+    queried without pandas.
+    """
+    
+    def __init__(self, df):
+        countries = df.drop_duplicates('Country_Code')
+        self.codes = countries['Country_Code'].tolist()
+        self.short_names = dict(zip(self.codes, countries['Country_Short_Name']))
+        self.name_indexes = build_country_name_indexes(countries)
+        
+        # Subdivisions per country code with their row position, general (-000) entries left out
+        self.subdivisions = {code: [] for code in self.codes}
+        for position, (code, subdivision_code, name) in enumerate(
+            zip(df['Country_Code'], df['Subdivision_Code'], df['Subdivision_Name'])
+        ):
+            if not str(subdivision_code).endswith('-000'):
+                self.subdivisions[code].append((position, subdivision_code, name))
     
-    # Search by full country name
-    full_name_match = df[df['Country_Full_Name'].str.upper().str.contains(query_upper, na=False)]
-    if not full_name_match.empty:
-        return full_name_match
+    def find_countries(self, query):
+        """Return the codes of the countries matching a code or name (see match_country_names)."""
+        code = query.upper()
+        if code in self.short_names:
+            return [code]
+        return [self.codes[position] for position in match_country_names(self.name_indexes, query)]
     
-    return pd.DataFrame()
+    def subdivisions_of(self, codes):
+        """Return (country code, subdivision code, name) of the countries' subdivisions, in file order."""
+        rows = sorted(row + (code,) for code in codes for row in self.subdivisions[code])
+        return [(code, subdivision_code, name) for _, subdivision_code, name, code in rows]
 
-def main():
-    """Main function to handle user queries."""
+def _source_stamp(sources=SOURCE_FILES):
+    """Return the size and modification time of each source file."""
+    return [(source, os.stat(source).st_size, os.stat(source).st_mtime_ns) for source in sources]
+
+def load_subdivision_index(index_file=INDEX_FILE):
+    """Return the subdivision index, from the pickle while the CSV files are unchanged.
+    
+    Otherwise the CSV files are read and merged, and the rebuilt index is
+    saved. Returns None if a CSV file is missing.
+    """
+    try:
+        stamp = _source_stamp()
+    except FileNotFoundError as e:
+        print(f"Error: Could not find required file - {e}")
+        return None
+    
+    try:
+        with open(index_file, 'rb') as f:
+            saved = pickle.load(f)
+        if saved['version'] == INDEX_VERSION and saved['sources'] == stamp:
+            return saved['index']
+    except (OSError, EOFError, KeyError, AttributeError, pickle.UnpicklingError):
+        pass
+    
     df = load_data()
     if df is None:
+        return None
+    index = SubdivisionIndex(df)
+    
+    index_file = Path(index_file)
+    index_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = index_file.with_suffix('.tmp')
+    with open(tmp_file, 'wb') as f:
+        pickle.dump({'version': INDEX_VERSION, 'sources': stamp, 'index': index}, f)
+    os.replace(tmp_file, index_file)
+    return index
+
+def print_subdivisions(index, codes, query, trailer=''):
+    """Print the subdivisions of the matched countries under the first one's name."""
+    subdivisions = index.subdivisions_of(codes)
+    if not subdivisions:
+        print(f"No subdivisions found for '{query}'{trailer}")
+        return
+    
+    country_name = str(index.short_names[subdivisions[0][0]])
+    print(f"\nSubdivisions for {country_name}:")
+    print("=" * (len(country_name) + 17))
+    
+    for _, subdivision_code, name in subdivisions:
+        print(f"  {subdivision_code}: {name}")
+    
+    print(f"\nTotal subdivisions: {len(subdivisions)}{trailer}")
+
+def main():
+    """Main function to handle user queries."""
+    index = load_subdivision_index()
+    if index is None:
         sys.exit(1)
     
     if len(sys.argv) > 1:
         # Command line argument provided
         query = ' '.join(sys.argv[1:])
-        results = search_country(df, query)
+        codes = index.find_countries(query)
         
-        if results.empty:
+        if not codes:
             print(f"No country found matching '{query}'")
             return
         
-        # Filter out general entries
-        specific_subdivisions = results[~results['Subdivision_Code'].str.endswith('-000')]
-        
-        if specific_subdivisions.empty:
-            print(f"No subdivisions found for '{query}'")
-            return
-        
-        country_name = specific_subdivisions.iloc[0]['Country_Short_Name']
-        print(f"\nSubdivisions for {country_name}:")
-        print("=" * (len(country_name) + 17))
-        
-        for _, row in specific_subdivisions.iterrows():
-            print(f"  {row['Subdivision_Code']}: {row['Subdivision_Name']}")
-        
-        print(f"\nTotal subdivisions: {len(specific_subdivisions)}")
-        
+        print_subdivisions(index, codes, query)
+    
     else:
         # Interactive mode
         print("Country Subdivision Query Tool")
@@ -103,36 +204,21 @@ def main():
             if not query:
                 continue
             
-            results = search_country(df, query)
+            codes = index.find_countries(query)
             
-            if results.empty:
+            if not codes:
                 print(f"No country found matching '{query}'. Try a different search term.\n")
                 continue
             
             # Show matching countries if multiple found
-            unique_countries = results[['Country_Code', 'Country_Short_Name']].drop_duplicates()
-            if len(unique_countries) > 1:
+            if len(codes) > 1:
                 print(f"\nMultiple countries found:")
-                for _, country in unique_countries.iterrows():
-                    print(f"  {country['Country_Code']}: {country['Country_Short_Name']}")
+                for code in codes:
+                    print(f"  {code}: {index.short_names[code]}")
                 print("Please be more specific.\n")
                 continue
             
-            # Filter out general entries
-            specific_subdivisions = results[~results['Subdivision_Code'].str.endswith('-000')]
-            
-            if specific_subdivisions.empty:
-                print(f"No subdivisions found for '{query}'\n")
-                continue
-            
-            country_name = specific_subdivisions.iloc[0]['Country_Short_Name']
-            print(f"\nSubdivisions for {country_name}:")
-            print("=" * (len(country_name) + 17))
-            
-            for _, row in specific_subdivisions.iterrows():
-                print(f"  {row['Subdivision_Code']}: {row['Subdivision_Name']}")
-            
-            print(f"\nTotal subdivisions: {len(specific_subdivisions)}\n")
+            print_subdivisions(index, codes, query, trailer='\n')
 
 if __name__ == "__main__":
     main()
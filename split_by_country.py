@@ -1,51 +1,136 @@
 #!/usr/bin/env python3
 """
 Script to split the main administrative data file into separate Excel files for each country.
+The data is partitioned by country in a single pass and the country files are
+written in parallel worker processes. When the processing script has left a
+Parquet copy of its result next to the Excel file, that copy is read instead of
+re-parsing the workbook (or, without pyarrow, its memory-mapped snapshot).
 """
 
+import argparse
+import os
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import sys
+from admin_snapshot import open_snapshot
 
-def split_data_by_country():
-    """Reads the main Excel file and creates a separate file for each country."""
+MASTER_FILE = 'Complete_Administrative_Divisions_with_Coordinates.xlsx'
+MASTER_PARQUET_FILE = 'Complete_Administrative_Divisions_with_Coordinates.parquet'
+COUNTRY_EXPORT_DIR = Path('Country_Exports')
+
+def country_file_path(country, output_dir=COUNTRY_EXPORT_DIR):
+    """Return the export file path for a country name."""
+    # Sanitize the country name to create a valid filename
+    safe_filename = "".join([c for c in country if c.isalpha() or c.isdigit() or c.isspace()]).rstrip()
+    return Path(output_dir) / f"{safe_filename}.xlsx"
+
+def write_master_intermediate(df, output_file=MASTER_PARQUET_FILE):
+    """Save the processed data as Parquet so later steps can skip parsing the workbook.
+    
+    Returns the file written, or None if no Parquet engine is installed.
+    """
+    try:
+        df.to_parquet(output_file, index=False)
+    except ImportError:
+        return None
+    return output_file
+
+def load_master_data(input_file=MASTER_FILE, parquet_file=MASTER_PARQUET_FILE):
+    """Load the processed data, from the Parquet copy or the snapshot if at least as new as the workbook."""
+    excel_path = Path(input_file)
+    parquet_path = Path(parquet_file)
     
-    input_file = 'Complete_Administrative_Divisions_with_Coordinates.xlsx'
-    output_dir = Path('Country_Exports')
+    if parquet_path.exists() and (
+        not excel_path.exists() or parquet_path.stat().st_mtime >= excel_path.stat().st_mtime
+    ):
+        try:
+            print(f"Reading intermediate data file: {parquet_path}")
+            return pd.read_parquet(parquet_path)
+        except ImportError:
+            pass
+    
+    # Without a Parquet engine, the memory-mapped snapshot still avoids parsing the workbook
+    snapshot = open_snapshot(sources=(input_file,))
+    if snapshot is not None:
+        print(f"Reading snapshot: {snapshot.directory}")
+        return snapshot.to_frame()
     
     print(f"Reading main data file: {input_file}")
+    return pd.read_excel(input_file)
+
+def _write_country_file(task):
+    """Write one country's rows to its Excel file."""
+    country_df, output_file = task
+    country_df.to_excel(output_file, index=False, engine='openpyxl')
+    return output_file
+
+def export_countries(df, countries=None, output_dir=COUNTRY_EXPORT_DIR, workers=1):
+    """Write the rows of each country to its own Excel file.
     
-    try:
-        df = pd.read_excel(input_file)
-    except FileNotFoundError:
-        print(f"Error: The file '{input_file}' was not found.")
-        print("Please run the main processing script first to generate it.")
-        sys.exit(1)
-        
-    # Create the output directory if it doesn't exist
+    The rows are partitioned by country in one pass. countries limits the export
+    to the given country names (all countries if None); a given country with no
+    remaining rows has its export file removed. Files are written by `workers`
+    processes.
+    """
+    output_dir = Path(output_dir)
     output_dir.mkdir(exist_ok=True)
     
-    # Get a list of unique countries
-    countries = df['Country_Name'].unique()
-    
-    print(f"Found {len(countries)} countries. Exporting each to a separate file...")
+    partitions = dict(tuple(df.groupby('Country_Name', sort=False, observed=True)))
+    if countries is None:
+        countries = list(partitions)
     
+    tasks = []
     for country in countries:
         if pd.isna(country):
             continue
-            
-        # Sanitize the country name to create a valid filename
-        safe_filename = "".join([c for c in country if c.isalpha() or c.isdigit() or c.isspace()]).rstrip()
-        output_file = output_dir / f"{safe_filename}.xlsx"
-        
-        print(f"  -> Processing: {country}")
         
-        country_df = df[df['Country_Name'] == country]
+        output_file = country_file_path(country, output_dir)
         
-        # Write to a new Excel file
-        country_df.to_excel(output_file, index=False, engine='openpyxl')
+        if country not in partitions:
+            print(f"  -> Removing: {country}")
+            output_file.unlink(missing_ok=True)
+            continue
         
+        tasks.append((country, partitions[country], output_file))
+    
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            written = executor.map(_write_country_file, [(country_df, path) for _, country_df, path in tasks])
+            for (country, _, _), _ in zip(tasks, written):
+                print(f"  -> Processing: {country}")
+    else:
+        for country, country_df, output_file in tasks:
+            print(f"  -> Processing: {country}")
+            _write_country_file((country_df, output_file))
+
+def split_data_by_country(workers=1):
+    """Reads the main data file and creates a separate file for each country."""
+    
+    output_dir = COUNTRY_EXPORT_DIR
+    
+    try:
+        df = load_master_data()
+    except FileNotFoundError:
+        print(f"Error: The file '{MASTER_FILE}' was not found.")
+        print("Please run the main processing script first to generate it.")
+        sys.exit(1)
+    
+    # Get a list of unique countries
+    countries = df['Country_Name'].dropna().unique()
+    
+    print(f"Found {len(countries)} countries. Exporting each to a separate file...")
+    
+    export_countries(df, countries, output_dir, workers=workers)
+    
     print(f"\nSuccess! All country files have been exported to the '{output_dir}' directory.")
 
 if __name__ == "__main__":
-    split_data_by_country()
+    parser = argparse.ArgumentParser(description="Split the processed data into one Excel file per country.")
+    parser.add_argument(
+        '--workers', type=int, default=os.cpu_count() or 1,
+        help="worker processes writing country files (default: one per CPU core)"
+    )
+    args = parser.parse_args()
+    
+    split_data_by_country(workers=max(1, args.workers))
@@ -0,0 +1,85 @@
+"""Parent links of assign_parents and the CSR parent/child arrays of AdminHierarchy."""
+
+import numpy as np
+import pandas as pd
+
+import admin_hierarchy
+from admin_hierarchy import AdminHierarchy, assign_parents
+
+DIVISIONS = [
+    # (ufi, desig_cd, cc_ft, adm1, lat_dd, long_dd)
+    (10, 'ADM1', 'FR', '53', 48.2, -2.9),
+    (11, 'ADM1', 'FR', '52', 47.5, -0.5),
+    (20, 'ADM2', 'FR', '53', 48.3, -4.0),
+    (21, 'ADM2', 'FR', '53', 47.8, -2.8),
+    # Nearer to the ADM1 of region 52, but linked within its own region
+    (22, 'ADM2', 'FR', '53', 47.6, -0.6),
+    (30, 'ADM3', 'FR', '53', 48.4, -4.5),
+    # An unknown region: the nearest ADM2 of the country
+    (31, 'ADM3', 'FR', '00', 47.6, -0.7),
+    # Region 52 has no ADM2, so the ADM3 links to its ADM1
+    (32, 'ADM3', 'FR', '52', 47.4, -0.4),
+    (40, 'ADM4', 'FR', '53', 48.41, -4.49),
+    # A country without divisions above, and a level outside the hierarchy
+    (50, 'ADM2', 'DE', '02', 48.1, 11.6),
+    (60, 'ADMD', 'FR', '53', 48.0, -3.0)
+]
+
+def _divisions():
+    return pd.DataFrame(DIVISIONS, columns=['ufi', 'desig_cd', 'cc_ft', 'adm1', 'lat_dd', 'long_dd'])
+
+def test_parents_are_nearest_in_region_then_level_then_country():
+    divisions = _divisions()
+    parents = assign_parents(divisions)
+    assert str(parents.dtype) == 'Int64'
+    assert dict(zip(divisions['ufi'], parents.astype(object).where(parents.notna(), None))) == {
+        10: None, 11: None, 20: 10, 21: 10, 22: 10, 30: 20, 31: 22, 32: 11, 40: 30, 50: None, 60: None
+    }
+
+def test_tree_and_dot_product_searches_agree(monkeypatch):
+    rng = np.random.default_rng(0)
+    count = admin_hierarchy.KDTREE_MIN_CANDIDATES * 3
+    regions = pd.DataFrame({
+        'ufi': np.arange(count), 'desig_cd': 'ADM1', 'cc_ft': 'BR', 'adm1': '00',
+        'lat_dd': rng.uniform(-30, 0, count), 'long_dd': rng.uniform(-70, -40, count)
+    })
+    # Two regions share a location, and the first of them is the parent
+    regions.loc[1, ['lat_dd', 'long_dd']] = regions.loc[0, ['lat_dd', 'long_dd']].to_numpy()
+    districts = pd.DataFrame({
+        'ufi': np.arange(count, count + 500), 'desig_cd': 'ADM2', 'cc_ft': 'BR', 'adm1': '00',
+        'lat_dd': rng.uniform(-30, 0, 500), 'long_dd': rng.uniform(-70, -40, 500)
+    })
+    districts.loc[0, ['lat_dd', 'long_dd']] = regions.loc[0, ['lat_dd', 'long_dd']].to_numpy()
+    divisions = pd.concat([regions, districts], ignore_index=True)
+    
+    by_tree = assign_parents(divisions)
+    monkeypatch.setattr(admin_hierarchy, 'cKDTree', None)
+    by_dot_products = assign_parents(divisions)
+    pd.testing.assert_series_equal(by_tree, by_dot_products)
+    assert by_tree.iloc[count] == 0
+    assert by_tree.iloc[count:].notna().all()
+
+def test_csr_children_and_ancestors():
+    divisions = _divisions()
+    hierarchy = AdminHierarchy(divisions['ufi'], assign_parents(divisions))
+    assert hierarchy.parent.tolist() == [-1, -1, 0, 0, 0, 2, 4, 1, 5, -1, -1]
+    # Children grouped by parent row, in row order within a parent
+    assert hierarchy.child_offsets.tolist() == [0, 3, 4, 5, 5, 6, 7, 7, 7, 7, 7, 7]
+    assert hierarchy.child_rows.tolist() == [2, 3, 4, 7, 5, 6, 8]
+    assert hierarchy.children(0).tolist() == [2, 3, 4]
+    assert hierarchy.children(10).tolist() == []
+    
+    assert hierarchy.ancestors(8).tolist() == [5, 2, 0]
+    assert hierarchy.ancestors(0).tolist() == []
+    # Level by level
+    assert hierarchy.descendants(0).tolist() == [2, 3, 4, 5, 6, 8]
+    assert hierarchy.descendants(9).tolist() == []
+
+def test_parents_outside_the_table_are_unlinked():
+    hierarchy = AdminHierarchy.from_frame(pd.DataFrame({
+        'Unique_Feature_ID': [1, 2, 3],
+        'Parent_Feature_ID': pd.array([None, 99, 1], dtype='Int64')
+    }))
+    assert hierarchy.parent.tolist() == [-1, -1, 0]
+    assert hierarchy.children(0).tolist() == [2]
+    assert hierarchy.ancestors(1).tolist() == []
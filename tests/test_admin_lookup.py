@@ -0,0 +1,93 @@
+"""Queries of the lookup, on a DataFrame and on a memory-mapped snapshot, and its interactive commands."""
+
+import builtins
+
+import pandas as pd
+import pytest
+
+from admin_lookup import AdminLookup, interactive
+from admin_snapshot import Snapshot, write_snapshot
+
+def _divisions():
+    return pd.DataFrame({
+        'Country_Code': ['FR', 'FR', 'JP'],
+        'Country_Name': ['France', 'France', 'Japan'],
+        'Country_Full_Name': ['French Republic', 'French Republic', 'Japan'],
+        'Administrative_Level': ['ADM1', 'ADM2', 'ADM1'],
+        'Administrative_Name': ['Bretagne', 'Finistere', 'Tokyo'],
+        'ADM1_Code': ['53', '53', '40'],
+        'latitude': [48.2, 48.3, 35.7],
+        'longitude': [-2.9, -4.0, 139.7],
+        'Unique_Feature_ID': pd.array([1, 2, 3], dtype='Int64'),
+        'Unique_Name_ID': pd.array([11, 12, 13], dtype='Int64'),
+        'Parent_Feature_ID': pd.array([None, 1, None], dtype='Int64'),
+        'Name_Type': ['N', 'N', 'N'],
+        'Name_Rank': [1.0, 1.0, 1.0],
+        'Language_Code': ['fra', 'fra', 'jpn'],
+        'Transliteration_Code': [None, None, None],
+        'Script_Code': ['latn', 'latn', 'latn'],
+        'Generic_Term': [None, None, None]
+    })
+
+def _with_communes():
+    """The divisions plus two ADM3 divisions below Finistere, one sharing a name with an ADM1."""
+    df = _divisions()
+    communes = df.iloc[[1, 1]].assign(
+        Administrative_Level='ADM3', Administrative_Name=['Brest', 'Tokyo'],
+        Unique_Feature_ID=pd.array([4, 5], dtype='Int64'), Parent_Feature_ID=pd.array([2, 2], dtype='Int64')
+    )
+    return pd.concat([df, communes], ignore_index=True)
+
+@pytest.fixture(params=['memory', 'snapshot'])
+def lookup(request, tmp_path):
+    if request.param == 'memory':
+        return AdminLookup(_with_communes())
+    return AdminLookup.from_snapshot(Snapshot(write_snapshot(_with_communes(), tmp_path / 'divisions.snapshot')))
+
+def _ids(results):
+    return [int(feature_id) for feature_id in results['Unique_Feature_ID']]
+
+def test_search_combines_country_level_and_name(lookup):
+    assert _ids(lookup.search()) == [1, 2, 3, 4, 5]
+    # Codes and levels ignore case, and all given criteria must match
+    assert _ids(lookup.search(country_code='fr')) == [1, 2, 4, 5]
+    assert _ids(lookup.search(admin_level='adm1')) == [1, 3]
+    assert _ids(lookup.search(country_code='FR', admin_level='ADM3')) == [4, 5]
+    assert _ids(lookup.search(country_code='JP', admin_level='ADM3')) == []
+    assert _ids(lookup.search(country_code='XX')) == []
+    
+    # Names are matched ignoring case and accents, best matches first
+    assert _ids(lookup.search(name_filter='FINISTÈRE')) == [2]
+    assert _ids(lookup.search(name_filter='tokyo')) == [3, 5]
+    assert _ids(lookup.search(country_code='FR', name_filter='tokyo')) == [5]
+    assert _ids(lookup.search(admin_level='ADM1', name_filter='bret')) == [1]
+    assert _ids(lookup.search(name_filter='nowhere')) == []
+
+def test_feature_by_id(lookup):
+    assert lookup.feature(4)['Administrative_Name'] == 'Brest'
+    assert lookup.feature(3)['Country_Name'] == 'Japan'
+    assert lookup.feature(99) is None
+
+def test_ancestors_and_descendants(lookup):
+    # Nearest first, up to the ADM1
+    assert _ids(lookup.ancestors(4)) == [2, 1]
+    assert _ids(lookup.ancestors(1)) == []
+    assert _ids(lookup.ancestors(99)) == []
+    assert _ids(lookup.descendants(1)) == [2, 4, 5]
+    assert _ids(lookup.descendants(1, admin_level='adm3')) == [4, 5]
+    assert _ids(lookup.descendants(3)) == []
+    assert _ids(lookup.descendants(99)) == []
+
+def test_stats_on_snapshot_lookup(tmp_path, monkeypatch, capsys):
+    directory = write_snapshot(_divisions(), tmp_path / 'divisions.snapshot')
+    lookup = AdminLookup.from_snapshot(Snapshot(directory))
+    assert lookup.country_count() == 2
+    
+    commands = iter(['stats', 'quit'])
+    monkeypatch.setattr(builtins, 'input', lambda prompt='': next(commands))
+    interactive(lookup)
+    
+    output = capsys.readouterr().out
+    assert 'Error' not in output
+    assert 'Total divisions: 3' in output
+    assert 'Countries: 2' in output
@@ -0,0 +1,67 @@
+"""open_snapshot only opens a snapshot that is current with its source files."""
+
+import json
+import os
+
+import pandas as pd
+
+from admin_snapshot import Snapshot, open_snapshot, write_snapshot
+
+def _divisions():
+    return pd.DataFrame({
+        'Country_Code': ['FR', 'FR', 'JP'],
+        'Country_Name': ['France', 'France', 'Japan'],
+        'Administrative_Level': ['ADM1', 'ADM2', 'ADM1'],
+        'Administrative_Name': ['Bretagne', 'Finistère', 'Tokyo'],
+        'latitude': [48.2, 48.3, 35.7],
+        'longitude': [-2.9, -4.0, 139.7],
+        'Unique_Feature_ID': pd.array([1, 2, 3], dtype='Int64'),
+        'Parent_Feature_ID': pd.array([None, 1, None], dtype='Int64')
+    })
+
+def _touch(path, mtime_ns):
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+def test_snapshot_is_opened_until_a_source_is_newer(tmp_path):
+    directory = write_snapshot(_divisions(), tmp_path / 'divisions.snapshot')
+    manifest = tmp_path / 'divisions.snapshot' / 'manifest.json'
+    written = manifest.stat().st_mtime_ns
+    source = tmp_path / 'Administrative_Divisions.xlsx'
+    source.write_bytes(b'')
+    
+    # Older and equally old sources, and sources that do not exist, leave the snapshot current
+    _touch(source, written - 10**9)
+    assert isinstance(open_snapshot(directory, sources=(source, tmp_path / 'missing.parquet')), Snapshot)
+    _touch(source, written)
+    assert open_snapshot(directory, sources=(source,)) is not None
+    assert open_snapshot(directory) is not None
+    
+    _touch(source, written + 10**9)
+    assert open_snapshot(directory, sources=(source,)) is None
+    assert open_snapshot(directory, sources=(tmp_path / 'missing.parquet', source)) is None
+    
+    # A snapshot written after the source is current again
+    _touch(manifest, written + 2 * 10**9)
+    snapshot = open_snapshot(directory, sources=(source,))
+    assert snapshot is not None and len(snapshot) == len(_divisions())
+
+def test_missing_or_incompatible_snapshot_is_not_opened(tmp_path):
+    assert open_snapshot(tmp_path / 'divisions.snapshot') is None
+    
+    directory = write_snapshot(_divisions(), tmp_path / 'divisions.snapshot')
+    manifest = directory / 'manifest.json'
+    contents = json.loads(manifest.read_text())
+    manifest.write_text(json.dumps({**contents, 'version': contents['version'] + 1}))
+    assert open_snapshot(directory) is None
+    
+    manifest.write_text('{')
+    assert open_snapshot(directory) is None
+
+def test_snapshot_reads_back_the_frame(tmp_path):
+    df = _divisions()
+    snapshot = open_snapshot(write_snapshot(df, tmp_path / 'divisions.snapshot'))
+    restored = snapshot.to_frame()
+    assert list(restored.columns) == list(df.columns)
+    assert restored['Administrative_Name'].tolist() == df['Administrative_Name'].tolist()
+    assert restored['Unique_Feature_ID'].tolist() == [1, 2, 3]
+    assert restored['Parent_Feature_ID'].isna().tolist() == [True, False, True]
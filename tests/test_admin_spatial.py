@@ -0,0 +1,88 @@
+"""Nearest and radius queries of the spatial index across the antimeridian and near the poles."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('scipy')
+
+from admin_lookup import AdminLookup
+from admin_spatial import EARTH_RADIUS_KM, SpatialIndex
+
+DIVISIONS = [
+    # (Unique_Feature_ID, Country_Code, Administrative_Level, latitude, longitude)
+    (1, 'FJ', 'ADM1', -17.0, 179.9),
+    (2, 'FJ', 'ADM2', -17.0, -179.9),
+    (3, 'US', 'ADM1', 52.0, -179.5),
+    (4, 'RU', 'ADM1', 66.0, 179.0),
+    (5, 'NO', 'ADM1', 89.9, 0.0),
+    (6, 'NO', 'ADM2', 89.9, 180.0),
+    (7, 'AQ', 'ADM1', -89.9, 90.0),
+    (8, 'FR', 'ADM1', 48.2, -2.9)
+]
+
+@pytest.fixture(scope='module')
+def spatial():
+    df = pd.DataFrame(
+        DIVISIONS, columns=['Unique_Feature_ID', 'Country_Code', 'Administrative_Level', 'latitude', 'longitude']
+    )
+    df['Country_Name'] = df['Country_Code']
+    df['Administrative_Name'] = 'Division ' + df['Unique_Feature_ID'].astype(str)
+    return SpatialIndex(AdminLookup(df))
+
+def _haversine_km(latitude, longitude, other_latitude, other_longitude):
+    lat, lon, other_lat, other_lon = np.radians([latitude, longitude, other_latitude, other_longitude])
+    a = np.sin((other_lat - lat) / 2) ** 2 + np.cos(lat) * np.cos(other_lat) * np.sin((other_lon - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+def test_nearest_crosses_the_antimeridian(spatial):
+    # The second match is 0.3 degrees of longitude away across the antimeridian, not 359.7
+    matches = spatial.nearest(-17.0, -179.8, k=2)
+    assert matches['Unique_Feature_ID'].tolist() == [2, 1]
+    assert matches['distance_km'].tolist() == pytest.approx([
+        _haversine_km(-17.0, -179.8, -17.0, -179.9), _haversine_km(-17.0, -179.8, -17.0, 179.9)
+    ])
+    assert matches['distance_km'].iloc[1] < 40
+    
+    # Both ends of the longitude range are the same meridian
+    east, west = spatial.nearest([52.0, 52.0], [180.0, -180.0])['distance_km']
+    assert east == pytest.approx(west)
+    assert spatial.nearest(66.0, -180.0)['Unique_Feature_ID'].tolist() == [4]
+
+def test_within_crosses_the_antimeridian(spatial):
+    matches = spatial.within(-17.0, 180.0, 20)
+    assert sorted(matches['Unique_Feature_ID']) == [1, 2]
+    assert (matches['distance_km'] < 20).all()
+    # Nearest first, and the filters apply across the antimeridian too
+    matches = spatial.within(-17.0, -179.95, 20)
+    assert matches['Unique_Feature_ID'].tolist() == [2, 1]
+    assert spatial.within(-17.0, 179.95, 20, admin_level='ADM2')['Unique_Feature_ID'].tolist() == [2]
+
+def test_every_longitude_meets_at_the_poles(spatial):
+    # At the pole the divisions 0.1 degrees away are equally near, whatever their longitude
+    for longitude in (-180.0, -45.0, 0.0, 90.0, 180.0):
+        matches = spatial.nearest(90.0, longitude, k=2)
+        assert sorted(matches['Unique_Feature_ID']) == [5, 6]
+        assert matches['distance_km'].tolist() == pytest.approx([_haversine_km(90, 0, 89.9, 0)] * 2)
+    # Across the pole, from one side of the globe to the other
+    assert spatial.nearest(89.95, 180.0)['Unique_Feature_ID'].tolist() == [6]
+    matches = spatial.within(89.95, 180.0, 20)
+    assert matches['Unique_Feature_ID'].tolist() == [6, 5]
+    assert matches['distance_km'].iloc[1] == pytest.approx(_haversine_km(89.95, 180, 89.9, 0))
+    
+    matches = spatial.nearest(-90.0, -180.0)
+    assert matches['Unique_Feature_ID'].tolist() == [7]
+    assert matches['distance_km'].iloc[0] == pytest.approx(_haversine_km(-90, 0, -89.9, 0))
+
+def test_one_row_per_point_and_match(spatial):
+    matches = spatial.nearest([48.0, 91.0, -17.0], [-3.0, 0.0, 179.9], country_code='fj', k=2)
+    # The invalid point has no matches, and the others keep their input position
+    assert matches['point'].tolist() == [0, 0, 2, 2]
+    assert matches['Unique_Feature_ID'].tolist() == [2, 1, 1, 2]
+    
+    rows, distances = spatial.nearest_positions([0.0, np.nan], [0.0, 0.0], country_code='FR', k=2)
+    assert rows.tolist() == [[7, -1], [-1, -1]]
+    assert np.isinf(distances[0, 1]) and np.isinf(distances[1]).all()
+    
+    assert spatial.within([0.0, 0.0], [181.0, 0.0], 20_000)['point'].unique().tolist() == [1]
+    assert spatial.nearest(0.0, 0.0, country_code='XX').empty
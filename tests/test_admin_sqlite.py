@@ -0,0 +1,98 @@
+"""The SQLite backend answers every query like the in-memory lookup."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from admin_lookup import AdminLookup
+from admin_sqlite import SqliteLookup, write_sqlite
+
+COUNTRIES = [('FR', 'France'), ('DE', 'Germany'), ('BR', 'Brazil')]
+LEVELS = ['ADM1', 'ADM2', 'ADM3']
+
+# Repeated, accented and near-miss names, so every search tier has several hits
+NAMES = [
+    'Nalinya', 'Nalin', 'Nalinyo', 'Naline', 'Malin', 'San Jose', 'São José', 'San José do Norte',
+    'Santa Ana', 'Ana', 'Anna', 'Annaberg', 'Saint-Denis', 'Saint Denis', 'Sankt Anna', 'Bretagne',
+    'Bretagne', 'Finistère', 'Finistere', 'Nord', 'Norden', 'Nordhausen', 'Ab', 'Aba', None
+]
+
+def _divisions(rows=400, seed=0):
+    rng = np.random.default_rng(seed)
+    countries = rng.integers(len(COUNTRIES), size=rows)
+    return pd.DataFrame({
+        'Country_Code': [COUNTRIES[i][0] for i in countries],
+        'Country_Name': [COUNTRIES[i][1] for i in countries],
+        'Country_Full_Name': [COUNTRIES[i][1] for i in countries],
+        'Administrative_Level': rng.choice(LEVELS, size=rows),
+        'Administrative_Name': [NAMES[i] for i in rng.integers(len(NAMES), size=rows)],
+        'ADM1_Code': rng.choice(['01', '02', '03'], size=rows),
+        'latitude': rng.uniform(-60, 70, size=rows),
+        'longitude': rng.uniform(-180, 180, size=rows),
+        'Unique_Feature_ID': pd.array(np.arange(1, rows + 1), dtype='Int64'),
+        'Unique_Name_ID': pd.array(np.arange(1001, rows + 1001), dtype='Int64'),
+        'Parent_Feature_ID': pd.array([None] * rows, dtype='Int64'),
+        'Name_Type': 'N',
+        'Name_Rank': 1.0,
+        'Language_Code': 'eng',
+        'Transliteration_Code': None,
+        'Script_Code': 'latn',
+        'Generic_Term': None
+    })
+
+@pytest.fixture(scope='module')
+def backends(tmp_path_factory):
+    df = _divisions()
+    path = write_sqlite(df, tmp_path_factory.mktemp('sqlite') / 'divisions.sqlite')
+    return AdminLookup(df), SqliteLookup(path)
+
+@pytest.mark.parametrize('name_filter', [
+    'nalin', 'Nalinya', 'san jose', 'SAO JOSE', 'ana', 'saint denis', 'nord', 'finistere', 'na', 'a', 'ab', 'xyz'
+])
+@pytest.mark.parametrize('country_code, admin_level', [(None, None), ('fr', None), (None, 'adm2'), ('BR', 'ADM3')])
+def test_search_matches_memory(backends, name_filter, country_code, admin_level):
+    memory, sqlite = backends
+    expected = memory.search(country_code, admin_level, name_filter)
+    pd.testing.assert_frame_equal(sqlite.search(country_code, admin_level, name_filter), expected)
+
+@pytest.mark.parametrize('country_code, admin_level', [(None, None), ('DE', None), (None, 'ADM1'), ('FR', 'ADM2')])
+def test_country_and_level_match_memory(backends, country_code, admin_level):
+    memory, sqlite = backends
+    pd.testing.assert_frame_equal(sqlite.search(country_code, admin_level), memory.search(country_code, admin_level))
+
+def test_counts_match_memory(backends):
+    memory, sqlite = backends
+    pd.testing.assert_series_equal(sqlite.level_counts(), memory.level_counts(), check_names=False)
+    assert sqlite.country_count() == memory.country_count()
+
+# The last three points are invalid and match nothing
+POINTS = ([48.8, -33.9, 0.0, 89.9, 10.0, 95.0, np.nan, 10.0], [2.3, 151.2, 179.9, 0.0, -179.9, 10.0, 0.0, 200.0])
+
+def _same_matches(actual, expected):
+    pd.testing.assert_frame_equal(
+        actual.reset_index(drop=True), expected.reset_index(drop=True), check_dtype=False, rtol=1e-9
+    )
+
+@pytest.mark.parametrize('admin_level, country_code', [(None, None), ('ADM2', None), (None, 'BR')])
+def test_nearest_matches_memory(backends, admin_level, country_code):
+    memory, sqlite = backends
+    for k in (1, 3):
+        _same_matches(
+            sqlite.spatial_index().nearest(*POINTS, admin_level, country_code, k=k),
+            memory.spatial_index().nearest(*POINTS, admin_level, country_code, k=k)
+        )
+
+@pytest.mark.parametrize('admin_level, country_code', [(None, None), ('ADM3', None), (None, 'FR')])
+def test_within_matches_memory(backends, admin_level, country_code):
+    memory, sqlite = backends
+    _same_matches(
+        sqlite.spatial_index().within(*POINTS, 1500, admin_level, country_code),
+        memory.spatial_index().within(*POINTS, 1500, admin_level, country_code)
+    )
+
+def test_invalid_points_match_nothing(backends):
+    memory, _ = backends
+    rows, distances = memory.spatial_index().nearest_positions(*POINTS, k=2)
+    assert (rows[5:] == -1).all() and np.isinf(distances[5:]).all()
+    assert (rows[:5] >= 0).all()
+    assert memory.spatial_index().within(*POINTS, 20000)['point'].max() == 4
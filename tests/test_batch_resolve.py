@@ -0,0 +1,90 @@
+"""Hash join, fuzzy fallback, method counts and result columns of batch name resolution."""
+
+import pandas as pd
+import pytest
+
+from admin_lookup import AdminLookup
+from batch_resolve import RESULT_COLUMNS, BatchResolver, resolve_file
+
+def _divisions():
+    return pd.DataFrame({
+        'Unique_Feature_ID': pd.array([1, 2, 3, 4, 5], dtype='Int64'),
+        'Country_Code': ['FR', 'FR', 'FR', 'BR', 'BR'],
+        'Country_Name': ['France', 'France', 'France', 'Brazil', 'Brazil'],
+        'Administrative_Level': ['ADM1', 'ADM2', 'ADM2', 'ADM1', 'ADM2'],
+        'Administrative_Name': ['Bretagne', 'Finistère', 'Bretagne', 'São Paulo', 'São Paulo'],
+        'latitude': [48.2, 48.3, 48.1, -22.0, -23.5],
+        'longitude': [-2.9, -4.0, -3.0, -49.0, -46.6]
+    })
+
+@pytest.fixture
+def resolver():
+    return BatchResolver(AdminLookup(_divisions()))
+
+def test_hash_join_matches_keys_by_country_and_level(resolver, monkeypatch):
+    # Joined rows never reach the fuzzy index
+    monkeypatch.setattr(resolver, '_cached_fuzzy', lambda *key: pytest.fail(f'fuzzy lookup of {key}'))
+    results = resolver.resolve(
+        ['fr', 'France', 'BR', 'br', 'FR'],
+        ['FINISTERE', 'bretagne', 'sao paulo', 'Sao-Paulo', 'Bretagne'],
+        ['', '', '', 'ADM2', 'adm2']
+    )
+    assert list(results.columns) == RESULT_COLUMNS
+    assert results['Unique_Feature_ID'].tolist() == [2, 1, 4, 5, 3]
+    assert results['Match_Method'].tolist() == ['exact'] * 5
+    # A key shared by two divisions resolves to the highest level, at half the confidence
+    assert results['Match_Candidates'].tolist() == [1, 2, 2, 1, 1]
+    assert results['Match_Confidence'].tolist() == [1.0, 0.5, 0.5, 1.0, 1.0]
+    assert results['latitude'].tolist() == [48.3, 48.2, -22.0, -23.5, 48.1]
+
+def test_only_misses_fall_back_to_the_fuzzy_index(resolver, monkeypatch):
+    looked_up = []
+    fuzzy = resolver._cached_fuzzy
+    def record(*key):
+        looked_up.append(key)
+        return fuzzy(*key)
+    monkeypatch.setattr(resolver, '_cached_fuzzy', record)
+    
+    results = resolver.resolve(
+        ['FR', 'FR', 'FR', 'FR', 'XX', 'BR'],
+        ['Finistère', 'Finist', 'Finisterre', 'Nowhere at all', 'Bretagne', 'Sao Paulo'],
+        ['', '', '', '', '', 'ADM3']
+    )
+    # Neither the joined row nor the row of an unknown country is looked up
+    assert looked_up == [
+        ('FR', '', 'finist'), ('FR', '', 'finisterre'), ('FR', '', 'nowhere at all'), ('BR', 'ADM3', 'sao paulo')
+    ]
+    assert results['Match_Method'].tolist() == ['exact', 'prefix', 'fuzzy', 'unmatched', 'unmatched', 'unmatched']
+    assert results['Unique_Feature_ID'].tolist()[:3] == [2, 2, 2]
+    assert results['Unique_Feature_ID'].iloc[3:].isna().all()
+    assert results['Match_Confidence'].iloc[1] == 0.9
+    assert 0 < results['Match_Confidence'].iloc[2] < 0.8
+    assert results['latitude'].iloc[3:].isna().all()
+
+def test_file_is_resolved_in_chunks_with_method_counts(resolver, tmp_path):
+    input_file = tmp_path / 'addresses.csv'
+    pd.DataFrame({
+        'country': ['FR', 'France', 'BR', 'FR', 'FR'],
+        'region': ['Finistère', 'Finisterre', 'São Paulo', 'Nowhere at all', 'Bretagn']
+    }).to_csv(input_file, index=False)
+    output_file = tmp_path / 'resolved.csv'
+    
+    counts = resolve_file(resolver, input_file, output_file, 'country', 'region', chunksize=2)
+    assert counts == {'exact': 2, 'fuzzy': 1, 'unmatched': 1, 'prefix': 1}
+    output = pd.read_csv(output_file)
+    assert list(output.columns) == ['country', 'region'] + RESULT_COLUMNS
+    assert output['Match_Method'].tolist() == ['exact', 'fuzzy', 'exact', 'unmatched', 'prefix']
+
+def test_result_columns_clashing_with_the_input_need_a_prefix(resolver, tmp_path):
+    input_file = tmp_path / 'points.csv'
+    pd.DataFrame({'country': ['FR'], 'region': ['Bretagne'], 'latitude': ['48.0']}).to_csv(input_file, index=False)
+    output_file = tmp_path / 'resolved.csv'
+    
+    with pytest.raises(ValueError, match='latitude'):
+        resolve_file(resolver, input_file, output_file, 'country', 'region')
+    assert not output_file.exists()
+    
+    resolve_file(resolver, input_file, output_file, 'country', 'region', result_prefix='Resolved_')
+    output = pd.read_csv(output_file)
+    assert list(output.columns) == ['country', 'region', 'latitude'] + [f'Resolved_{c}' for c in RESULT_COLUMNS]
+    assert output[['latitude', 'Resolved_latitude']].values.tolist() == [[48.0, 48.2]]
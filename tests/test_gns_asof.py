@@ -0,0 +1,97 @@
+"""Validity intervals of name rows and the as-of mode of the processor."""
+
+import pandas as pd
+import pytest
+
+import process_all_administrative_levels
+from gns_asof import NameValidityIndex
+from gns_dedup import RANKING_PROFILES, deduplicate_names, resolve_profiles
+from gns_synthetic import generate_dataset
+
+COLUMNS = ['ufi', 'uni', 'nt', 'name_rank', 'lang_cd', 'cc_ft', 'full_name', 'efctv_dt', 'term_dt_n', 'term_dt_f']
+
+def _index(rows):
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    df['name_rank'] = df['name_rank'].astype('float32')
+    return NameValidityIndex(df)
+
+def _valid_unis(index, date):
+    return index.candidates_at(date)['uni'].tolist()
+
+def test_interval_includes_its_start_and_excludes_its_end():
+    index = _index([(1, 11, 'N', 1, 'eng', 'FR', 'Old', '2000-01-01', '2010-01-01', '')])
+    assert _valid_unis(index, '1999-12-31') == []
+    assert _valid_unis(index, '2000-01-01') == [11]
+    assert _valid_unis(index, '2009-12-31') == [11]
+    assert _valid_unis(index, '2010-01-01') == []
+
+def test_missing_dates_leave_the_interval_open():
+    index = _index([
+        (1, 11, 'N', 1, 'eng', 'FR', 'Always', '', '', ''),
+        (2, 21, 'N', 1, 'eng', 'FR', 'Until', '', '2000-01-01', ''),
+        (3, 31, 'N', 1, 'eng', 'FR', 'Since', '2000-01-01', '', '')
+    ])
+    assert _valid_unis(index, '1800-01-01') == [11, 21]
+    assert _valid_unis(index, '2200-01-01') == [11, 31]
+    assert list(index.change_dates()) == [pd.Timestamp('2000-01-01')]
+
+def test_earlier_of_name_and_feature_termination_ends_the_interval():
+    index = _index([
+        (1, 11, 'N', 1, 'eng', 'FR', 'Name ends first', '', '2005-01-01', '2008-01-01'),
+        (2, 21, 'N', 1, 'eng', 'FR', 'Feature ends first', '', '2008-01-01', '2005-01-01'),
+        (3, 31, 'N', 1, 'eng', 'FR', 'Feature ends', '', '', '2005-01-01')
+    ])
+    assert _valid_unis(index, '2004-12-31') == [11, 21, 31]
+    assert _valid_unis(index, '2005-01-01') == []
+
+def test_termination_before_effective_date_is_never_valid():
+    index = _index([(1, 11, 'N', 1, 'eng', 'FR', 'Never', '2010-01-01', '2000-01-01', '')])
+    for date in ('1999-01-01', '2000-01-01', '2005-01-01', '2010-01-01', '2020-01-01'):
+        assert _valid_unis(index, date) == []
+    assert index.name_at(1, '2005-01-01') is None
+
+def test_name_at_resolves_local_languages_over_the_rows_valid_on_the_date():
+    index = _index([
+        # Feature 1 has a French and a German name of equal rank
+        (1, 11, 'N', 1, 'deu', 'FR', 'Deutscher Name', '', '', ''),
+        (1, 12, 'N', 1, 'fra', 'FR', 'Nom français', '', '', ''),
+        # German names are the most used in FR over all rows, but all ended before 2010
+        (2, 21, 'N', 1, 'deu', 'FR', 'Zwei', '', '2000-01-01', ''),
+        (3, 31, 'N', 1, 'deu', 'FR', 'Drei', '', '2000-01-01', ''),
+        (4, 41, 'N', 1, 'fra', 'FR', 'Quatre', '', '', '')
+    ])
+    profile = RANKING_PROFILES['local']
+    valid = index.candidates_at('2010-01-01')
+    expected = deduplicate_names(valid, profile=resolve_profiles([profile], valid)[0])
+    assert expected.loc[expected['ufi'] == 1, 'uni'].item() == 12
+    assert index.name_at(1, '2010-01-01', profile)['uni'] == 12
+    assert index.name_at(1, '1990-01-01', profile)['uni'] == 11
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    generate_dataset(tmp_path, 3000, seed=9)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def test_as_of_runs_keep_their_own_stages_and_outputs(dataset, capsys):
+    as_of = pd.Timestamp('2016-01-01')
+    stage_dir = dataset / '.gns_cache' / 'stages'
+    process = process_all_administrative_levels.process_gns_administrative_data
+    
+    assert process(use_cache=False, formats=('csv',)) is not None
+    current = pd.read_csv('Complete_Administrative_Divisions_with_Coordinates.csv')
+    assert process(use_cache=False, formats=('csv',), as_of=as_of) is not None
+    historical = pd.read_csv('Complete_Administrative_Divisions_with_Coordinates_as_of_2016-01-01.csv')
+    
+    # The date is part of the rank key, so each run stores its own rank and dedup outputs
+    assert len(list(stage_dir.glob('rank.*.pickle'))) == 2
+    assert len(list(stage_dir.glob('dedup.*.pickle'))) == 2
+    assert len(historical) < len(current)
+    # The current outputs are left as they were
+    pd.testing.assert_frame_equal(pd.read_csv('Complete_Administrative_Divisions_with_Coordinates.csv'), current)
+    
+    capsys.readouterr()
+    assert process(use_cache=False, formats=('csv',), as_of=as_of) is not None
+    output = capsys.readouterr().out
+    assert 'Reusing the stored dedup stage' in output
+    assert 'Complete_Administrative_Divisions_with_Coordinates_as_of_2016-01-01.csv is up to date' in output
@@ -0,0 +1,109 @@
+"""Best-name selection of gns_dedup.py against the baseline sort-and-first rules."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gns_dedup import (
+    COMMON_LOCAL_LANGS, RANKING_PROFILES, deduplicate_names, deduplicate_profiles, describe_profile
+)
+from gns_schema import apply_schema
+
+# (ufi, uni, nt, name_rank, lang_cd); rows are listed out of uni order on purpose
+CANDIDATES = [
+    # Name type comes first: an approved French name beats a conventional English one
+    (1, 12, 'C', 1, 'eng'),
+    (1, 11, 'N', 2, 'fra'),
+    # Then the name rank
+    (2, 21, 'N', 2, 'eng'),
+    (2, 22, 'N', 1, 'fra'),
+    # Then the language: a common local language beats others and a missing code
+    (3, 31, 'N', 1, None),
+    (3, 32, 'N', 1, 'xyz'),
+    (3, 33, 'N', 1, 'spa'),
+    # A missing language ranks with the other languages, so the lowest uni wins
+    (4, 42, 'N', 1, 'xyz'),
+    (4, 41, 'N', 1, None),
+    # Equal scores go to the lowest uni, whatever the row order
+    (5, 52, 'N', 1, 'eng'),
+    (5, 51, 'N', 1, 'eng'),
+    # A missing name rank ranks after any given rank
+    (6, 61, 'N', None, 'eng'),
+    (6, 62, 'N', 5, 'deu'),
+    # An unknown name type ranks after a variant
+    (7, 71, 'X', 1, 'eng'),
+    (7, 72, 'V', 3, 'rus'),
+    # A single row is kept as it is
+    (8, 81, 'D', 2, 'ara')
+]
+
+def _candidates():
+    df = pd.DataFrame(CANDIDATES, columns=['ufi', 'uni', 'nt', 'name_rank', 'lang_cd'])
+    df['name_rank'] = df['name_rank'].astype('float32')
+    df['cc_ft'] = 'FR'
+    return df
+
+def _baseline(df, local_langs):
+    """The processors' original rule: sort by the priorities and keep the first row of each ufi.
+    
+    uni is added as the last sort key, since the original sort left ties unordered.
+    """
+    name_type_priority = {'N': 1, 'C': 2, 'D': 3, 'V': 4}
+    ranked = df.assign(
+        nt_priority=df['nt'].astype(object).map(name_type_priority).fillna(999),
+        name_rank_num=pd.to_numeric(df['name_rank'], errors='coerce').fillna(999),
+        lang_priority=df['lang_cd'].astype(object).apply(
+            lambda x: 1 if x == 'eng' else (2 if x in local_langs else 3)
+        )
+    )
+    ranked = ranked.sort_values(['ufi', 'nt_priority', 'name_rank_num', 'lang_priority', 'uni'])
+    return ranked.groupby('ufi')['uni'].first().to_dict()
+
+def _selected(df):
+    return dict(zip(df['ufi'].tolist(), df['uni'].tolist()))
+
+@pytest.mark.parametrize('schema', [False, True], ids=['plain', 'categorical'])
+def test_default_rule_picks_baseline_names(schema):
+    candidates = apply_schema(_candidates()) if schema else _candidates()
+    expected = {1: 11, 2: 22, 3: 33, 4: 41, 5: 51, 6: 62, 7: 72, 8: 81}
+    assert _baseline(_candidates(), COMMON_LOCAL_LANGS) == expected
+    assert _selected(deduplicate_names(candidates)) == expected
+    assert _selected(deduplicate_names(candidates, profile=RANKING_PROFILES['default'])) == expected
+
+@pytest.mark.parametrize('schema', [False, True], ids=['plain', 'categorical'])
+def test_english_profile_matches_simple_processor(schema):
+    candidates = apply_schema(_candidates()) if schema else _candidates()
+    # The simple processor ranks English first and every other language equally,
+    # so the three languages of feature 3 tie and the lowest uni wins
+    expected = {1: 11, 2: 22, 3: 31, 4: 41, 5: 51, 6: 62, 7: 72, 8: 81}
+    assert _baseline(_candidates(), frozenset()) == expected
+    assert _selected(deduplicate_names(candidates, profile=RANKING_PROFILES['english'])) == expected
+
+def test_english_profile_differs_on_local_languages():
+    candidates = pd.DataFrame(
+        [(1, 11, 'N', 1, 'xyz'), (1, 12, 'N', 1, 'fra')], columns=['ufi', 'uni', 'nt', 'name_rank', 'lang_cd']
+    ).assign(cc_ft='FR')
+    assert _selected(deduplicate_names(candidates)) == {1: 12}
+    assert _selected(deduplicate_names(candidates, profile=RANKING_PROFILES['english'])) == {1: 11}
+
+def test_row_order_does_not_change_selection():
+    candidates = _candidates()
+    shuffled = candidates.sample(frac=1, random_state=np.random.RandomState(0))
+    assert _selected(deduplicate_names(shuffled)) == _selected(deduplicate_names(candidates))
+
+def test_profiles_scored_together_match_single_profiles():
+    candidates = _candidates()
+    profiles = [RANKING_PROFILES['default'], RANKING_PROFILES['english']]
+    results = deduplicate_profiles(candidates, profiles)
+    for profile in profiles:
+        expected = deduplicate_names(candidates, profile=profile)
+        pd.testing.assert_frame_equal(results[profile.name], expected)
+
+def test_profile_description_follows_its_tiers():
+    assert describe_profile(RANKING_PROFILES['english']) == (
+        'Approved (N) > Conventional (C) > Non-auth (D) > Variant (V)',
+        'Lower name_rank > English language > others'
+    )
+    assert describe_profile(RANKING_PROFILES['local'])[1] == (
+        "Lower name_rank > Country's own language > English language > others"
+    )
@@ -0,0 +1,84 @@
+"""Incremental rebuilds from two releases against a full rebuild of the second."""
+
+import pandas as pd
+import pytest
+
+from gns_dedup import deduplicate_names
+from gns_incremental import build_change_report, incremental_deduplicate, load_snapshot, save_snapshot
+from gns_schema import apply_schema
+from process_all_administrative_levels import process_gns_administrative_data
+
+COLUMNS = ['ufi', 'uni', 'nt', 'name_rank', 'lang_cd', 'cc_ft', 'desig_cd', 'full_name', 'lat_dd', 'long_dd']
+
+FIRST_RELEASE = [
+    (1, 11, 'N', 1, 'eng', 'FR', 'ADM1', 'Alpha', 48.0, 2.0),
+    (1, 12, 'V', 2, 'fra', 'FR', 'ADM1', 'Alfa', 48.0, 2.0),
+    (2, 21, 'N', 1, 'eng', 'FR', 'ADM2', 'Beta', 45.0, 5.0),
+    (3, 31, 'N', 1, 'eng', 'DE', 'ADM1', 'Gamma', 52.0, 13.0),
+    (4, 41, 'N', 1, 'eng', 'DE', 'ADM2', 'Delta', 50.0, 8.0),
+    (5, 51, 'N', 1, 'spa', 'ES', 'ADM1', 'Epsilon', 40.0, -3.0)
+]
+
+SECOND_RELEASE = [
+    # Unchanged
+    (1, 11, 'N', 1, 'eng', 'FR', 'ADM1', 'Alpha', 48.0, 2.0),
+    (1, 12, 'V', 2, 'fra', 'FR', 'ADM1', 'Alfa', 48.0, 2.0),
+    # Moved
+    (2, 21, 'N', 1, 'eng', 'FR', 'ADM2', 'Beta', 45.5, 5.0),
+    # Renamed: the old name became a variant of a new approved name
+    (3, 31, 'V', 1, 'eng', 'DE', 'ADM1', 'Gamma', 52.0, 13.0),
+    (3, 32, 'N', 1, 'eng', 'DE', 'ADM1', 'Gamma Nova', 52.0, 13.0),
+    # Feature 4 was removed; feature 5 gained a variant that does not win
+    (5, 51, 'N', 1, 'spa', 'ES', 'ADM1', 'Epsilon', 40.0, -3.0),
+    (5, 52, 'V', 3, 'eng', 'ES', 'ADM1', 'Epsilon Viejo', 40.0, -3.0),
+    # Added
+    (6, 61, 'N', 1, 'eng', 'ES', 'ADM2', 'Zeta', 41.0, 2.0)
+]
+
+SETTINGS = {'ranking': 'default'}
+
+def _release(rows):
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    df['name_rank'] = df['name_rank'].astype('float32')
+    return apply_schema(df)
+
+@pytest.fixture
+def snapshot(tmp_path):
+    first = _release(FIRST_RELEASE)
+    save_snapshot(first, deduplicate_names(first), SETTINGS, tmp_path)
+    return load_snapshot(SETTINGS, tmp_path)
+
+def test_incremental_rebuild_matches_full_rebuild(snapshot):
+    second = _release(SECOND_RELEASE)
+    incremental, changed = incremental_deduplicate(second, snapshot, deduplicate_names)
+    
+    assert sorted(changed.tolist()) == [2, 3, 4, 5, 6]
+    full = deduplicate_names(second)
+    pd.testing.assert_frame_equal(incremental, full, check_categorical=False)
+
+def test_change_report(snapshot):
+    second = _release(SECOND_RELEASE)
+    current, _ = incremental_deduplicate(second, snapshot, deduplicate_names)
+    report = build_change_report(snapshot.deduplicated, current)
+    
+    assert report['summary'] == {
+        'previous_features': 5, 'current_features': 5, 'added': 1, 'removed': 1, 'renamed': 1, 'moved': 1
+    }
+    assert [row['ufi'] for row in report['added']] == [6]
+    assert [row['ufi'] for row in report['removed']] == [4]
+    assert [(row['ufi'], row['full_name_previous'], row['full_name_current']) for row in report['renamed']] == [
+        (3, 'Gamma', 'Gamma Nova')
+    ]
+    assert [(row['ufi'], row['lat_dd_previous'], row['lat_dd_current']) for row in report['moved']] == [
+        (2, 45.0, 45.5)
+    ]
+
+def test_snapshot_with_other_settings_is_not_used(tmp_path):
+    first = _release(FIRST_RELEASE)
+    save_snapshot(first, deduplicate_names(first), SETTINGS, tmp_path)
+    assert load_snapshot({'ranking': 'english'}, tmp_path) is None
+
+@pytest.mark.parametrize('option', ['incremental', 'export_country_files'])
+def test_as_of_run_cannot_replace_current_release_state(option):
+    with pytest.raises(ValueError):
+        process_gns_administrative_data(as_of=pd.Timestamp('2010-01-01'), **{option: True})
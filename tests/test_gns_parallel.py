@@ -0,0 +1,79 @@
+"""Parallel reading and deduplication give the same rows as a single-process run."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gns_dedup import RANKING_PROFILES, best_rows_by_profile, deduplicate_names, profile_scores, resolve_profiles
+from gns_parallel import (
+    country_shards, file_byte_ranges, parallel_best_rows, parallel_deduplicate, read_admin_regions_parallel, read_header
+)
+from gns_reader import ADMIN_COLUMNS, read_admin_regions
+from gns_summary import summarize
+from gns_synthetic import generate_gns_file
+
+# Small byte ranges, so the file is split in many places
+RANGE_SIZE = 16 * 1024
+
+def _ufi_at(path, position, ufi_column):
+    """Return the ufi of the line starting at a byte position."""
+    with open(path, 'rb') as f:
+        f.seek(position)
+        return f.readline().decode('utf-8').split('\t')[ufi_column]
+
+def _ufi_before(path, position, ufi_column):
+    """Return the ufi of the line ending at a byte position."""
+    with open(path, 'rb') as f:
+        f.seek(max(0, position - 4096))
+        return f.read(position - f.tell()).decode('utf-8').splitlines()[-1].split('\t')[ufi_column]
+
+@pytest.fixture(scope='module')
+def gns_file(tmp_path_factory):
+    path = tmp_path_factory.mktemp('gns') / 'Administrative_Regions.txt'
+    generate_gns_file(path, 5000, seed=3)
+    return path
+
+def test_byte_ranges_split_a_feature(gns_file):
+    # The comparison below is only meaningful if a feature's rows span two ranges
+    ufi_column = read_header(gns_file).index('ufi')
+    boundaries = [start for start, _ in file_byte_ranges(gns_file, RANGE_SIZE)[1:]]
+    assert any(
+        _ufi_before(gns_file, boundary, ufi_column) == _ufi_at(gns_file, boundary, ufi_column)
+        for boundary in boundaries
+    )
+
+def test_parallel_run_matches_serial_run(gns_file):
+    serial, serial_counts = read_admin_regions(gns_file, usecols=ADMIN_COLUMNS)
+    parallel, parallel_counts = read_admin_regions_parallel(
+        gns_file, usecols=ADMIN_COLUMNS, workers=2, range_size=RANGE_SIZE
+    )
+    assert parallel_counts == serial_counts
+    pd.testing.assert_frame_equal(parallel, serial)
+    
+    expected = deduplicate_names(serial)
+    pd.testing.assert_frame_equal(parallel_deduplicate(parallel, workers=2), expected)
+
+def test_parallel_selection_matches_serial_selection(gns_file):
+    candidates, _ = read_admin_regions(gns_file, usecols=ADMIN_COLUMNS)
+    # Some features get name rows under a second country code
+    rng = np.random.default_rng(0)
+    moved = candidates['ufi'].isin(rng.choice(candidates['ufi'].unique(), 50, replace=False))
+    moved &= candidates['uni'] % 2 == 0
+    candidates.loc[moved, 'cc_ft'] = candidates['cc_ft'].cat.categories[0]
+    assert (candidates.groupby('ufi', observed=True)['cc_ft'].nunique() > 1).sum() > 10
+    
+    # Every feature lies in exactly one shard
+    shards = country_shards(candidates, 8)
+    assert len(shards) > 1
+    assert sum(shard['ufi'].nunique() for shard in shards) == candidates['ufi'].nunique()
+    
+    profiles = resolve_profiles(list(RANKING_PROFILES.values()), candidates)
+    expected_scores = profile_scores(candidates, profiles)
+    expected = best_rows_by_profile(candidates, expected_scores)
+    scores, best_rows, summaries = parallel_best_rows(candidates, profiles, workers=2)
+    pd.testing.assert_frame_equal(scores, expected_scores)
+    assert list(best_rows) == list(summaries) == list(expected)
+    for name, rows in expected.items():
+        pd.testing.assert_frame_equal(best_rows[name], rows)
+        # The merged summaries of the shards equal a summary of all the rows
+        pd.testing.assert_frame_equal(summaries[name].table(), summarize(rows).table())
@@ -0,0 +1,73 @@
+"""Malformed numeric cells in the GNS file drop or blank their row instead of failing the read,
+and the columnar cache serves the same typed rows as parsing the text."""
+
+import pandas as pd
+import pytest
+
+import gns_reader
+from gns_cache import cache_available
+from gns_reader import ADMIN_COLUMNS, iter_gns_blocks, read_admin_regions
+from gns_synthetic import generate_gns_file
+
+def _row(ufi, uni, name, lat, long, rank='1'):
+    values = {column: '' for column in ADMIN_COLUMNS}
+    values.update({
+        'rk': '1', 'ufi': ufi, 'uni': uni, 'full_name': name, 'nt': 'N',
+        'lat_dd': lat, 'long_dd': long, 'desig_cd': 'ADM1', 'fc': 'A', 'cc_ft': 'FR',
+        'adm1': '01', 'name_rank': rank, 'lang_cd': 'eng', 'display': 'Y'
+    })
+    return '\t'.join(values[column] for column in ADMIN_COLUMNS)
+
+def _write(path, rows):
+    path.write_text('\n'.join(['\t'.join(ADMIN_COLUMNS), *rows]) + '\n', encoding='utf-8')
+
+def test_malformed_cells_do_not_abort_the_read(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / 'Administrative_Regions.txt'
+    _write(path, [
+        _row('1', '11', 'Valid', '48.5', '2.25'),
+        _row('2', '21', 'Bad latitude', 'x', '2.0'),
+        _row('3', '31', 'Bad longitude', '45.0', '5,0'),
+        _row('4', '41', 'Bad rank', '44.0', '4.0', rank='first'),
+        _row('u5', '51', 'Bad feature ID', '43.0', '3.0'),
+        _row('6', '', 'Missing name ID', '42.0', '2.0')
+    ])
+
+    # Uncached, building the cache and from the cache
+    for chunksize, use_cache in [(None, False), (2, False), (None, True), (None, True), (2, True)]:
+        df, counts = read_admin_regions(path, chunksize=chunksize, use_cache=use_cache)
+
+        # Rows with a malformed coordinate fail the coordinate filter
+        assert counts == {'read': 6, 'administrative': 6, 'display': 6, 'coordinates': 4}
+        # Rows without a valid identifier are dropped when the schema is applied
+        assert df['full_name'].tolist() == ['Valid', 'Bad rank']
+        assert df['ufi'].dtype == 'int64'
+        assert df['lat_dd'].tolist() == [48.5, 44.0]
+        assert df['name_rank'].dtype == 'float32'
+        assert df['name_rank'].iloc[0] == 1
+        assert pd.isna(df['name_rank'].iloc[1])
+
+def test_cache_hit_returns_typed_rows_without_parsing(tmp_path, monkeypatch):
+    if not cache_available():
+        pytest.skip('pyarrow is not installed')
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / 'Administrative_Regions.txt'
+    generate_gns_file(path, 3000, seed=21)
+    fresh = {chunksize: read_admin_regions(path, chunksize=chunksize) for chunksize in (None, 700)}
+    # The first cached read parses the text and builds the cache
+    assert read_admin_regions(path, use_cache=True)[0].equals(fresh[None][0])
+    
+    def no_parsing(*args, **kwargs):
+        raise AssertionError('the text file was parsed again')
+    monkeypatch.setattr(gns_reader, '_read_tsv_blocks', no_parsing)
+    
+    # The cache holds typed blocks: floats, int64 ids and dictionary-encoded codes
+    block = next(iter_gns_blocks(path, ADMIN_COLUMNS, use_cache=True))
+    assert block['lat_dd'].dtype == 'float64' and block['name_rank'].dtype == 'float32'
+    assert block['ufi'].dtype == 'Int64'
+    assert isinstance(block['desig_cd'].dtype, pd.CategoricalDtype)
+    
+    for chunksize, (expected, expected_counts) in fresh.items():
+        df, counts = read_admin_regions(path, chunksize=chunksize, use_cache=True)
+        assert counts == expected_counts
+        pd.testing.assert_frame_equal(df, expected)
@@ -0,0 +1,131 @@
+"""Stage keys, stored outputs and resumed runs of the memoized processing pipeline."""
+
+import time
+
+import pandas as pd
+import pytest
+
+import gns_stages
+import process_all_administrative_levels
+from gns_stages import StageStore, stage_key
+from gns_synthetic import generate_dataset
+
+class Counter:
+    """A stage computation that counts its calls."""
+    
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+    
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+def test_key_changes_with_parameters_and_inputs():
+    key = stage_key('rank', ['load-key'], {'profiles': {'default': 1}})
+    assert stage_key('rank', ['load-key'], {'profiles': {'default': 1}}) == key
+    assert stage_key('rank', ['load-key'], {'profiles': {'default': 2}}) != key
+    assert stage_key('rank', ['other-load-key'], {'profiles': {'default': 1}}) != key
+    assert stage_key('dedup', ['load-key'], {'profiles': {'default': 1}}) != key
+
+def test_changed_parameter_recomputes_the_stage(tmp_path):
+    stages = StageStore(tmp_path)
+    compute = Counter({'rows': 3})
+    first_key = stage_key('dedup', ['input'], {'ranking': 'default'})
+    assert stages.run('dedup', first_key, compute) == {'rows': 3}
+    assert stages.run('dedup', first_key, compute) == {'rows': 3}
+    assert compute.calls == 1
+    
+    stages.run('dedup', stage_key('dedup', ['input'], {'ranking': 'english'}), compute)
+    assert compute.calls == 2
+
+def test_frames_round_trip_through_parquet_and_pickle(tmp_path):
+    stages = StageStore(tmp_path)
+    frame = pd.DataFrame({
+        'ufi': pd.array([1, 2, 3], dtype='int64'),
+        'name_rank': pd.array([1.0, None, 2.0], dtype='float32'),
+        'nt': pd.Categorical(['N', 'V', 'N'])
+    })
+    counts = {'read': 10, 'coordinates': 3}
+    stages.save('load', 'a' * 64, (frame, counts))
+    
+    assert [path.suffix for path in sorted(tmp_path.iterdir())] == ['.parquet', '.pickle']
+    loaded_frame, loaded_counts = stages.load('load', 'a' * 64)
+    pd.testing.assert_frame_equal(loaded_frame, frame)
+    assert loaded_counts == counts
+
+def test_rerun_resumes_after_the_last_completed_stage(tmp_path):
+    stages = StageStore(tmp_path)
+    load = Counter(pd.DataFrame({'ufi': [1, 2]}))
+    
+    def crash():
+        raise RuntimeError('crashed while ranking')
+    
+    stages.run('load', 'l' * 64, load)
+    with pytest.raises(RuntimeError):
+        stages.run('rank', 'r' * 64, crash)
+    # A stage interrupted while saving leaves only a temporary file behind
+    (tmp_path / f"dedup.{'d' * 16}.pickle.tmp").write_bytes(b'partial')
+    
+    rerun = StageStore(tmp_path)
+    assert rerun.has('load', 'l' * 64)
+    assert not rerun.has('rank', 'r' * 64)
+    assert not rerun.has('dedup', 'd' * 64)
+    rerun.run('load', 'l' * 64, load)
+    assert load.calls == 1
+
+def test_only_the_most_recently_used_keys_are_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(gns_stages, 'KEPT_KEYS', 2)
+    stages = StageStore(tmp_path)
+    keys = [str(number) * 64 for number in range(3)]
+    
+    def pause():
+        # Keys are ordered by modification time, which the file system may round
+        time.sleep(0.05)
+    
+    stages.save('load', keys[0], (pd.DataFrame({'ufi': [0]}), {}))
+    pause()
+    stages.save('load', keys[1], (pd.DataFrame({'ufi': [1]}), {}))
+    pause()
+    # Using the first key again makes the second the least recently used
+    stages.load('load', keys[0])
+    pause()
+    stages.save('load', keys[2], (pd.DataFrame({'ufi': [2]}), {}))
+    
+    assert [stages.has('load', key) for key in keys] == [True, False, True]
+    assert not list(tmp_path.glob(f"load.{keys[1][:16]}.*"))
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    generate_dataset(tmp_path, 3000, seed=7)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def _process(**kwargs):
+    return process_all_administrative_levels.process_gns_administrative_data(use_cache=False, **kwargs)
+
+def test_parallel_run_stores_the_rank_stage_for_serial_runs(dataset, capsys):
+    assert _process(workers=2) is not None
+    assert len(list((dataset / '.gns_cache' / 'stages').glob('rank.*.pickle'))) == 1
+    parallel = pd.read_parquet(dataset / 'Complete_Administrative_Divisions_with_Coordinates.parquet')
+    
+    # Without the stored dedup stage, a serial run goes back to the stored scores
+    for dedup_file in (dataset / '.gns_cache' / 'stages').glob('dedup.*'):
+        dedup_file.unlink()
+    capsys.readouterr()
+    assert _process(workers=1) is not None
+    assert 'Reusing the stored rank stage' in capsys.readouterr().out
+    serial = pd.read_parquet(dataset / 'Complete_Administrative_Divisions_with_Coordinates.parquet')
+    pd.testing.assert_frame_equal(serial, parallel)
+
+def test_switching_the_excel_writer_rewrites_the_workbook(dataset, capsys):
+    workbook = 'Complete_Administrative_Divisions_with_Coordinates.xlsx'
+    assert _process() is not None
+    capsys.readouterr()
+    
+    assert _process() is not None
+    assert f'{workbook} is up to date' in capsys.readouterr().out
+    assert _process(streaming_excel=True) is not None
+    output = capsys.readouterr().out
+    assert f'{workbook} is up to date' not in output
+    assert 'Streaming rows to the workbook' in output
@@ -0,0 +1,71 @@
+"""Summary sheets from the running accumulator against pivots of the output rows."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gns_dedup import deduplicate_names
+from gns_reader import ADMIN_COLUMNS, read_admin_regions
+from gns_summary import SummaryAccumulator, summarize
+from gns_synthetic import country_codes, generate_gns_file
+from gns_workbook import country_level_pivot
+from process_all_administrative_levels import attach_country_info, structure_output
+
+@pytest.fixture(scope='module')
+def deduplicated(tmp_path_factory):
+    path = tmp_path_factory.mktemp('gns') / 'Administrative_Regions.txt'
+    generate_gns_file(path, 4000, seed=11)
+    candidates, _ = read_admin_regions(path, usecols=ADMIN_COLUMNS)
+    df = deduplicate_names(candidates)
+    
+    # Some divisions lose their coordinates, as rows from the cache or an incremental run may
+    rng = np.random.default_rng(0)
+    df.loc[rng.random(len(df)) < 0.05, 'lat_dd'] = np.nan
+    df.loc[rng.random(len(df)) < 0.05, 'long_dd'] = np.nan
+    return df
+
+@pytest.fixture(scope='module')
+def countries_df(deduplicated):
+    # The first few codes in use are left out, so their divisions have no country name
+    codes = sorted(set(country_codes()) - set(deduplicated['cc_ft'].astype(str).unique()[:3]))
+    return pd.DataFrame({
+        'Country_Code': codes,
+        'Short_Name': [f'Country {code}' for code in codes],
+        'Full_Name': [f'Republic of Country {code}' for code in codes]
+    })
+
+def test_country_pivot_matches_pivot_of_output_rows(deduplicated, countries_df):
+    output_df = structure_output(attach_country_info(deduplicated.copy(), countries_df))
+    assert output_df['Country_Code'].isna().any()
+    assert len(output_df) < len(deduplicated)
+    
+    expected = country_level_pivot(output_df)
+    for batch_rows in (len(deduplicated), 97):
+        actual = summarize(deduplicated, batch_rows=batch_rows).country_pivot(countries_df)
+        pd.testing.assert_frame_equal(actual, expected)
+
+def test_level_counts_and_country_count_match_output_rows(deduplicated, countries_df):
+    output_df = structure_output(attach_country_info(deduplicated.copy(), countries_df))
+    summary = summarize(deduplicated, batch_rows=500)
+    
+    expected_levels = output_df['Administrative_Level'].astype(str).value_counts().sort_index()
+    pd.testing.assert_series_equal(summary.level_counts(), expected_levels, check_names=False)
+    assert summary.level_counts(located=False).sum() == len(deduplicated)
+    assert summary.country_count(countries_df) == output_df['Country_Code'].nunique()
+
+def test_merged_accumulators_match_one_accumulator(deduplicated):
+    # Split by country, as the parallel workers summarize their shards
+    halves = deduplicated['cc_ft'].astype(str) < 'M'
+    merged = summarize(deduplicated[halves], batch_rows=300).merge(summarize(deduplicated[~halves]))
+    pd.testing.assert_frame_equal(merged.table(), summarize(deduplicated).table())
+    assert SummaryAccumulator().merge(merged).table().equals(merged.table())
+
+def test_bounding_boxes_cover_located_divisions(deduplicated):
+    boxes = summarize(deduplicated, batch_rows=250).bounding_boxes()
+    located = deduplicated.dropna(subset=['lat_dd', 'long_dd'])
+    expected = located.groupby(located['cc_ft'].astype(object)).agg(
+        min_lat=('lat_dd', 'min'), max_lat=('lat_dd', 'max'), min_lon=('long_dd', 'min'), max_lon=('long_dd', 'max')
+    )
+    pd.testing.assert_frame_equal(boxes, expected.astype(np.float64), check_names=False)
+    # A country whose divisions all lack coordinates has no box
+    assert set(boxes.index) == set(located['cc_ft'].astype(object))
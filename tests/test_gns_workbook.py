@@ -0,0 +1,49 @@
+"""The streaming workbook writer gives the same sheets as the in-memory one."""
+
+import openpyxl
+import pandas as pd
+
+from gns_workbook import country_level_pivot, write_master_workbook
+
+OUTPUT_ROWS = [
+    # (Country_Code, Country_Name, Administrative_Level, Administrative_Name, latitude)
+    ('FR', 'France', 'ADM1', 'Bretagne', 48.2),
+    ('FR', 'France', 'ADM2', 'Finistère', 48.3),
+    ('FR', 'France', 'ADM2', 'Morbihan', None),
+    ('DE', 'Germany', 'ADM1', 'Bayern', 48.8),
+    ('DE', 'Germany', 'ADM3', 'München', 48.1),
+    # A code shared by two names, so the Country_Code index cells are merged
+    ('XX', 'Atlantis', 'ADMD', 'Poseidonia', 0.0),
+    ('XX', 'Mu', 'ADM1', 'Lemuria', -5.0),
+    # An unknown country code
+    (None, 'Unknown', 'ADM4', 'Nowhere', 1.5)
+]
+
+def test_streaming_workbook_matches_in_memory_workbook(tmp_path):
+    output_df = pd.DataFrame(
+        OUTPUT_ROWS,
+        columns=['Country_Code', 'Country_Name', 'Administrative_Level', 'Administrative_Name', 'latitude']
+    )
+    country_pivot = country_level_pivot(output_df)
+
+    in_memory = write_master_workbook(output_df, tmp_path / 'in_memory.xlsx', country_pivot)
+    streaming = write_master_workbook(
+        output_df, tmp_path / 'streaming.xlsx', country_pivot, streaming=True, batch_rows=3
+    )
+
+    expected = pd.read_excel(in_memory, sheet_name=None)
+    actual = pd.read_excel(streaming, sheet_name=None)
+    assert list(actual) == list(expected)
+    assert 'Country_Summary' in expected and 'ADM3_Divisions' in expected
+    for sheet, sheet_df in expected.items():
+        pd.testing.assert_frame_equal(actual[sheet], sheet_df, obj=sheet)
+    
+    # The summary sheets are written cell by cell, so compare their cells and merged ranges too
+    in_memory_book = openpyxl.load_workbook(in_memory)
+    streaming_book = openpyxl.load_workbook(streaming)
+    for sheet in ('Country_Summary', 'Top_30_Countries'):
+        expected_sheet, actual_sheet = in_memory_book[sheet], streaming_book[sheet]
+        assert [list(row) for row in actual_sheet.values] == [list(row) for row in expected_sheet.values]
+        assert sorted(map(str, actual_sheet.merged_cells.ranges)) == sorted(map(str, expected_sheet.merged_cells.ranges))
+        assert actual_sheet['A1'].font.bold and actual_sheet['A4'].font.bold
+    assert 'A4:A5' in {str(cell_range) for cell_range in streaming_book['Country_Summary'].merged_cells.ranges}
@@ -0,0 +1,151 @@
+"""Answer cache, batch queries, parameter checks, request bodies and counters of the lookup service."""
+
+import asyncio
+import json
+
+import pandas as pd
+import pytest
+
+import lookup_server
+from admin_lookup import AdminLookup
+from lookup_server import LookupService
+
+def _divisions():
+    return pd.DataFrame({
+        'Unique_Feature_ID': pd.array([1, 2, 3, 4], dtype='Int64'),
+        'Country_Code': ['FR', 'FR', 'JP', 'NZ'],
+        'Country_Name': ['France', 'France', 'Japan', 'New Zealand'],
+        'Administrative_Level': ['ADM1', 'ADM2', 'ADM1', 'ADM1'],
+        'Administrative_Name': ['Bretagne', 'Finistère', 'Tokyo', 'Chatham Islands'],
+        'latitude': [48.2, 48.3, 35.7, -44.0],
+        'longitude': [-2.9, -4.0, 139.7, -176.5],
+        'Parent_Feature_ID': pd.array([None, 1, None, None], dtype='Int64')
+    })
+
+def _service(**kwargs):
+    return LookupService(AdminLookup(_divisions()), **kwargs)
+
+def _answer(service, kind, **params):
+    return asyncio.run(service.answer(kind, {name: str(value) for name, value in params.items()}))
+
+def _http(service, requests):
+    """Send raw HTTP requests, each on its own connection, and return (status, JSON body) pairs."""
+    async def send(port, request):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(request)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        head, _, body = response.partition(b'\r\n\r\n')
+        return int(head.split()[1]), json.loads(body)
+    
+    async def run():
+        server = await asyncio.start_server(service.handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return [await send(port, request) for request in requests]
+    return asyncio.run(run())
+
+def _get(target):
+    return f"GET {target} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode('latin-1')
+
+def _post(target, body, length=None):
+    length = len(body) if length is None else length
+    return (
+        f"POST {target} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {length}\r\n"
+        f"Connection: close\r\n\r\n"
+    ).encode('latin-1') + body
+
+def test_cache_evicts_least_recently_used_answers_by_entries():
+    service = _service(cache_size=2)
+    for feature_id in (1, 2, 1, 3):
+        _answer(service, 'feature', id=feature_id)
+    # Feature 1 was used again after feature 2, so feature 2 is evicted
+    assert list(service.cache) == [('feature', 1), ('feature', 3)]
+    assert service.cache_bytes == sum(len(body) for body in service.cache.values())
+    assert (service.metrics.cache_hits, service.metrics.cache_misses) == (1, 3)
+
+def test_cache_evicts_least_recently_used_answers_by_bytes():
+    sizes = {feature_id: len(_answer(_service(), 'feature', id=feature_id)) for feature_id in (1, 2, 3)}
+    # Room for the answers of features 2 and 3 but not for all three
+    service = _service(cache_mb=(sizes[2] + sizes[3]) / 2**20)
+    for feature_id in (1, 2, 3):
+        _answer(service, 'feature', id=feature_id)
+    assert list(service.cache) == [('feature', 2), ('feature', 3)]
+    assert service.cache_bytes == sizes[2] + sizes[3]
+
+def test_batch_answers_each_query_or_its_own_error():
+    service = _service()
+    answers = json.loads(asyncio.run(service.answer_batch(json.dumps([
+        {'type': 'search', 'name': 'finistere'},
+        {'type': 'nearest', 'lat': '91', 'lon': '0'},
+        {'type': 'unknown'},
+        {'type': 'feature', 'id': '3'}
+    ]).encode('utf-8'))))
+    
+    assert [row['Unique_Feature_ID'] for row in answers[0]['results']] == [2]
+    assert answers[1] == {'error': 'lat must be between -90 and 90'}
+    assert answers[2] == {'error': 'unknown query type: unknown'}
+    assert answers[3]['results'][0]['Administrative_Name'] == 'Tokyo'
+    
+    for body in (b'not json', b'{"type": "feature"}', b'[1, 2]'):
+        with pytest.raises(lookup_server.QueryError):
+            asyncio.run(service.answer_batch(body))
+
+@pytest.mark.parametrize('query, error', [
+    ('lat=91&lon=0', 'lat must be between -90 and 90'),
+    ('lat=0&lon=-180.5', 'lon must be between -180 and 180'),
+    ('lat=nan&lon=0', 'invalid lat: nan'),
+    ('lat=north&lon=0', 'invalid lat: north'),
+    ('lat=0', 'missing parameter: lon'),
+    ('lat=0&lon=0&k=0', f'k must be between 1 and {lookup_server.MAX_NEAREST}')
+])
+def test_invalid_coordinates_are_refused(query, error):
+    status, body = asyncio.run(_service().respond('GET', f'/nearest?{query}', b''))
+    assert (status, json.loads(body)) == (400, {'error': error})
+
+def test_points_on_the_antimeridian_and_poles_are_valid():
+    pytest.importorskip('scipy')
+    service = _service()
+    for latitude, longitude, nearest in [(-44, 180, 'Chatham Islands'), (90, 0, 'Finistère'), (-90, -180, 'Chatham Islands')]:
+        status, body = asyncio.run(service.respond('GET', f'/nearest?lat={latitude}&lon={longitude}', b''))
+        assert status == 200
+        assert json.loads(body)['results'][0]['Administrative_Name'] == nearest
+
+def test_refused_request_bodies(monkeypatch):
+    monkeypatch.setattr(lookup_server, 'MAX_BODY_BYTES', 64)
+    query = json.dumps([{'type': 'feature', 'id': '1'}]).encode('utf-8')
+    (ok, answers), (too_large, large_error), (invalid, invalid_error) = _http(_service(), [
+        _post('/batch', query),
+        # The body is not sent: the declared length alone is refused
+        _post('/batch', b'', length=65),
+        _post('/batch', query, length='12abc')
+    ])
+    assert ok == 200 and answers[0]['results'][0]['Unique_Feature_ID'] == 1
+    assert (too_large, large_error) == (413, {'error': 'body larger than 64 bytes'})
+    assert (invalid, invalid_error) == (400, {'error': 'invalid Content-Length'})
+
+def test_stats_count_requests_errors_cache_and_batches():
+    pytest.importorskip('scipy')
+    # A long batch window, so both nearest queries of the batch request share one tree query
+    service = _service(batch_window=0.05)
+    nearest = json.dumps([
+        {'type': 'nearest', 'lat': '48', 'lon': '-3'},
+        {'type': 'nearest', 'lat': '35', 'lon': '139'}
+    ]).encode('utf-8')
+    *answers, (status, stats) = _http(service, [
+        _get('/feature?id=1'),
+        _get('/feature?id=1'),
+        _get('/nearest?lat=91&lon=0'),
+        _get('/nowhere'),
+        _post('/batch', nearest),
+        _get('/stats')
+    ])
+    assert [status for status, _ in answers] == [200, 200, 400, 404, 200]
+    
+    # The stats request itself is counted after it is answered
+    assert status == 200
+    assert (stats['requests'], stats['errors']) == (5, 2)
+    assert stats['endpoints'] == {'/feature': 2, '/nearest': 1, '/nowhere': 1, '/batch': 1}
+    assert stats['cache'] | {'mb': None} == {'entries': 3, 'mb': None, 'hits': 1, 'misses': 3, 'hit_rate': 0.25}
+    assert stats['nearest_batches'] == {'batches': 1, 'points': 2, 'mean_points': 2.0}
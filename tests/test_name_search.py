@@ -0,0 +1,85 @@
+"""Search keys and the match tiers of the name index."""
+
+import pickle
+
+import numpy as np
+import pytest
+
+from name_search import EXACT, FUZZY, PREFIX, SUBSTRING, NameIndex, best_matches, normalize_name, search_keys
+
+NAMES = [
+    'São Paulo', 'Sao Paulo do Norte', 'Paulo Afonso', 'São Paulo de Olivença', 'Łódź', 'Ærøskøbing',
+    'Saint-Denis', 'Saint Denis', 'Bretagne', 'Brest', 'Finistère', 'Ab', 'Aba', 'Nord', None, 'Bretagne'
+]
+
+@pytest.fixture(scope='module')
+def index():
+    return NameIndex(NAMES)
+
+def _found(index, query):
+    return [(index.names[match.name_id], match.tier) for match in index.matches(query)]
+
+@pytest.mark.parametrize('name, key', [
+    ('São Paulo', 'sao paulo'),
+    ('Łódź', 'lodz'),
+    ('Ærøskøbing', 'aeroskobing'),
+    ('  Saint-Denis (Réunion) ', 'saint denis reunion'),
+    ('STRASSE', 'strasse'),
+    ('Straße', 'strasse'),
+    ('---', '')
+])
+def test_search_keys_fold_accents_case_and_punctuation(name, key):
+    assert normalize_name(name) == key
+    assert search_keys([name, None]).tolist() == [key, '']
+
+def test_accented_and_plain_queries_find_the_same_names(index):
+    assert _found(index, 'sao paulo') == _found(index, 'SÃO PAULO')
+    assert _found(index, 'lodz')[0] == ('Łódź', EXACT)
+    assert _found(index, 'aeroskobing')[0] == ('Ærøskøbing', EXACT)
+    # Both spellings of Saint-Denis have the same key
+    assert [name for name, tier in _found(index, 'saint denis') if tier == EXACT] == ['Saint-Denis', 'Saint Denis']
+
+def test_tiers_come_in_order_and_prefixes_shortest_first(index):
+    found = _found(index, 'sao paulo')
+    assert found[:3] == [('São Paulo', EXACT), ('Sao Paulo do Norte', PREFIX), ('São Paulo de Olivença', PREFIX)]
+    assert [tier for _, tier in found] == sorted(tier for _, tier in found)
+    assert ('Paulo Afonso', PREFIX) not in found
+    
+    found = _found(index, 'paulo')
+    assert found[0] == ('Paulo Afonso', PREFIX)
+    assert {name for name, tier in found if tier == SUBSTRING} == {
+        'São Paulo', 'Sao Paulo do Norte', 'São Paulo de Olivença'
+    }
+    # Substrings are ordered by key length, then by first appearance
+    assert [name for name, tier in found if tier == SUBSTRING][0] == 'São Paulo'
+
+def test_typos_match_by_trigram_similarity(index):
+    found = _found(index, 'Bretgne')
+    assert found[0] == ('Bretagne', FUZZY)
+    assert index.matches('Bretgne')[0].similarity >= 0.3
+    assert [index.names[match.name_id] for match in best_matches(index.matches('Finistre'))] == ['Finistère']
+    # A higher threshold drops the fuzzy matches, and unrelated names never match
+    assert index.matches('Bretgne', min_similarity=0.9) == ()
+    assert _found(index, 'xyzzy') == []
+
+def test_positions_list_every_row_of_a_name(index):
+    assert index.positions('bretagne').tolist() == [8, 15]
+    assert index.positions('').tolist() == []
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_short_keys_match_every_name_containing_them(seed):
+    rng = np.random.default_rng(seed)
+    alphabet = list('abcde ')
+    names = [''.join(rng.choice(alphabet, size=rng.integers(1, 8))).strip() or 'a' for _ in range(300)]
+    index = NameIndex(names)
+    
+    for key in ['a', 'e', 'ab', 'ba', 'ee', 'c d', 'z', 'az']:
+        key = normalize_name(key)
+        expected = {name_id for name_id, name_key in enumerate(index.keys) if key in name_key}
+        found = {match.name_id for match in index.matches(key) if match.tier != FUZZY}
+        assert found == expected
+
+def test_pickled_index_answers_the_same(index):
+    restored = pickle.loads(pickle.dumps(index))
+    for query in ('sao', 'pa', 'Bretgne', 'b', 'saint denis'):
+        assert restored.matches(query) == index.matches(query)
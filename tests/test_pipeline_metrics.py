@@ -0,0 +1,76 @@
+"""JSON lines records of the processors' stages, including the status of a failed run."""
+
+import json
+
+import pytest
+
+import process_all_admin_levels_simple
+import process_all_administrative_levels
+from gns_reader import ADMIN_REGIONS_FILE
+from gns_synthetic import generate_dataset
+from pipeline_metrics import PipelineMetrics
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    generate_dataset(tmp_path, 3000, seed=5)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def _records(metrics_file):
+    with open(metrics_file) as f:
+        return [json.loads(line) for line in f]
+
+def _run(module, metrics_file, **kwargs):
+    metrics = PipelineMetrics(module.__name__, metrics_file)
+    return module.process_gns_administrative_data(use_cache=False, metrics=metrics, **kwargs)
+
+def test_full_processor_records_stages_one_to_six(dataset):
+    metrics_file = dataset / 'metrics.jsonl'
+    assert _run(process_all_administrative_levels, metrics_file, use_stage_cache=False) is not None
+
+    *stages, total = _records(metrics_file)
+    assert [record['stage'] for record in stages] == [1, 2, 3, 4, 5, 6]
+    assert all(record['status'] == 'ok' for record in stages)
+    assert all(record['wall_s'] >= 0 and record['rows_out'] is not None for record in stages)
+    assert len({record['run_id'] for record in stages + [total]}) == 1
+    assert total['stage'] == 'total' and total['status'] == 'ok' and total['stages'] == 6
+
+def test_simple_processor_records_derived_filter_stages(dataset):
+    metrics_file = dataset / 'metrics.jsonl'
+    assert _run(process_all_admin_levels_simple, metrics_file) is not None
+
+    *stages, total = _records(metrics_file)
+    assert [record['stage'] for record in stages] == [1, 2, 3, 4, 5, 6, 7, 8]
+    derived = [record for record in stages if record.get('derived')]
+    assert [record['stage'] for record in derived] == [3, 4]
+    # Derived stages carry row counts only, chained to the reader's counts
+    assert all('wall_s' not in record for record in derived)
+    assert derived[0]['rows_out'] == derived[1]['rows_in']
+    assert derived[1]['rows_out'] == stages[1]['rows_out']
+    assert all(record['status'] == 'ok' for record in stages)
+    assert total['status'] == 'ok' and total['stages'] == 8
+
+def test_failing_stage_is_marked_as_error(dataset):
+    (dataset / ADMIN_REGIONS_FILE).unlink()
+    metrics_file = dataset / 'metrics.jsonl'
+    assert _run(process_all_admin_levels_simple, metrics_file) is None
+
+    first, failed, total = _records(metrics_file)
+    assert (first['stage'], first['status']) == (1, 'ok')
+    assert (failed['stage'], failed['status']) == (2, 'error')
+    assert failed['rows_out'] is None
+    assert total['status'] == 'error' and total['stages'] == 2
+
+def test_stage_block_marks_its_record_on_error(tmp_path):
+    metrics_file = tmp_path / 'metrics.jsonl'
+    metrics = PipelineMetrics('test', metrics_file)
+    with metrics.stage(1, 'works') as record:
+        record['rows_out'] = 1
+    with pytest.raises(ValueError):
+        with metrics.stage(2, 'fails'):
+            raise ValueError
+    metrics.close('error')
+
+    assert [(record['stage'], record['status']) for record in _records(metrics_file)] == [
+        (1, 'ok'), (2, 'error'), ('total', 'error')
+    ]
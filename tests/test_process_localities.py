@@ -0,0 +1,138 @@
+"""Streaming localities pipeline: spill, partition deduplication and links to the divisions."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import admin_hierarchy
+import process_all_administrative_levels
+from admin_spatial import unit_vectors
+from gns_dedup import deduplicate_names
+from gns_reader import ADMIN_COLUMNS, filter_gns_records, iter_gns_blocks
+from gns_schema import apply_schema
+from gns_synthetic import LOCALITIES_FILE, generate_dataset
+from process_localities import (
+    EXCLUDED_DESIGNATIONS, LOCALITY_PREFIXES, attach_divisions, load_divisions, process_localities
+)
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    generate_dataset(tmp_path, 3000, seed=13, localities_rows=4000)
+    monkeypatch.chdir(tmp_path)
+    assert process_all_administrative_levels.process_gns_administrative_data(use_cache=False) is not None
+    return tmp_path
+
+def _deduplicated_at_once(path):
+    """Filter and deduplicate the whole localities file in one go."""
+    block = next(iter_gns_blocks(path, ADMIN_COLUMNS))
+    candidates, _ = filter_gns_records(block, LOCALITY_PREFIXES)
+    candidates = candidates[~candidates['desig_cd'].isin(EXCLUDED_DESIGNATIONS)]
+    return deduplicate_names(apply_schema(candidates))
+
+def _reference_division(locality, divisions):
+    """Pick a locality's division by scanning every division: deepest level in the region, then the country."""
+    levels = divisions['Administrative_Level'].astype(object)
+    point = unit_vectors([locality['latitude']], [locality['longitude']])[0]
+    same_country = divisions['Country_Code'].astype(object).fillna('') == (locality['Country_Code'] or '')
+    same_region = same_country & (divisions['ADM1_Code'].astype(object).fillna('') == (locality['ADM1_Code'] or ''))
+    scopes = [same_country]
+    if locality['ADM1_Code'] not in ('', '00', None):
+        scopes.insert(0, same_region)
+    for scope in scopes:
+        for level in ('ADM4', 'ADM3', 'ADM2', 'ADM1'):
+            rows = divisions[scope & (levels == level)]
+            if len(rows):
+                points = unit_vectors(rows['latitude'], rows['longitude'])
+                return rows['Unique_Feature_ID'].iloc[int((points @ point).argmax())]
+    return None
+
+def test_localities_are_deduplicated_and_linked_partition_by_partition(dataset):
+    total = process_localities(LOCALITIES_FILE, chunksize=500, partitions=3, use_cache=False)
+    localities = pd.read_parquet(dataset / 'Locality_Exports')
+    assert total == len(localities) > 0
+    
+    # One row per feature, the same rows as deduplicating the whole file at once
+    assert localities['Unique_Feature_ID'].is_unique
+    expected = _deduplicated_at_once(dataset / LOCALITIES_FILE)
+    assert dict(zip(localities['Unique_Feature_ID'], localities['Unique_Name_ID'])) == dict(
+        zip(expected['ufi'], expected['uni'])
+    )
+    
+    divisions, _ = load_divisions()
+    by_feature = divisions.set_index('Unique_Feature_ID')
+    # Only localities of countries without any ADM1-ADM4 division stay unlinked
+    hierarchy = divisions[divisions['Administrative_Level'] != 'ADMD']
+    hierarchy_countries = set(hierarchy['Country_Code'])
+    has_link = localities['Admin_Feature_ID'].notna().to_numpy()
+    assert (has_link == localities['Country_Code'].astype(object).isin(hierarchy_countries).to_numpy()).all()
+    linked = localities[has_link]
+    parents = by_feature.loc[linked['Admin_Feature_ID'].astype('int64')]
+    # Every link stays within the locality's country
+    assert (parents['Country_Code'].to_numpy() == linked['Country_Code'].astype(object).to_numpy()).all()
+    
+    # A locality with a known first-order code links within it when that region has divisions
+    regions = set(zip(hierarchy['Country_Code'], hierarchy['ADM1_Code'].astype(object)))
+    in_region = np.array([
+        adm1 not in ('', '00') and (country, adm1) in regions
+        for country, adm1 in zip(linked['Country_Code'], linked['ADM1_Code'].astype(object))
+    ])
+    assert in_region.any() and (~in_region).any()
+    linked_adm1 = linked['ADM1_Code'].astype(object).to_numpy()
+    assert (parents['ADM1_Code'].to_numpy()[in_region] == linked_adm1[in_region]).all()
+    
+    # Every link, in a region or by the nearest fallback in the country, matches a full scan
+    for locality in linked.head(200).to_dict('records'):
+        assert locality['Admin_Feature_ID'] == _reference_division(locality, divisions)
+
+def test_unmatched_region_falls_back_to_nearest_division_in_country():
+    divisions = pd.DataFrame({
+        'Unique_Feature_ID': [1, 2, 3, 4],
+        'Country_Code': ['FR', 'FR', 'FR', 'DE'],
+        'ADM1_Code': ['01', '01', '02', '01'],
+        'Administrative_Level': ['ADM1', 'ADM2', 'ADM1', 'ADM1'],
+        'Administrative_Name': ['North', 'North West', 'South', 'Nord'],
+        'latitude': [50.0, 50.0, 43.0, 52.0],
+        'longitude': [3.0, 0.0, 3.0, 13.0]
+    })
+    localities = pd.DataFrame({
+        'ufi': [10, 11, 12, 13],
+        'cc_ft': ['FR', 'FR', 'FR', 'ES'],
+        'adm1': ['01', '00', '99', '01'],
+        'lat_dd': [43.1, 43.1, 49.9, 40.0],
+        'long_dd': [3.0, 3.0, 2.9, -3.0]
+    })
+    placement = admin_hierarchy.placements(divisions, 'Country_Code', 'ADM1_Code', 'latitude', 'longitude')
+    linked = attach_divisions(localities, divisions, placement)
+    
+    # In region 01 the ADM2 is the deepest level, even though the ADM1 of region 02 is closer
+    # Unknown and unmatched first-order codes take the nearest division of the deepest level in the country
+    # A country without divisions gets no link
+    assert linked['Admin_Feature_ID'].tolist() == [2, 2, 2, pd.NA]
+    assert linked['Admin_Level'].tolist()[:3] == ['ADM2'] * 3
+    assert np.isnan(linked['Admin_Distance_km'].iloc[3])
+    assert linked['Admin_Distance_km'].iloc[2] == pytest.approx(
+        2 * 6371.0088 * np.arcsin(np.linalg.norm(unit_vectors([49.9], [2.9]) - unit_vectors([50.0], [0.0])) / 2),
+        rel=1e-3
+    )
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_kdtree_search_matches_dense_search(seed, monkeypatch):
+    pytest.importorskip('scipy')
+    rng = np.random.default_rng(seed)
+    keys = np.array(['FR|01', 'FR|02', 'DE|01', 'ES|07'], dtype=object)
+    candidate_keys = keys[rng.integers(0, 3, size=400)]
+    candidate_points = unit_vectors(rng.uniform(-60, 75, 400), rng.uniform(-180, 180, 400))
+    # Candidates sharing a location resolve to the first of them either way
+    candidate_points[10:15] = candidate_points[5]
+    child_keys = keys[rng.integers(0, 4, size=1000)]
+    child_points = unit_vectors(rng.uniform(-60, 75, 1000), rng.uniform(-180, 180, 1000))
+    child_points[::97] = np.nan
+    
+    monkeypatch.setattr(admin_hierarchy, 'KDTREE_MIN_CANDIDATES', 0)
+    by_tree = admin_hierarchy._nearest_in_groups(child_keys, child_points, candidate_keys, candidate_points)
+    monkeypatch.setattr(admin_hierarchy, 'cKDTree', None)
+    dense = admin_hierarchy._nearest_in_groups(child_keys, child_points, candidate_keys, candidate_points)
+    
+    np.testing.assert_array_equal(by_tree, dense)
+    assert (dense[child_keys == 'ES|07'] == -1).all()
+    assert (dense[child_keys != 'ES|07'] >= 0).all()
@@ -0,0 +1,94 @@
+"""Country matching and the pickled subdivision index of query_subdivisions.py."""
+
+import os
+
+import pandas as pd
+import pytest
+
+import query_subdivisions
+from query_subdivisions import load_data, load_subdivision_index, search_country
+
+COUNTRIES = [
+    ('FR', 'France', 'French Republic'),
+    ('GV', 'Guinea', 'Republic of Guinea'),
+    ('PU', 'Guinea-Bissau', 'Republic of Guinea-Bissau'),
+    ('EK', 'Equatorial Guinea', 'Republic of Equatorial Guinea'),
+    ('CI', 'Chile', 'Republic of Chile'),
+    ('CV', 'Cabo Verde', 'Republic of Cabo Verde')
+]
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pd.DataFrame(COUNTRIES, columns=['Country_Code', 'Short_Name', 'Full_Name']).to_csv(
+        'Country_Codes.csv', index=False
+    )
+    subdivisions = [
+        (code, f'{code}-{number:03d}', f'{name} region {number}')
+        for code, name, _ in COUNTRIES for number in range(3)
+    ]
+    pd.DataFrame(
+        subdivisions, columns=['Country_Code', 'First_Order_Administrative_Subdivision_Code', 'Name']
+    ).to_csv('ADM1_Codes.csv', index=False)
+    return tmp_path
+
+@pytest.fixture
+def builds(monkeypatch):
+    """Count the reads of the CSV files, i.e. the rebuilds of the index."""
+    calls = []
+    def counting_load_data():
+        calls.append(1)
+        return load_data()
+    monkeypatch.setattr(query_subdivisions, 'load_data', counting_load_data)
+    return calls
+
+def test_index_is_reused_until_a_source_changes(sources, builds):
+    index = load_subdivision_index()
+    assert len(builds) == 1
+    assert index.subdivisions_of(['GV']) == [('GV', 'GV-001', 'Guinea region 1'), ('GV', 'GV-002', 'Guinea region 2')]
+    assert load_subdivision_index().codes == index.codes
+    assert len(builds) == 1
+    
+    # Same contents, new modification time
+    stat = os.stat('ADM1_Codes.csv')
+    os.utime('ADM1_Codes.csv', ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    load_subdivision_index()
+    assert len(builds) == 2
+    
+    # New size, with the modification time put back
+    stat = os.stat('Country_Codes.csv')
+    countries = pd.read_csv('Country_Codes.csv')
+    countries.loc[countries['Country_Code'] == 'FR', 'Short_Name'] = 'France (FR)'
+    countries.to_csv('Country_Codes.csv', index=False)
+    os.utime('Country_Codes.csv', ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert load_subdivision_index().short_names['FR'] == 'France (FR)'
+    assert len(builds) == 3
+    load_subdivision_index()
+    assert len(builds) == 3
+
+def test_index_is_rebuilt_after_a_version_bump(sources, builds, monkeypatch):
+    load_subdivision_index()
+    monkeypatch.setattr(query_subdivisions, 'INDEX_VERSION', query_subdivisions.INDEX_VERSION + 1)
+    load_subdivision_index()
+    load_subdivision_index()
+    assert len(builds) == 2
+
+def test_missing_source_gives_no_index(sources, capsys):
+    os.remove('ADM1_Codes.csv')
+    assert load_subdivision_index() is None
+    assert 'Could not find required file' in capsys.readouterr().out
+
+@pytest.mark.parametrize('query', ['fr', 'FRANCE', 'guinea', 'guin', 'Republic of', 'chle', 'cabo verdé', 'nowhere'])
+def test_find_countries_matches_search_country(sources, query):
+    df = load_data()
+    index = load_subdivision_index()
+    assert index.find_countries(query) == search_country(df, query)['Country_Code'].unique().tolist()
+
+def test_exact_name_wins_over_longer_names(sources):
+    index = load_subdivision_index()
+    # An exact name is the only match; a partial name lists every country containing it
+    assert index.find_countries('Guinea') == ['GV']
+    assert index.find_countries('Guin') == ['GV', 'PU', 'EK']
+    # Full names are only searched when no short name matches
+    assert index.find_countries('republic of guinea') == ['GV']
+    assert index.find_countries('Equatorial') == ['EK']
@@ -0,0 +1,52 @@
+"""Per-country export files hold the same rows as filtering the data country by country."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from split_by_country import country_file_path, export_countries
+
+NAMES = ['France', "Côte d'Ivoire", 'Bosnia and Herzegovina', 'Japan']
+
+def _divisions(rows=300, seed=0):
+    rng = np.random.default_rng(seed)
+    countries = rng.integers(len(NAMES) + 1, size=rows)
+    return pd.DataFrame({
+        # Some rows have no country name and are not exported
+        'Country_Name': pd.Categorical([NAMES[i] if i < len(NAMES) else None for i in countries]),
+        'Administrative_Level': rng.choice(['ADM1', 'ADM2'], size=rows),
+        'Administrative_Name': [f'Division {i}' for i in range(rows)],
+        'latitude': rng.uniform(-60, 70, size=rows),
+        'longitude': rng.uniform(-180, 180, size=rows),
+        'Unique_Feature_ID': np.arange(1, rows + 1)
+    })
+
+def _filtered(df, country):
+    """The rows of one country, as the per-country filter selected them before partitioning."""
+    rows = df[df['Country_Name'] == country].reset_index(drop=True)
+    return rows.assign(Country_Name=rows['Country_Name'].astype(str))
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_country_files_match_the_per_country_filter(tmp_path, workers):
+    df = _divisions()
+    export_countries(df, output_dir=tmp_path, workers=workers)
+    
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        country_file_path(name, tmp_path).name for name in NAMES
+    )
+    for name in NAMES:
+        exported = pd.read_excel(country_file_path(name, tmp_path))
+        pd.testing.assert_frame_equal(exported, _filtered(df, name), check_dtype=False)
+
+def test_given_countries_without_rows_lose_their_file(tmp_path):
+    df = _divisions()
+    export_countries(df, output_dir=tmp_path)
+    
+    # Japan has no rows left; only the given countries are exported or removed
+    remaining = df[df['Country_Name'] != 'Japan']
+    export_countries(remaining, countries=['Japan', 'France', None], output_dir=tmp_path)
+    assert not country_file_path('Japan', tmp_path).exists()
+    assert country_file_path("Côte d'Ivoire", tmp_path).exists()
+    pd.testing.assert_frame_equal(
+        pd.read_excel(country_file_path('France', tmp_path)), _filtered(remaining, 'France'), check_dtype=False
+    )